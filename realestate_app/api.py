@@ -0,0 +1,167 @@
+import hashlib
+import json
+from datetime import date
+from decimal import Decimal
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from flask_login import login_required
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+
+from models import Property
+from forms import SearchForm
+import search_cache
+import pricing
+import occupancy
+import replicas
+
+# Versioned JSON API for the mobile client and partner integrations. Responses carry a
+# fixed list of columns (loaded with load_only, never whole rows) and a strong ETag built
+# from the (property_id, version) pairs they were rendered from. A client revalidating
+# with If-None-Match gets an empty 304 before anything is serialized.
+# POST /quotes prices many stays in one call (pricing.quote_many). /search also returns
+# facet counts (property_search.facet_counts), cached with the result pages and part
+# of its ETag.
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+SEARCH_FIELDS = ('property_id', 'property_type', 'street', 'city', 'state', 'price',
+                 'num_rooms', 'sqr_footage', 'available_from', 'available_to',
+                 'latitude', 'longitude')
+DETAIL_FIELDS = SEARCH_FIELDS + ('description', 'agent_email')
+_SCHEMA = 2          # bump when the field lists change so cached representations go stale
+
+
+def _columns(fields):
+    return load_only(*fields, 'version')
+
+
+def _dump(p, fields):
+    row = {}
+    for f in fields:
+        value = getattr(p, f)
+        if isinstance(value, date):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)           # exact; clients parse money as decimal strings
+        row[f] = value
+    return row
+
+
+def _etag(*parts):
+    return hashlib.sha1(json.dumps([_SCHEMA, *parts]).encode()).hexdigest()
+
+
+def _conditional(etag, build):
+    """304 if the client already holds `etag`, else the JSON document from build()."""
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag)
+    # private: results depend on the login; no-cache: always revalidate, cheap with the ETag
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+@bp.errorhandler(HTTPException)
+def _http_error(e):
+    return jsonify(error=e.name, status=e.code, message=e.description), e.code
+
+
+@bp.route('/search')
+@replicas.read_only
+@login_required
+def search():
+    # same form, criteria and cached keyset page as the HTML search, read from the query string
+    form = SearchForm(request.args, meta={'csrf': False}, order_by='price', property_type='')
+    if not form.validate():
+        return jsonify(error='Bad Request', status=400, fields=form.errors), 400
+
+    per_page = request.args.get('per_page', current_app.config['SEARCH_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['SEARCH_MAX_PAGE_SIZE']))
+    criteria = form.criteria()
+    page = search_cache.search_page(criteria, form.order_by.data, per_page,
+                                    request.args.get('after'), request.args.get('before'),
+                                    options=[_columns(SEARCH_FIELDS)])
+    facets = search_cache.search_facets(criteria, current_app.config['SEARCH_PRICE_BUCKETS'])
+
+    # the ETag hashes the facets themselves, so it changes exactly when they do; a 304
+    # saves serializing and sending the body, not the queries (cached searches skip those)
+    etag = _etag('search', [[p.property_id, p.version] for p in page.items],
+                 page.next_cursor, page.prev_cursor, facets)
+    return _conditional(etag, lambda: {
+        'items': [_dump(p, SEARCH_FIELDS) for p in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'facets': facets,
+    })
+
+
+@bp.route('/properties/<int:pid>')
+@replicas.read_only
+@login_required
+def property_detail(pid):
+    p = Property.query.options(_columns(DETAIL_FIELDS)).get_or_404(pid)
+    return _conditional(_etag('property', pid, p.version), lambda: _dump(p, DETAIL_FIELDS))
+
+
+_WINDOW = ('available_from', 'available_to')
+
+
+@bp.route('/properties/<int:pid>/calendar')
+@login_required
+def property_calendar(pid):
+    p = Property.query.options(_columns(_WINDOW)).get_or_404(pid)
+    if 'month' in request.args:
+        ym = occupancy.parse_month(request.args['month'])
+        if ym is None:
+            abort(400, 'month must be YYYY-MM.')
+    else:
+        ym = occupancy.default_month(p, date.today())
+    days = occupancy.month_view(p, *ym)
+    statuses = [status for _, status in days]
+    return _conditional(_etag('calendar', pid, days[0][0].isoformat(), statuses), lambda: {
+        'property_id': pid, 'month': '{:04d}-{:02d}'.format(*ym),
+        'days': [{'date': day.isoformat(), 'status': status} for day, status in days],
+    })
+
+
+@bp.route('/properties/<int:pid>/next-free')
+@login_required
+def property_next_free(pid):
+    p = Property.query.options(_columns(_WINDOW)).get_or_404(pid)
+    days = request.args.get('days', 1, type=int)
+    try:
+        after = date.fromisoformat(request.args['after']) if 'after' in request.args else date.today()
+    except ValueError:
+        abort(400, 'after must be an ISO date.')
+    if not 1 <= days <= 366:
+        abort(400, 'days must be between 1 and 366.')
+    slot = occupancy.next_free(p, days, after)
+    return jsonify(property_id=pid, days=days,
+                   start=slot and slot[0].isoformat(), end=slot and slot[1].isoformat())
+
+
+def _quote_request(i, item):
+    try:
+        return int(item['property_id']), date.fromisoformat(item['start']), date.fromisoformat(item['end'])
+    except (KeyError, TypeError, ValueError):
+        abort(400, f'quotes[{i}] needs property_id and ISO start / end dates.')
+
+
+@bp.route('/quotes', methods=['POST'])
+@login_required
+def quotes():
+    # JSON only: a cross-site form cannot send application/json without a CORS preflight
+    body = request.get_json(silent=True) if request.is_json else None
+    items = body.get('quotes') if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        abort(400, 'Expected a JSON body {"quotes": [{"property_id", "start", "end"}, ...]}.')
+    if len(items) > current_app.config['QUOTE_MAX_ITEMS']:
+        abort(400, f"At most {current_app.config['QUOTE_MAX_ITEMS']} quotes per request.")
+
+    results = pricing.quote_many([_quote_request(i, item) for i, item in enumerate(items)])
+    return jsonify(quotes=[{
+        'property_id': q.property_id, 'start': q.start.isoformat(), 'end': q.end.isoformat(),
+        'months': q.months, 'total': None if q.total is None else str(q.total), 'status': q.status,
+    } for q in results])
@@ -1,45 +1,65 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import (
+    Flask, Blueprint, current_app, render_template, redirect, url_for,
+    flash, request, jsonify, abort, Response, stream_with_context
+)
 from flask_migrate import Migrate
 from flask_login import (
     LoginManager, login_user, logout_user,
     current_user, login_required
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date
+from functools import wraps
 
 from config import Config
 from models import (
     db, User, Agent, Renter, Address, CreditCard,
-    Property, House, Apartment, CommercialBuilding, Booking
+    Property, House, Apartment, CommercialBuilding, Booking, SavedSearch
 )
 from forms import (
     RegistrationForm, LoginForm, AddressForm,
-    CreditCardForm, PropertyForm, SearchForm, BookingForm
+    CreditCardForm, PropertyForm, SearchForm, BookingForm, PropertyImportForm,
+    BookingFilterForm
 )
-
-from sqlalchemy import or_, and_
-
-app = Flask(__name__)
-app.config.from_object(Config)
-
-db.init_app(app)
-migrate = Migrate(app, db)
-
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+from booking_export import bookings_query, bookings_page
+import booking_export
+import instrumentation
+import search_cache
+import identity_cache
+import property_import
+import booking_stats
+import api
+import passwords
+import booking_engine
+import occupancy
+import geocoding
+import saved_searches
+import jobs
+import booking_partitions
+import replicas
+import statement_timeout
+
+from sqlalchemy.orm import contains_eager
+
+migrate = Migrate()
+
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+login_manager.blueprint_login_views = {'api': None}     # JSON clients get a 401, not a redirect
+
+bp = Blueprint('main', __name__)
 
 
 @login_manager.user_loader
 def load_user(email):
-    return User.query.get(email)
+    return identity_cache.load_user(email)
 
 
-@app.route('/')
+@bp.route('/')
 def index():
-    return redirect(url_for('search'))
+    return redirect(url_for('main.search'))
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -50,7 +70,7 @@ def register():
                 email=form.email.data,
                 full_name=form.full_name.data,
                 user_type=form.user_type.data,
-                password_hash=generate_password_hash(form.password.data)
+                password_hash=passwords.hash_password(form.password.data)
             )
             db.session.add(u)
             if form.user_type.data == 'agent':
@@ -59,36 +79,41 @@ def register():
                 db.session.add(Renter(email=u.email))
             db.session.commit()
             flash('Registered! Please log in.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
     return render_template('register.html', form=form)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         u = User.query.get(form.email.data)
-        if u and check_password_hash(u.password_hash, form.password.data):
+        ok, new_hash = passwords.verify(u.password_hash, form.password.data) if u else (False, None)
+        if ok:
+            if new_hash:
+                # stored under an older PASSWORD_HASH_METHOD; upgrade while we have the password
+                u.password_hash = new_hash
+                db.session.commit()
             login_user(u)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         flash('Invalid credentials.', 'danger')
     return render_template('login.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
 # ---- Profile: addresses & cards ----
-@app.route('/profile')
+@bp.route('/profile')
 @login_required
 def profile():
     return render_template('profile.html')
 
 
-@app.route('/address/add', methods=['GET', 'POST'])
+@bp.route('/address/add', methods=['GET', 'POST'])
 @login_required
 def add_address():
     form = AddressForm()
@@ -103,17 +128,17 @@ def add_address():
         db.session.add(addr)
         db.session.commit()
         flash('Address added.', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     return render_template('address_form.html', form=form)
 
 
-@app.route('/address/<int:aid>/edit', methods=['GET', 'POST'])
+@bp.route('/address/<int:aid>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_address(aid):
     addr = Address.query.get_or_404(aid)
     if addr.user_email != current_user.email:
         flash('Not authorized.', 'danger')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     form = AddressForm(obj=addr)
     if form.validate_on_submit():
         addr.street = form.street.data
@@ -122,11 +147,11 @@ def edit_address(aid):
         addr.zip_code = form.zip_code.data
         db.session.commit()
         flash('Address updated.', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     return render_template('address_form.html', form=form)
 
 
-@app.route('/address/<int:aid>/delete', methods=['POST'])
+@bp.route('/address/<int:aid>/delete', methods=['POST'])
 @login_required
 def delete_address(aid):
     addr = Address.query.get_or_404(aid)
@@ -138,15 +163,15 @@ def delete_address(aid):
         db.session.delete(addr)
         db.session.commit()
         flash('Address deleted.', 'info')
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
 
 
-@app.route('/card/add', methods=['GET', 'POST'])
+@bp.route('/card/add', methods=['GET', 'POST'])
 @login_required
 def add_card():
     if current_user.user_type != 'renter':
         flash('Only renters can add cards.', 'warning')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     form = CreditCardForm()
     form.billing_address.choices = [
         (a.address_id, f"{a.street}, {a.city}") for a in current_user.addresses
@@ -162,17 +187,17 @@ def add_card():
         db.session.add(card)
         db.session.commit()
         flash('Card added.', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     return render_template('cc_form.html', form=form)
 
 
-@app.route('/card/<card_number>/edit', methods=['GET', 'POST'])
+@bp.route('/card/<card_number>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_card(card_number):
     card = CreditCard.query.get_or_404(card_number)
     if card.renter_email != current_user.email:
         flash('Not authorized.', 'danger')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     form = CreditCardForm(obj=card)
     form.billing_address.choices = [
         (a.address_id, f"{a.street}, {a.city}") for a in current_user.addresses
@@ -183,11 +208,11 @@ def edit_card(card_number):
         card.billing_address = form.billing_address.data
         db.session.commit()
         flash('Card updated.', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     return render_template('cc_form.html', form=form)
 
 
-@app.route('/card/<card_number>/delete', methods=['POST'])
+@bp.route('/card/<card_number>/delete', methods=['POST'])
 @login_required
 def delete_card(card_number):
     card = CreditCard.query.get_or_404(card_number)
@@ -197,16 +222,16 @@ def delete_card(card_number):
         db.session.delete(card)
         db.session.commit()
         flash('Card deleted.', 'info')
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
 
 
 # ---- Agent: Property CRUD ----
-@app.route('/property/add', methods=['GET', 'POST'])
+@bp.route('/property/add', methods=['GET', 'POST'])
 @login_required
 def add_property():
     if current_user.user_type != 'agent':
         flash('Only agents can add properties.', 'warning')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     form = PropertyForm()
     if form.validate_on_submit():
         p = Property(
@@ -219,7 +244,9 @@ def add_property():
             available_from=form.available_from.data,
             available_to=form.available_to.data,
             sqr_footage=form.sqr_footage.data,
-            description=form.description.data
+            description=form.description.data,
+            num_rooms=(form.num_rooms.data
+                       if form.property_type.data in ('house', 'apartment') else None)
         )
         db.session.add(p)
         db.session.flush()
@@ -241,17 +268,34 @@ def add_property():
             ))
         db.session.commit()
         flash('Property added.', 'success')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     return render_template('property_form.html', form=form)
 
 
-@app.route('/property/<int:pid>/edit', methods=['GET', 'POST'])
+@bp.route('/property/import', methods=['GET', 'POST'])
+@login_required
+def import_properties():
+    if current_user.user_type != 'agent':
+        flash('Only agents can import properties.', 'warning')
+        return redirect(url_for('main.search'))
+    form = PropertyImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        result = property_import.import_file(
+            upload.stream, property_import.detect_format(upload.filename), current_user.email)
+        flash(f'Imported {result.inserted} properties, {result.failed} rows rejected.',
+              'success' if not result.failed else 'warning')
+    return render_template('property_import.html', form=form, result=result)
+
+
+@bp.route('/property/<int:pid>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_property(pid):
     p = Property.query.get_or_404(pid)
     if current_user.user_type != 'agent' or p.agent_email != current_user.email:
         flash('Not authorized.', 'danger')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     form = PropertyForm(obj=p)
     # populate subtype fields on GET
     if request.method == 'GET':
@@ -273,6 +317,7 @@ def edit_property(pid):
         p.available_to = form.available_to.data
         p.sqr_footage = form.sqr_footage.data
         p.description = form.description.data
+        p.num_rooms = form.num_rooms.data if p.property_type in ('house', 'apartment') else None
 
         # remove old subtype and add new
         if p.house:       db.session.delete(p.house)
@@ -299,107 +344,131 @@ def edit_property(pid):
 
         db.session.commit()
         flash('Property updated.', 'success')
-        return redirect(url_for('property_detail', pid=pid))
+        return redirect(url_for('main.property_detail', pid=pid))
     return render_template('property_form.html', form=form)
 
 
-@app.route('/property/<int:pid>/delete', methods=['POST'])
+@bp.route('/property/<int:pid>/delete', methods=['POST'])
 @login_required
 def delete_property(pid):
     p = Property.query.get_or_404(pid)
     if current_user.user_type != 'agent' or p.agent_email != current_user.email:
         flash('Not authorized.', 'danger')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     else:
         db.session.delete(p)
         db.session.commit()
         flash('Property deleted.', 'info')
-    return redirect(url_for('search'))
+    return redirect(url_for('main.search'))
 
 
 # ---- Search & Listing ----
-@app.route('/search', methods=['GET', 'POST'])
+@bp.route('/search', methods=['GET', 'POST'])
+@replicas.read_only
 @login_required
 def search():
     form = SearchForm()
     properties = []
+    page = facets = None
+
+    renter = current_user.renter if current_user.user_type == 'renter' else None
+    if request.method == 'GET' and renter:
+        # start from the renter's latest saved preferences
+        form.location.data = form.location.data or renter.preferred_location
+        if form.max_price.data is None:
+            form.max_price.data = renter.budget
 
     if form.validate_on_submit():
-        loc          = form.location.data.strip()
-        search_date  = form.date.data
-
-        # --- base filters: location (street OR city OR state) + availability ---
-        q = Property.query.filter(
-            Property.available_from <= search_date,
-            Property.available_to   >= search_date,
-            or_(
-                Property.city.ilike(f"%{loc}%"),
-                Property.state.ilike(f"%{loc}%"),
-                Property.street.ilike(f"%{loc}%")
-            )
-        )
+        per_page = request.values.get('per_page', current_app.config['SEARCH_PAGE_SIZE'], type=int)
+        per_page = max(1, min(per_page, current_app.config['SEARCH_MAX_PAGE_SIZE']))
+        # popular searches are served from the result cache
+        criteria = form.criteria()
+        page = search_cache.search_page(criteria, form.order_by.data, per_page,
+                                        request.form.get('after'), request.form.get('before'))
+        facets = search_cache.search_facets(criteria, current_app.config['SEARCH_PRICE_BUCKETS'])
+        properties = page.items
 
-        # --- exclude properties already booked for the requested date ---------
-        q = q.filter(
-            ~Property.bookings.any(
-                and_(
-                    Booking.start_date <= search_date,
-                    Booking.end_date   >= search_date
-                )
-            )
-        )
+    return render_template('search.html', form=form, properties=properties, page=page, facets=facets)
 
-        # --- optional filters -------------------------------------------------
-        if form.property_type.data:
-            q = q.filter_by(property_type=form.property_type.data)
-
-        if form.min_price.data is not None:
-            q = q.filter(Property.price >= form.min_price.data)
-
-        if form.max_price.data is not None:
-            q = q.filter(Property.price <= form.max_price.data)
-
-        # --- bedrooms filter (keep track if we already joined) ----------------
-        joined_bed = False
-        if form.min_bedrooms.data is not None:
-            q = (q.outerjoin(House)
-                   .outerjoin(Apartment)
-                   .filter(
-                       (House.num_rooms     >= form.min_bedrooms.data) |
-                       (Apartment.num_rooms >= form.min_bedrooms.data)
-                   ))
-            joined_bed = True
-
-        # --- ordering ---------------------------------------------------------
-        if form.order_by.data == 'price':
-            q = q.order_by(Property.price)
-        else:  # bedrooms
-            if not joined_bed:               # add the joins only once
-                q = q.outerjoin(House).outerjoin(Apartment)
-            q = q.order_by(
-                House.num_rooms.nullslast(),
-                Apartment.num_rooms.nullslast()
-            )
 
-        properties = q.all()
+# ---- Saved searches ----
+@bp.route('/searches')
+@replicas.read_only
+@login_required
+def my_searches():
+    if current_user.user_type != 'renter':
+        flash('Only renters can save searches.', 'warning')
+        return redirect(url_for('main.search'))
+    searches = (SavedSearch.query.filter_by(renter_email=current_user.email)
+                .order_by(SavedSearch.search_id.desc()).all())
+    matches = saved_searches.inbox(current_user.email)
+    return render_template('saved_searches.html', searches=searches, matches=matches,
+                           unseen=[m.match_id for m in matches if not m.seen])
+
 
-    return render_template('search.html', form=form, properties=properties)
+@bp.route('/searches/seen', methods=['POST'])
+@login_required
+def mark_searches_seen():
+    # only the matches the page showed; ones found since stay highlighted
+    saved_searches.mark_seen(current_user.email, request.form.getlist('match_id', type=int))
+    db.session.commit()
+    return redirect(url_for('main.my_searches'))
+
+
+@bp.route('/searches/save', methods=['POST'])
+@login_required
+def save_search():
+    if current_user.user_type != 'renter':
+        flash('Only renters can save searches.', 'warning')
+        return redirect(url_for('main.search'))
+    form = SearchForm()
+    if not form.validate_on_submit():
+        return render_template('search.html', form=form, properties=[], page=None, facets=None)
+    limit = current_app.config['SAVED_SEARCH_MAX_PER_RENTER']
+    if SavedSearch.query.filter_by(renter_email=current_user.email).count() >= limit:
+        flash(f'You can keep up to {limit} saved searches. Delete one first.', 'warning')
+        return redirect(url_for('main.my_searches'))
+    saved_searches.save(current_user.renter, form.criteria())
+    db.session.commit()
+    flash('Search saved. New listings that match it will appear here.', 'success')
+    return redirect(url_for('main.my_searches'))
+
+
+@bp.route('/searches/<int:sid>/delete', methods=['POST'])
+@login_required
+def delete_search(sid):
+    s = SavedSearch.query.get_or_404(sid)
+    if s.renter_email != current_user.email:
+        flash('Not authorized.', 'danger')
+    else:
+        db.session.delete(s)
+        db.session.commit()
+        flash('Saved search deleted.', 'info')
+    return redirect(url_for('main.my_searches'))
 
 
-@app.route('/property/<int:pid>')
+@bp.route('/property/<int:pid>')
+@replicas.read_only
 @login_required
 def property_detail(pid):
     p = Property.query.get_or_404(pid)
-    return render_template('property_detail.html', p=p)
+    year, month = (occupancy.parse_month(request.args.get('month'))
+                   or occupancy.default_month(p, date.today()))
+    prev_month, next_month = occupancy.adjacent_months(year, month)
+    return render_template(
+        'property_detail.html', p=p, month=date(year, month, 1),
+        weeks=occupancy.weeks(occupancy.month_view(p, year, month)),
+        prev_month=prev_month, next_month=next_month,
+    )
 
 
 # ---- Booking ----
-@app.route('/property/<int:pid>/book', methods=['GET', 'POST'])
+@bp.route('/property/<int:pid>/book', methods=['GET', 'POST'])
 @login_required
 def book_property(pid):
     if current_user.user_type != 'renter':
         flash('Only renters can book.', 'warning')
-        return redirect(url_for('property_detail', pid=pid))
+        return redirect(url_for('main.property_detail', pid=pid))
 
     p = Property.query.get_or_404(pid)          # ← existing line
     form = BookingForm()
@@ -407,57 +476,111 @@ def book_property(pid):
                                 for c in current_user.cards]
 
     if form.validate_on_submit():
-        # ---- NEW AVAILABILITY CHECK ----------------------------------------
-        if not (p.available_from <= form.start_date.data <= p.available_to and
-                p.available_from <= form.end_date.data   <= p.available_to and
-                form.start_date.data <= form.end_date.data):
-            flash('Selected dates are outside this property’s availability window.',
-                  'warning')
-            return render_template('booking_form.html', form=form, p=p)
-        # --------------------------------------------------------------------
-
-        # monthly-rent total (inclusive months)
-        months = ((form.end_date.data.year  - form.start_date.data.year) * 12 +
-                  (form.end_date.data.month - form.start_date.data.month) + 1)
-        total  = months * float(p.price)
-
-        b = Booking(
-            property_id=pid,
-            renter_email=current_user.email,
-            card_number=form.card_number.data,
-            start_date=form.start_date.data,
-            end_date=form.end_date.data,
-            total_cost=total
-        )
-        db.session.add(b)
-        db.session.commit()
-        flash(f'Booked! Total cost: ${total:.2f}', 'success')
-        return redirect(url_for('my_bookings'))
+        try:
+            b = booking_engine.book(pid, current_user.email, form.card_number.data,
+                                    form.start_date.data, form.end_date.data)
+        except booking_engine.BookingError as e:
+            flash(str(e), 'warning')
+            status = {booking_engine.Conflict: 409, booking_engine.Busy: 503}.get(type(e), 200)
+            return render_template('booking_form.html', form=form, p=p), status
+        flash(f'Booked! Total cost: ${b.total_cost:.2f}', 'success')
+        return redirect(url_for('main.my_bookings'))
 
     return render_template('booking_form.html', form=form, p=p)
 
 
-@app.route('/bookings')
+def _booking_filters():
+    # invalid filters are reported on the page and otherwise ignored
+    form = BookingFilterForm(request.args)
+    form.validate()
+    filters = {name: None if form[name].errors else form[name].data
+               for name in ('start', 'end', 'property_id')}
+    args = {name: request.args[name] for name in filters if request.args.get(name)}
+    return form, filters, args
+
+
+def _bookings_view(template, q, form, args):
+    per_page = request.args.get('per_page', current_app.config['BOOKINGS_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['BOOKINGS_MAX_PAGE_SIZE']))
+    page = bookings_page(q, per_page,
+                         after=request.args.get('after'), before=request.args.get('before'))
+    return render_template(template, bookings=page.items, page=page, form=form, args=args)
+
+
+def _export(q, fmt, name):
+    if fmt not in booking_export.FORMATS:
+        abort(404)
+    body = booking_export.stream(q, fmt, current_app.config['EXPORT_YIELD_PER'])
+    return Response(stream_with_context(body), mimetype=booking_export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+@bp.route('/bookings')
+@replicas.read_only
 @login_required
 def my_bookings():
     if current_user.user_type == 'agent':
-        return redirect(url_for('agent_bookings'))
-    bs = Booking.query.filter_by(renter_email=current_user.email).all()
-    return render_template('bookings.html', bookings=bs)
+        return redirect(url_for('main.agent_bookings', **request.args))
+    form, filters, args = _booking_filters()
+    return _bookings_view('bookings.html',
+                          bookings_query(renter_email=current_user.email, **filters), form, args)
 
 
-@app.route('/agent/bookings')
+@bp.route('/bookings/export.<fmt>')
+@login_required
+def export_my_bookings(fmt):
+    if current_user.user_type == 'agent':
+        return redirect(url_for('main.export_agent_bookings', fmt=fmt, **request.args))
+    _, filters, _ = _booking_filters()
+    return _export(bookings_query(renter_email=current_user.email, **filters), fmt, 'my-bookings')
+
+
+@bp.route('/agent/bookings')
+@replicas.read_only
 @login_required
 def agent_bookings():
     if current_user.user_type != 'agent':
-        return redirect(url_for('my_bookings'))
-    bs = Booking.query.join(Property).filter(
-        Property.agent_email == current_user.email
-    ).all()
-    return render_template('agent_bookings.html', bookings=bs)
+        return redirect(url_for('main.my_bookings', **request.args))
+    form, filters, args = _booking_filters()
+    return _bookings_view('agent_bookings.html',
+                          bookings_query(agent_email=current_user.email, **filters), form, args)
 
 
-@app.route('/booking/<int:bid>/cancel')
+@bp.route('/agent/bookings/export.<fmt>')
+@login_required
+def export_agent_bookings(fmt):
+    if current_user.user_type != 'agent':
+        return redirect(url_for('main.export_my_bookings', fmt=fmt, **request.args))
+    _, filters, _ = _booking_filters()
+    return _export(bookings_query(agent_email=current_user.email, **filters), fmt, 'agent-bookings')
+
+
+@bp.route('/agent/dashboard')
+@login_required
+def agent_dashboard():
+    if current_user.user_type != 'agent':
+        return redirect(url_for('main.my_bookings'))
+    today = date.today()
+    year = request.args.get('year', today.year, type=int)
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    listings = Property.query.filter_by(agent_email=current_user.email).count()
+    months = booking_stats.year_summary(current_user.email, year, listings)
+    top = [(p, days / (booking_stats.available_days(p, first, last) or 1), count, revenue)
+           for p, days, count, revenue in booking_stats.top_properties(
+               current_user.email, date(year, 1, 1), date(year, 12, 1),
+               current_app.config['DASHBOARD_TOP_PROPERTIES'])]
+    upcoming = (bookings_query(agent_email=current_user.email)
+                .filter(Booking.start_date >= today)
+                .options(contains_eager(Booking.property))
+                .order_by(Booking.start_date, Booking.booking_id)
+                .limit(10).all())
+    return render_template('agent_dashboard.html', year=year, listings=listings, months=months,
+                           top=top, upcoming=upcoming,
+                           total_revenue=sum(m['revenue'] for m in months),
+                           total_days=sum(m['booked_days'] for m in months))
+
+
+@bp.route('/booking/<int:bid>/cancel')
 @login_required
 def cancel_booking(bid):
     b = Booking.query.get_or_404(bid)
@@ -469,10 +592,65 @@ def cancel_booking(bid):
         db.session.commit()
         flash('Booking canceled and refunded (simulated).', 'info')
     return redirect(
-        url_for('my_bookings') if current_user.user_type == 'renter'
-        else url_for('agent_bookings')
+        url_for('main.my_bookings') if current_user.user_type == 'renter'
+        else url_for('main.agent_bookings')
     )
 
 
+# ---- Admin ----
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.email not in current_app.config['ADMIN_EMAILS']:
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@bp.route('/admin/sql-stats')
+@admin_required
+def sql_stats():
+    return jsonify(instrumentation.snapshot())
+
+
+@bp.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    return jsonify({'search': search_cache.stats(), 'identity': identity_cache.stats()})
+
+
+# ---- App factory ----
+def create_app(config_object=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    passwords.init_app(app)
+
+    instrumentation.init_app(app, db)
+    replicas.init_app(app, db)
+    statement_timeout.init_app(app, db)
+    search_cache.init_app(app, db)
+    identity_cache.init_app(app, db)
+    booking_stats.init_app(app, db)
+    occupancy.init_app(app, db)
+    geocoding.init_app(app, db)
+    saved_searches.init_app(app, db)
+
+    app.register_blueprint(bp)
+    app.register_blueprint(api.bp)
+    app.cli.add_command(property_import.import_command)
+    app.cli.add_command(booking_stats.rebuild_command)
+    app.cli.add_command(occupancy.rebuild_command)
+    app.cli.add_command(geocoding.geocode_command)
+    app.cli.add_command(jobs.jobs_command)
+    app.cli.add_command(booking_partitions.partitions_command)
+    app.cli.add_command(booking_partitions.archive_command)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from sqlalchemy import and_, func, literal_column
+
+from models import db, Booking, MAX_BOOKING_DAYS
+
+# Longest stay, in days, booking_engine accepts and bookings.ck_bookings_max_stay
+# enforces. A booking overlapping [start, end] must then start in
+# [start - MAX_BOOKING_DAYS + 1, end]; overlaps() states that range on the partition
+# key so Postgres only visits the monthly bookings partitions inside it.
+
+
+def booking_period():
+    # must match the expression in the exclusion constraints of the bookings partitions
+    # (bookings_p<YYYY_MM>_no_overlap) so the planner can use their GiST indexes
+    return func.daterange(Booking.start_date, Booking.end_date, literal_column("'[]'"))
+
+
+def start_window(start, end):
+    """start_date range of every booking that can overlap [start, end]."""
+    return Booking.start_date.between(start - timedelta(days=MAX_BOOKING_DAYS - 1), end)
+
+
+def overlaps(start, end):
+    """Bookings whose [start_date, end_date] shares at least one day with [start, end]."""
+    if db.engine.dialect.name == 'postgresql':
+        return and_(start_window(start, end),
+                    booking_period().op('&&')(func.daterange(start, end, literal_column("'[]'"))))
+    return and_(start_window(start, end), Booking.end_date >= start)
+
+
+def has_overlap(property_id, start, end):
+    return db.session.query(
+        Booking.query.filter(Booking.property_id == property_id, overlaps(start, end)).exists()
+    ).scalar()
@@ -0,0 +1,51 @@
+# Date-range availability search latency as bookings grow.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.availability_bench \
+#       --properties 100000 --bookings 100000 1000000
+import argparse
+import json
+import random
+from datetime import timedelta
+
+from app import create_app
+from models import db, Property
+from property_search import filtered_query, keyset_page
+from bench.common import (
+    CITIES, WINDOW_START, seed_properties, seed_bookings, summarize, time_it
+)
+
+app = create_app()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Range availability search latency')
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--bookings', type=int, nargs='+', default=[100_000, 1_000_000])
+    ap.add_argument('--repeat', type=int, default=50)
+    ap.add_argument('--page-size', type=int, default=24)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(11)
+    with app.app_context():
+        seed_properties(args.properties)
+        for n in sorted(args.bookings):
+            seed_bookings(n)
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(db.text('ANALYZE properties; ANALYZE bookings'))
+                db.session.commit()
+
+            def one_search():
+                start = WINDOW_START + timedelta(days=rng.randint(0, 600))
+                end = start + timedelta(days=rng.randint(2, 14))
+                q = filtered_query(rng.choice(CITIES)[0], start, end)
+                keyset_page(q, Property.price, args.page_size)
+                db.session.rollback()            # don't let the identity map grow
+
+            row = {'properties': args.properties, 'bookings': n, 'dialect': db.engine.dialect.name}
+            row.update(summarize(time_it(one_search, args.repeat)))
+            row['p95_under_100ms'] = row['p95_ms'] < 100
+            print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
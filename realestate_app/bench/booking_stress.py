@@ -0,0 +1,124 @@
+# Concurrent bookings against one listing: no overlaps, bounded latency.
+#
+#   DATABASE_URL=sqlite:///bench.db python -m bench.booking_stress --in-process --threads 200
+#   python -m bench.booking_stress --url http://127.0.0.1:5000 --threads 300     # same DATABASE_URL
+#
+# Creates a fresh listing, logs --threads generated renters in and releases them at once;
+# each fires --per-thread POST /property/<id>/book for random 1-7 day stays inside a
+# --span-days window, so most requests collide. Afterwards it checks the bookings table:
+# no two bookings of the listing may overlap and every 302 must have exactly one row.
+# Exits non-zero on an overlap, a mismatch, an unexpected status or p99 > --max-p99-ms.
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import aliased
+
+from app import create_app
+from models import db, Booking, Property
+from bench.common import (
+    WINDOW_START, WINDOW_END, agent_email, renter_email, renter_card, seed_users, percentile
+)
+from bench.loadtest import AppClient, HttpClient, _csrf
+from bench.login_storm import _login
+
+app = create_app()
+
+
+def new_listing():
+    p = Property(agent_email=agent_email(0), property_type='commercial', street='1 Contended Way',
+                 city='City000', state='S00', price=1234.56,
+                 available_from=WINDOW_START, available_to=WINDOW_END)
+    db.session.add(p)
+    db.session.commit()
+    return p.property_id
+
+
+def overlapping_pairs(pid):
+    a, b = aliased(Booking), aliased(Booking)
+    return (db.session.query(func.count()).select_from(a)
+            .join(b, and_(a.property_id == b.property_id, a.booking_id < b.booking_id,
+                          a.start_date <= b.end_date, b.start_date <= a.end_date))
+            .filter(a.property_id == pid).scalar())
+
+
+def client_for(i, args):
+    if args.in_process:
+        client = AppClient(app)
+        # skip the password hash: log in by setting the Flask-Login session directly
+        with client.client.session_transaction() as s:
+            s['_user_id'] = renter_email(i)
+            s['_fresh'] = True
+        return client
+    client = HttpClient(args.url)
+    _login(client, renter_email(i))
+    return client
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Concurrent bookings of one property')
+    ap.add_argument('--url', default='http://127.0.0.1:5000')
+    ap.add_argument('--in-process', action='store_true')
+    ap.add_argument('--threads', type=int, default=200)
+    ap.add_argument('--per-thread', type=int, default=2)
+    ap.add_argument('--span-days', type=int, default=60, help='window the stays are drawn from')
+    ap.add_argument('--max-p99-ms', type=float, default=5000)
+    args = ap.parse_args(argv)
+
+    with app.app_context():
+        seed_users(1, args.threads)
+        pid = new_listing()
+
+    clients = [client_for(i, args) for i in range(args.threads)]
+    start = threading.Barrier(args.threads)
+    statuses, latency, lock = Counter(), [], threading.Lock()
+
+    def fire(i, client):
+        rng = random.Random(i)
+        _, page = client.request('GET', f'/property/{pid}/book')
+        token = _csrf(page)
+        start.wait()
+        for _ in range(args.per_thread):
+            first = WINDOW_START + timedelta(days=rng.randrange(args.span_days))
+            last = first + timedelta(days=rng.randrange(7))
+            t0 = time.perf_counter()
+            status, _ = client.request('POST', f'/property/{pid}/book', {
+                'csrf_token': token, 'start_date': first.isoformat(), 'end_date': last.isoformat(),
+                'card_number': renter_card(i)})
+            with lock:
+                latency.append((time.perf_counter() - t0) * 1000)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=fire, args=(i, c)) for i, c in enumerate(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with app.app_context():
+        rows = db.session.query(func.count()).filter(Booking.property_id == pid).scalar()
+        overlaps = overlapping_pairs(pid)
+        target = db.engine.dialect.name if args.in_process else args.url
+    result = {
+        'target': target, 'property_id': pid, 'requests': len(latency),
+        'seconds': round(elapsed, 2), 'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'bookings': rows, 'overlapping_pairs': overlaps,
+        'p50_ms': round(percentile(latency, 50), 1), 'p95_ms': round(percentile(latency, 95), 1),
+        'p99_ms': round(percentile(latency, 99), 1), 'max_ms': round(max(latency), 1),
+    }
+    print(json.dumps(result))
+    ok = (overlaps == 0 and rows == statuses[302] and set(statuses) <= {302, 409, 503}
+          and result['p99_ms'] <= args.max_p99_ms)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
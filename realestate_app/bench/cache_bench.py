@@ -0,0 +1,88 @@
+# Search cache invalidation: cost per commit as the cache grows, and exactness.
+#
+#   python -m bench.cache_bench --entries 1000 10000 100000 [--redis-url redis://localhost:6379/15]
+#
+# Fills the search cache backend ('memory', and 'redis' when --redis-url is given; its
+# keys go under a 'bench-search' prefix and are cleared afterwards) with --entries
+# search entries over the bench cities, then runs search_cache.invalidate() for
+# --commits listing changes (a booking's location key and stay). Every invalidation
+# must delete exactly the entries that the brute-force check over all of them matches;
+# the Redis backend reads only the entries filed under the key's trigrams (and the
+# stay's months), so its cost follows the entries that can match rather than the cache
+# size.
+import argparse
+import json
+import random
+from datetime import timedelta
+
+import caching
+import search_cache
+from models import normalize_location
+from bench.common import CITIES, WINDOW_START, WINDOW_END, summarize, time_it
+
+STREETS = ['Main St', 'Oak Ave', 'Elm St', 'Lake Shore Dr', 'Madison St', 'Park Blvd']
+
+
+def _stay(rng, longest=30):
+    start = WINDOW_START + timedelta(days=rng.randrange((WINDOW_END - WINDOW_START).days - longest))
+    return start, start + timedelta(days=rng.randint(1, longest))
+
+
+def _term(rng):
+    city, state = rng.choice(CITIES)
+    return rng.choice([normalize_location(city), normalize_location(city, state),
+                       normalize_location(rng.choice(STREETS)), normalize_location(city)[:2], ''])
+
+
+def _fill(backend, n, rng):
+    entries = {}
+    for i in range(n):
+        start, end = _stay(rng)
+        meta = {'term': _term(rng), 'start': start.isoformat(), 'end': end.isoformat()}
+        backend.set(f'e{i}', {'ids': []}, meta, search_cache._tags(meta))
+        entries[f'e{i}'] = meta
+    return entries
+
+
+def run(backend, label, args):
+    rng = random.Random(7)
+    search_cache._backend = backend
+    for n in args.entries:
+        backend.clear()
+        entries = _fill(backend, n, rng)
+        samples = []
+        for _ in range(args.commits):
+            city, state = rng.choice(CITIES)
+            key = normalize_location(f'{rng.randint(1, 9999)} {rng.choice(STREETS)}', city, state)
+            start, end = _stay(rng, 14)
+            expected = {k for k, m in entries.items()
+                        if m['term'] in key and m['start'] <= end.isoformat() and start.isoformat() <= m['end']}
+            before = backend.stats.invalidations
+            samples += time_it(lambda: search_cache.invalidate([(key, start, end)]), 1)
+            assert backend.stats.invalidations - before == len(expected), (key, len(expected))
+            assert all(backend.get(k) is None for k in expected)
+            for k in expected:
+                del entries[k]
+        survivors = sum(backend.get(k) is not None for k in entries)
+        assert survivors == len(entries), (survivors, len(entries))
+        row = {'backend': label, 'entries': n, 'commits': args.commits}
+        row.update(summarize(samples))
+        print(json.dumps(row), flush=True)
+    backend.clear()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Search cache invalidation cost and exactness')
+    ap.add_argument('--entries', type=int, nargs='+', default=[1000, 10_000, 100_000])
+    ap.add_argument('--commits', type=int, default=200)
+    ap.add_argument('--redis-url', help='also run against this Redis (a scratch database)')
+    args = ap.parse_args(argv)
+
+    ttl = 3600                          # nothing may expire during the run
+    run(caching.MemoryBackend(max_entries=max(args.entries), ttl=ttl), 'memory', args)
+    if args.redis_url:
+        run(caching.RedisBackend(args.redis_url, ttl=ttl, prefix='bench-search'), 'redis', args)
+
+
+if __name__ == '__main__':
+    main()
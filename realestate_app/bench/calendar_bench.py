@@ -0,0 +1,84 @@
+# Availability calendar: bookings scan vs. the property_occupancy bitmap.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.calendar_bench --properties 10000 --bookings 1000000
+#
+# Seeds listings and bookings (bench.common), rebuilds the bitmap (timed) and then, for
+# random listings, times one month view and one next-free --days-day slot search both
+# ways: from the listing's booking rows, and with occupancy.month_view / next_free.
+import argparse
+import json
+import random
+import time
+from calendar import monthrange
+from datetime import date, timedelta
+
+from app import create_app
+from models import db, Booking, Property
+import occupancy
+from bench.common import WINDOW_START, seed_properties, seed_bookings, summarize, time_it
+
+app = create_app()
+
+
+def raw_month(p, year, month):
+    first, last = date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    booked = set()
+    for start, end in (db.session.query(Booking.start_date, Booking.end_date)
+                       .filter(Booking.property_id == p.property_id,
+                               Booking.start_date <= last, Booking.end_date >= first)):
+        booked.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return [(first + timedelta(days=i), first + timedelta(days=i) in booked)
+            for i in range((last - first).days + 1)]
+
+
+def raw_next_free(p, days, after):
+    # walk the gaps between the listing's bookings from `after` on
+    day = max(after, p.available_from)
+    for start, end in (db.session.query(Booking.start_date, Booking.end_date)
+                       .filter(Booking.property_id == p.property_id, Booking.end_date >= day)
+                       .order_by(Booking.start_date)):
+        if (start - day).days >= days:
+            break
+        day = max(day, end + timedelta(days=1))
+    return (day, day + timedelta(days=days - 1)) if day + timedelta(days=days - 1) <= p.available_to else None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Calendar queries, bookings vs. bitmap')
+    ap.add_argument('--properties', type=int, default=10_000)
+    ap.add_argument('--bookings', type=int, default=1_000_000)
+    ap.add_argument('--days', type=int, default=10, help='length of the free slot searched for')
+    ap.add_argument('--repeat', type=int, default=200)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(19)
+    with app.app_context():
+        have = seed_properties(args.properties)
+        seed_bookings(args.bookings)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        t0 = time.perf_counter()
+        rows = occupancy.rebuild()
+        print(json.dumps({'step': 'rebuild', 'bookings': args.bookings, 'bitmap_rows': rows,
+                          'seconds': round(time.perf_counter() - t0, 2)}), flush=True)
+
+        listings = [db.session.get(Property, rng.randint(1, have)) for _ in range(50)]
+        for p in listings:
+            # both paths must agree before anything is timed
+            assert [(d, s == 'booked') for d, s in occupancy.month_view(p, 2025, 6)] == raw_month(p, 2025, 6)
+            assert occupancy.next_free(p, args.days, WINDOW_START) == raw_next_free(p, args.days, WINDOW_START)
+
+        cases = (('month_raw', lambda p: raw_month(p, 2025, 6)),
+                 ('month_bitmap', lambda p: occupancy.month_view(p, 2025, 6)),
+                 ('next_free_raw', lambda p: raw_next_free(p, args.days, WINDOW_START)),
+                 ('next_free_bitmap', lambda p: occupancy.next_free(p, args.days, WINDOW_START)))
+        for name, fn in cases:
+            row = {'query': name, 'bookings_per_listing': args.bookings // have,
+                   'dialect': db.engine.dialect.name}
+            row.update(summarize(time_it(lambda: fn(rng.choice(listings)), args.repeat)))
+            print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
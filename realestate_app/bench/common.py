@@ -0,0 +1,245 @@
+# Shared helpers for the benchmark scripts in this package.
+#
+# Run them from realestate_app/ so the app modules are importable, e.g.
+#   DATABASE_URL=sqlite:///bench.db python -m bench.search_bench
+# They write synthetic rows into DATABASE_URL -- point it at a scratch database.
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from models import (
+    db, User, Agent, Renter, Address, CreditCard, Property, House, Apartment,
+    CommercialBuilding, Booking, normalize_location
+)
+
+BENCH_AGENT = 'bench-agent@example.com'
+BENCH_RENTER = 'bench-renter@example.com'
+BENCH_CARD = '5000000000000077'            # renter_card() numbers all start with 4
+WINDOW_START, WINDOW_END = date(2025, 1, 1), date(2026, 12, 31)
+
+CITIES = [(f'City{i:03d}', f'S{i % 50:02d}') for i in range(500)]
+# synthetic city centres spread over the continental US, one per CITIES entry; seeded
+# listings are scattered up to CITY_SCATTER degrees around their city's centre
+_centres = random.Random(20)
+CITY_CENTERS = [(round(_centres.uniform(25.0, 49.0), 4), round(_centres.uniform(-124.0, -67.0), 4))
+                for _ in CITIES]
+CITY_SCATTER = 0.3
+STREETS = ['Elm St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Lake Shore Dr', 'Main St', 'Madison St']
+TYPES = ['house', 'apartment', 'commercial']
+
+# generated users (seed_users) share one password so load scripts can log in as any of them
+BENCH_PASSWORD = 'bench-pass'
+
+
+def agent_email(i):
+    return f'bench-agent-{i}@example.com'
+
+
+def renter_email(i):
+    return f'bench-renter-{i}@example.com'
+
+
+def renter_card(i):
+    return f'4{i:015d}'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def summarize(samples_ms):
+    return {
+        'n': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'mean_ms': round(statistics.fmean(samples_ms), 3),
+    }
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def ensure_agent():
+    if not db.session.get(User, BENCH_AGENT):
+        db.session.add(User(email=BENCH_AGENT, full_name='Bench Agent', user_type='agent',
+                            password_hash='!'))
+        db.session.add(Agent(email=BENCH_AGENT))
+        db.session.commit()
+
+
+def _count(model, prefix):
+    return db.session.query(db.func.count()).filter(model.email.like(prefix + '%')).scalar()
+
+
+def _sync_sequence(table, column):
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+            f"(SELECT max({column}) FROM {table}))"))
+        db.session.commit()
+
+
+def seed_users(agents, renters, batch=5_000):
+    """Top generated agents and renters up to the given counts.
+
+    Renter i gets one address and the card renter_card(i), so bookings can be spread
+    across renters. Everyone's password is BENCH_PASSWORD; the hash is computed once.
+    """
+    pw_hash = generate_password_hash(BENCH_PASSWORD)
+    have = _count(Agent, 'bench-agent-')
+    for lo in range(have, agents, batch):
+        emails = [agent_email(i) for i in range(lo, min(agents, lo + batch))]
+        db.session.execute(User.__table__.insert(), [
+            {'email': e, 'full_name': f'Agent {e}', 'user_type': 'agent', 'password_hash': pw_hash}
+            for e in emails])
+        db.session.execute(Agent.__table__.insert(), [
+            {'email': e, 'agency_name': 'Bench Realty'} for e in emails])
+        db.session.commit()
+
+    have = _count(Renter, 'bench-renter-')
+    next_id = (db.session.query(db.func.max(Address.address_id)).scalar() or 0) + 1
+    for lo in range(have, renters, batch):
+        idx = range(lo, min(renters, lo + batch))
+        db.session.execute(User.__table__.insert(), [
+            {'email': renter_email(i), 'full_name': f'Renter {i}', 'user_type': 'renter',
+             'password_hash': pw_hash} for i in idx])
+        db.session.execute(Renter.__table__.insert(), [{'email': renter_email(i)} for i in idx])
+        db.session.execute(Address.__table__.insert(), [
+            {'address_id': next_id + k, 'user_email': renter_email(i), 'street': f'{i} Bench St',
+             'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1]}
+            for k, i in enumerate(idx)])
+        db.session.execute(CreditCard.__table__.insert(), [
+            {'card_number': renter_card(i), 'renter_email': renter_email(i),
+             'exp_date': date(2030, 12, 31), 'cvv': '123', 'billing_address': next_id + k}
+            for k, i in enumerate(idx)])
+        db.session.commit()
+        next_id += len(idx)
+    _sync_sequence('addresses', 'address_id')
+    return agents, renters
+
+
+def seed_properties(target, batch=10_000, rng=None, agents=0):
+    """Top the properties table (and subtype tables) up to `target` rows.
+
+    Uses core multi-row inserts with explicit ids so the subtype rows can be written in
+    the same batch; the Postgres id sequence is moved past them afterwards. With
+    `agents`, listings are spread over the seed_users() agents instead of BENCH_AGENT.
+    """
+    rng = rng or random.Random(425)
+    if not agents:
+        ensure_agent()
+    have = db.session.query(db.func.count(Property.property_id)).scalar()
+    next_id = (db.session.query(db.func.max(Property.property_id)).scalar() or 0) + 1
+    while have < target:
+        n = min(batch, target - have)
+        # coordinates come from their own stream so the other columns match earlier seeds
+        scatter = random.Random(next_id)
+        props, houses, apartments, commercial = [], [], [], []
+        for pid in range(next_id, next_id + n):
+            ci = rng.randrange(len(CITIES))
+            city, state = CITIES[ci]
+            lat, lng = CITY_CENTERS[ci]
+            street = f'{rng.randint(1, 9999)} {rng.choice(STREETS)}'
+            kind = rng.choice(TYPES)
+            rooms = None if kind == 'commercial' else rng.randint(1, 6)
+            props.append({
+                'property_id': pid,
+                'agent_email': agent_email(rng.randrange(agents)) if agents else BENCH_AGENT,
+                'property_type': kind,
+                'street': street, 'city': city, 'state': state,
+                'location_key': normalize_location(street, city, state),
+                'latitude': lat + scatter.uniform(-CITY_SCATTER, CITY_SCATTER),
+                'longitude': lng + scatter.uniform(-CITY_SCATTER, CITY_SCATTER),
+                'price': rng.randint(500, 9000),
+                'available_from': WINDOW_START,
+                'available_to': WINDOW_END,
+                'sqr_footage': rng.randint(300, 5000),
+                'num_rooms': rooms,
+            })
+            if kind == 'house':
+                houses.append({'property_id': pid, 'num_rooms': rooms})
+            elif kind == 'apartment':
+                apartments.append({'property_id': pid, 'num_rooms': rooms, 'building_type': 'mid-rise'})
+            else:
+                commercial.append({'property_id': pid, 'business_type': 'retail'})
+        db.session.execute(Property.__table__.insert(), props)
+        for model, rows in ((House, houses), (Apartment, apartments), (CommercialBuilding, commercial)):
+            if rows:
+                db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+        have += n
+        next_id += n
+    _sync_sequence('properties', 'property_id')
+    return have
+
+
+def ensure_renter():
+    if not db.session.get(User, BENCH_RENTER):
+        db.session.add_all([
+            User(email=BENCH_RENTER, full_name='Bench Renter', user_type='renter', password_hash='!'),
+            Renter(email=BENCH_RENTER),
+        ])
+        db.session.flush()
+        addr = Address(user_email=BENCH_RENTER, street='1 Bench St', city='City000')
+        db.session.add(addr)
+        db.session.flush()
+        db.session.add(CreditCard(card_number=BENCH_CARD, renter_email=BENCH_RENTER,
+                                  billing_address=addr.address_id))
+        db.session.commit()
+
+
+def seed_bookings(target, batch=20_000, rng=None, slot_days=7, renters=0):
+    """Top bookings up to `target`, spread evenly and non-overlapping across properties.
+
+    Every property's calendar is cut into fixed `slot_days` slots and each booking fills
+    the start of one slot, so repeated top-ups never overlap earlier rows and the last
+    day of every slot stays free. With `renters`, bookings are spread over the
+    seed_users() renters instead of BENCH_RENTER.
+    """
+    rng = rng or random.Random(426)
+    if not renters:
+        ensure_renter()
+    have = db.session.query(db.func.count(Booking.booking_id)).scalar()
+    if have >= target:
+        return have
+    ids = [pid for (pid,) in db.session.query(Property.property_id).order_by(Property.property_id)]
+    first_slot = have // len(ids)
+    last_slot = -(-target // len(ids))
+    if last_slot * slot_days > (WINDOW_END - WINDOW_START).days:
+        raise SystemExit(f'{target} bookings do not fit {len(ids)} properties; seed more properties')
+    table = Booking.__table__
+    rows = []
+    for k in range(first_slot, last_slot):
+        for pid in ids[have % len(ids):]:
+            if have >= target:
+                break
+            start = WINDOW_START + timedelta(days=k * slot_days)
+            r = rng.randrange(renters) if renters else None
+            rows.append({
+                'property_id': pid,
+                'renter_email': renter_email(r) if renters else BENCH_RENTER,
+                'card_number': renter_card(r) if renters else BENCH_CARD,
+                'start_date': start,
+                'end_date': start + timedelta(days=rng.randint(0, slot_days - 2)),
+                'total_cost': 1000,
+            })
+            have += 1
+            if len(rows) >= batch:
+                db.session.execute(table.insert(), rows)
+                db.session.commit()
+                rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+    return have
@@ -0,0 +1,72 @@
+# Agent dashboard: on-the-fly aggregation over bookings vs. the property_monthly_stats rollup.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.dashboard_bench \
+#       --agents 100 --properties 100000 --bookings 10000000
+#
+# Seeds listings spread over --agents agents, bookings across them, rebuilds the rollup
+# (timed) and then times one dashboard's worth of queries for random agents both ways.
+import argparse
+import json
+import random
+import time
+from datetime import date
+
+from sqlalchemy import func
+
+from app import create_app
+from models import db, Booking, Property
+import booking_stats
+from bench.common import agent_email, seed_users, seed_properties, seed_bookings, summarize, time_it
+
+YEAR = 2025
+
+app = create_app()
+
+
+def raw_dashboard(agent):
+    # month totals and top listings straight from bookings (by start month)
+    month = func.substr(func.cast(Booking.start_date, db.String), 1, 7) \
+        if db.engine.dialect.name == 'sqlite' else func.date_trunc('month', Booking.start_date)
+    base = db.session.query().select_from(Booking).join(Property).filter(
+        Property.agent_email == agent,
+        Booking.start_date >= date(YEAR, 1, 1), Booking.start_date <= date(YEAR, 12, 31))
+    base.add_columns(month, func.count(), func.sum(Booking.total_cost)).group_by(month).all()
+    revenue = func.sum(Booking.total_cost)
+    base.add_columns(Booking.property_id, revenue).group_by(Booking.property_id) \
+        .order_by(revenue.desc()).limit(50).all()
+
+
+def rollup_dashboard(agent):
+    booking_stats.year_summary(agent, YEAR, 1)
+    booking_stats.top_properties(agent, date(YEAR, 1, 1), date(YEAR, 12, 1), 50)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Dashboard queries, raw vs. rollup')
+    ap.add_argument('--agents', type=int, default=100)
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--bookings', type=int, default=10_000_000)
+    ap.add_argument('--repeat', type=int, default=20)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(14)
+    with app.app_context():
+        seed_users(args.agents, 1)
+        seed_properties(args.properties, agents=args.agents)
+        seed_bookings(args.bookings, renters=1)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        t0 = time.perf_counter()
+        rows = booking_stats.rebuild()
+        print(json.dumps({'step': 'rebuild', 'bookings': args.bookings, 'rollup_rows': rows,
+                          'seconds': round(time.perf_counter() - t0, 2)}), flush=True)
+        for name, fn in (('raw_bookings', raw_dashboard), ('rollup', rollup_dashboard)):
+            row = {'query': name, 'bookings': args.bookings,
+                   'bookings_per_agent': args.bookings // args.agents, 'dialect': db.engine.dialect.name}
+            row.update(summarize(time_it(lambda: fn(agent_email(rng.randrange(args.agents))), args.repeat)))
+            print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
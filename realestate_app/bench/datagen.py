@@ -0,0 +1,57 @@
+# Synthetic data at a configurable scale, for bench.loadtest and manual profiling.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.datagen \
+#       --agents 2000 --renters 100000 --properties 1000000 --bookings 10000000
+#
+# Every count is a target: re-running tops the tables up instead of duplicating rows,
+# so a run can be grown in steps. Generated users log in with common.BENCH_PASSWORD.
+# The schema must exist (`flask db upgrade`, or --create-schema for a scratch SQLite file).
+import argparse
+import json
+import random
+import time
+
+from app import create_app
+from models import db
+from bench.common import seed_users, seed_properties, seed_bookings
+
+app = create_app()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Generate synthetic users, listings and bookings')
+    ap.add_argument('--agents', type=int, default=200)
+    ap.add_argument('--renters', type=int, default=5_000)
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--bookings', type=int, default=1_000_000)
+    ap.add_argument('--seed', type=int, default=425, help='random seed; same seed, same data')
+    ap.add_argument('--create-schema', action='store_true', help='db.create_all() first')
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    timings = {}
+    with app.app_context():
+        if args.create_schema:
+            db.create_all()
+        for name, step in (
+            ('users', lambda: seed_users(args.agents, args.renters)),
+            ('properties', lambda: seed_properties(args.properties, rng=rng, agents=args.agents)),
+            ('bookings', lambda: seed_bookings(args.bookings, rng=rng, renters=args.renters)),
+        ):
+            t0 = time.perf_counter()
+            step()
+            timings[name] = round(time.perf_counter() - t0, 2)
+            print(f'{name}: {timings[name]}s', flush=True)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+        print(json.dumps({
+            'dialect': db.engine.dialect.name,
+            'agents': args.agents, 'renters': args.renters,
+            'properties': args.properties, 'bookings': args.bookings,
+            'seconds': timings,
+        }))
+
+
+if __name__ == '__main__':
+    main()
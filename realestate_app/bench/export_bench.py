@@ -0,0 +1,79 @@
+# Agent bookings: load-everything page vs. keyset page vs. streaming export.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.export_bench --properties 100000 --bookings 1000000
+#
+# All seeded listings belong to BENCH_AGENT, so the agent owns every booking -- the
+# "large agency" case. Reports wall time, time to the first export chunk and the
+# Python heap peak (tracemalloc) for each path.
+import argparse
+import json
+import time
+import tracemalloc
+
+from sqlalchemy.orm import contains_eager
+
+from app import create_app
+from models import db, Booking, Property
+from booking_export import bookings_query, bookings_page, stream
+from bench.common import BENCH_AGENT, seed_properties, seed_bookings
+
+app = create_app()
+
+
+def measure(name, fn):
+    db.session.expunge_all()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    extra = fn() or {}
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    row = {'path': name, 'seconds': round(elapsed, 3), 'peak_mb': round(peak / 2**20, 1),
+           'dialect': db.engine.dialect.name}
+    row.update(extra)
+    print(json.dumps(row), flush=True)
+
+
+def load_all():
+    # what agent_bookings() used to do before rendering
+    rows = Booking.query.join(Property).filter(Property.agent_email == BENCH_AGENT) \
+        .options(contains_eager(Booking.property)).all()
+    return {'rows': len(rows)}
+
+
+def one_page():
+    page = bookings_page(bookings_query(agent_email=BENCH_AGENT), 50)
+    return {'rows': len(page.items)}
+
+
+def export(fmt):
+    def run():
+        t0 = time.perf_counter()
+        first, size = None, 0
+        for chunk in stream(bookings_query(agent_email=BENCH_AGENT), fmt):
+            first = first or time.perf_counter() - t0
+            size += len(chunk)
+        return {'first_chunk_s': round(first, 3), 'mb_out': round(size / 2**20, 1)}
+    return run
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Agent bookings page and export at scale')
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--bookings', type=int, default=1_000_000)
+    args = ap.parse_args(argv)
+
+    with app.app_context():
+        seed_properties(args.properties)
+        seed_bookings(args.bookings)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE properties; ANALYZE bookings'))
+            db.session.commit()
+        measure('load_all', load_all)
+        measure('keyset_page', one_page)
+        measure('export_csv', export('csv'))
+        measure('export_ndjson', export('ndjson'))
+
+
+if __name__ == '__main__':
+    main()
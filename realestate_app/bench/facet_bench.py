@@ -0,0 +1,93 @@
+# Search facet counts: one grouped query vs. one COUNT per facet value.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.facet_bench --properties 1000000
+#
+# Seeds listings (bench.common) and, for three result-set sizes, times
+#   grouped   property_search.facet_counts(): one statement for all three facets
+#   separate  what a client does today: re-run the search as a COUNT for every property
+#             type, price bucket and bedroom count
+# Scopes: one city by name (substring), a --radius mile circle around a city centre, and
+# every listing free for the stay. Both ways must agree before anything is timed.
+import argparse
+import json
+import random
+from datetime import timedelta
+
+from app import create_app
+from models import db, Property
+from property_search import facet_counts, filtered_query
+from bench.common import (
+    CITIES, CITY_CENTERS, TYPES, WINDOW_START, seed_properties, summarize, time_it
+)
+
+app = create_app()
+
+
+def separate_counts(criteria, buckets):
+    base = filtered_query(**criteria)
+    bounds = [0, *buckets, None]
+    price = []
+    for lo, hi in zip(bounds, bounds[1:]):
+        q = base.filter(Property.price >= lo)
+        price.append({'min': lo, 'max': hi,
+                      'count': (q if hi is None else q.filter(Property.price < hi)).count()})
+    rooms = [{'value': v, 'count': base.filter(Property.num_rooms == v).count()} for v in range(1, 7)]
+    rooms.append({'value': None, 'count': base.filter(Property.num_rooms.is_(None)).count()})
+    return {
+        'total': base.count(),
+        'property_type': [{'value': t, 'count': base.filter(Property.property_type == t).count()}
+                          for t in sorted(TYPES)],
+        'price': price,
+        'bedrooms': rooms,
+    }
+
+
+def _nonzero(facets):
+    return {k: v if k == 'total' or k == 'price' else [e for e in v if e['count']]
+            for k, v in facets.items()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Facet count latency')
+    ap.add_argument('--properties', type=int, default=1_000_000)
+    ap.add_argument('--radius', type=float, default=50.0, help='miles')
+    ap.add_argument('--repeat', type=int, default=20)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(21)
+    with app.app_context():
+        seed_properties(args.properties)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE properties'))
+            db.session.commit()
+        buckets = app.config['SEARCH_PRICE_BUCKETS']
+
+        def stay():
+            start = WINDOW_START + timedelta(days=rng.randint(0, 600))
+            return {'start': start, 'end': start + timedelta(days=rng.randint(2, 14))}
+
+        scopes = {
+            'city': lambda: {'location': rng.choice(CITIES)[0], **stay()},
+            'radius': lambda: {'location': '', 'near': rng.choice(CITY_CENTERS),
+                               'radius': args.radius, **stay()},
+            'all': lambda: {'location': '', **stay()},
+        }
+        for scope, criteria in scopes.items():
+            sample = criteria()
+            grouped = facet_counts(**sample, price_buckets=buckets)
+            assert _nonzero(grouped) == _nonzero(separate_counts(sample, buckets)), scope
+            db.session.rollback()
+            for name, fn in (('grouped', lambda c: facet_counts(**c, price_buckets=buckets)),
+                             ('separate', lambda c: separate_counts(c, buckets))):
+                def one():
+                    fn(criteria())
+                    db.session.rollback()
+
+                row = {'scope': scope, 'query': name, 'properties': args.properties,
+                       'sample_matches': grouped['total'], 'dialect': db.engine.dialect.name}
+                row.update(summarize(time_it(one, args.repeat)))
+                print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
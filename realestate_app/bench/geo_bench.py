@@ -0,0 +1,103 @@
+# Radius search at scale: index-driven bounding box + haversine vs. the alternatives.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.geo_bench --properties 1000000
+#
+# Seeds listings scattered around the synthetic CITY_CENTERS (bench.common) and times one
+# first page of results per query for random centres and --radius miles:
+#   city_text       the existing substring search on one city's name
+#   radius_indexed  filtered_query(near=..., radius=...): ix_properties_lat_lng range
+#                   scan, haversine in SQL
+#   radius_python   the post-filter this replaces: fetch every listing's coordinates and
+#                   test the distance in Python (fewer --slow-repeat runs)
+# Before timing, the indexed search must return exactly the post-filter's listings (the
+# post-filter ignores bookings, so run it against a database without any).
+import argparse
+import json
+import math
+import random
+from datetime import timedelta
+
+from app import create_app
+from models import db, Property
+from property_search import EARTH_RADIUS_MILES, filtered_query, keyset_page
+from bench.common import (
+    CITIES, CITY_CENTERS, WINDOW_START, seed_properties, summarize, time_it
+)
+
+app = create_app()
+
+
+def miles_between(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+def python_ids(centre, miles, start, end):
+    rows = (db.session.query(Property.property_id, Property.latitude, Property.longitude)
+            .filter(Property.available_from <= start, Property.available_to >= end,
+                    Property.latitude.isnot(None)))
+    return {pid for pid, lat, lng in rows if miles_between(*centre, lat, lng) <= miles}
+
+
+def query_plan(q):
+    sql = str(q.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    return [' '.join(str(c) for c in row) for row in db.session.execute(db.text(prefix + sql))]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Radius search latency')
+    ap.add_argument('--properties', type=int, default=1_000_000)
+    ap.add_argument('--radius', type=float, default=10.0, help='miles')
+    ap.add_argument('--repeat', type=int, default=100)
+    ap.add_argument('--slow-repeat', type=int, default=5)
+    ap.add_argument('--page-size', type=int, default=24)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(20)
+    with app.app_context():
+        seed_properties(args.properties)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE properties'))
+            db.session.commit()
+
+        def stay():
+            start = WINDOW_START + timedelta(days=rng.randint(0, 600))
+            return start, start + timedelta(days=rng.randint(2, 14))
+
+        for ci in rng.sample(range(len(CITIES)), 5):
+            start, end = stay()
+            q = filtered_query('', start, end, near=CITY_CENTERS[ci], radius=args.radius)
+            assert {p.property_id for p in q} == python_ids(CITY_CENTERS[ci], args.radius, start, end)
+            db.session.rollback()
+        plan = query_plan(filtered_query('', *stay(), near=CITY_CENTERS[0], radius=args.radius))
+        print(json.dumps({'step': 'plan', 'radius_indexed': plan}), flush=True)
+
+        def city_text():
+            return filtered_query(rng.choice(CITIES)[0], *stay())
+
+        def radius_indexed():
+            return filtered_query('', *stay(), near=rng.choice(CITY_CENTERS), radius=args.radius)
+
+        def radius_python():
+            python_ids(rng.choice(CITY_CENTERS), args.radius, *stay())
+
+        for name, build, repeat in (('city_text', city_text, args.repeat),
+                                    ('radius_indexed', radius_indexed, args.repeat),
+                                    ('radius_python', radius_python, args.slow_repeat)):
+            def one():
+                q = build()
+                if q is not None:
+                    keyset_page(q, Property.price, args.page_size)
+                db.session.rollback()            # don't let the identity map grow
+
+            row = {'query': name, 'properties': args.properties, 'radius_miles': args.radius,
+                   'dialect': db.engine.dialect.name}
+            row.update(summarize(time_it(one, repeat)))
+            print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# Bulk listing import vs. the one-listing-per-request add_property() path.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.import_bench --rows 100000
+#
+# Writes --rows synthetic listings to a temporary CSV / JSON Lines file and imports it
+# with property_import; the per-row baseline (add, flush for the id, subtype insert,
+# commit) runs on --baseline-rows listings and is reported per 1k rows for comparison.
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from app import create_app
+from models import db, Property, House, Apartment, CommercialBuilding
+from property_import import import_file
+from bench.common import (
+    BENCH_AGENT, CITIES, STREETS, TYPES, WINDOW_START, WINDOW_END, ensure_agent
+)
+
+COLUMNS = ['property_type', 'street', 'city', 'state', 'price', 'available_from',
+           'available_to', 'sqr_footage', 'num_rooms', 'building_type', 'business_type']
+
+app = create_app()
+
+
+def listings(n, rng):
+    for _ in range(n):
+        city, state = rng.choice(CITIES)
+        kind = rng.choice(TYPES)
+        yield {
+            'property_type': kind,
+            'street': f'{rng.randint(1, 9999)} {rng.choice(STREETS)}', 'city': city, 'state': state,
+            'price': rng.randint(500, 9000),
+            'available_from': WINDOW_START.isoformat(), 'available_to': WINDOW_END.isoformat(),
+            'sqr_footage': rng.randint(300, 5000),
+            'num_rooms': rng.randint(1, 6) if kind != 'commercial' else '',
+            'building_type': 'mid-rise' if kind == 'apartment' else '',
+            'business_type': 'retail' if kind == 'commercial' else '',
+        }
+
+
+def write_file(path, fmt, rows):
+    with open(path, 'w', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+
+
+def per_row(rows):
+    # what add_property() does for each submitted form
+    for r in rows:
+        p = Property(agent_email=BENCH_AGENT, property_type=r['property_type'], street=r['street'],
+                     city=r['city'], state=r['state'], price=r['price'],
+                     available_from=WINDOW_START, available_to=WINDOW_END,
+                     sqr_footage=r['sqr_footage'], num_rooms=r['num_rooms'] or None)
+        db.session.add(p)
+        db.session.flush()
+        if p.property_type == 'house':
+            db.session.add(House(property_id=p.property_id, num_rooms=r['num_rooms']))
+        elif p.property_type == 'apartment':
+            db.session.add(Apartment(property_id=p.property_id, num_rooms=r['num_rooms'],
+                                     building_type=r['building_type']))
+        else:
+            db.session.add(CommercialBuilding(property_id=p.property_id, business_type=r['business_type']))
+        db.session.commit()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Bulk import throughput')
+    ap.add_argument('--rows', type=int, default=100_000)
+    ap.add_argument('--baseline-rows', type=int, default=2_000)
+    ap.add_argument('--format', choices=['csv', 'jsonl'], nargs='+', default=['csv', 'jsonl'])
+    args = ap.parse_args(argv)
+
+    rng = random.Random(12)
+    tmp = tempfile.mkdtemp()
+    with app.app_context():
+        ensure_agent()
+        t0 = time.perf_counter()
+        per_row(listings(args.baseline_rows, rng))
+        elapsed = time.perf_counter() - t0
+        print(json.dumps({'path': 'add_property_per_row', 'rows': args.baseline_rows,
+                          'seconds': round(elapsed, 2),
+                          'rows_per_s': round(args.baseline_rows / elapsed),
+                          'dialect': db.engine.dialect.name}), flush=True)
+
+        for fmt in args.format:
+            path = os.path.join(tmp, f'listings.{fmt}')
+            write_file(path, fmt, listings(args.rows, rng))
+            t0 = time.perf_counter()
+            with open(path, 'rb') as f:
+                result = import_file(f, fmt, BENCH_AGENT)
+            elapsed = time.perf_counter() - t0
+            print(json.dumps({'path': f'bulk_import_{fmt}', 'rows': args.rows,
+                              'inserted': result.inserted, 'failed': result.failed,
+                              'seconds': round(elapsed, 2),
+                              'rows_per_s': round(args.rows / elapsed),
+                              'dialect': db.engine.dialect.name}), flush=True)
+
+
+if __name__ == '__main__':
+    main()
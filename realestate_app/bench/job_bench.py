@@ -0,0 +1,111 @@
+# Background job queue: enqueue cost and worker throughput.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.job_bench --jobs 20000 --workers 1,2,4,8
+#
+# enqueue   --jobs jobs, each queued and committed in its own transaction (what a web
+#           request pays), then the same idempotency keys queued again: none may be added
+# drain     for each --workers count, --jobs jobs (--fail-share of them always raising, so
+#           they use up JOB_MAX_ATTEMPTS with the backoff shortened to --backoff-ms) are
+#           drained by that many `jobs.work` processes; reports jobs/s. Every job must end
+#           done after exactly one attempt, or failed after all of them - a job claimed by
+#           two workers would show up as an extra attempt.
+# Rows this bench queues are named 'bench.*' and deleted between runs.
+import argparse
+import json
+import multiprocessing
+import time
+
+from app import create_app
+from models import db, Job
+import jobs
+from bench.common import summarize
+
+app = create_app()
+
+
+@jobs.handler('bench.work')
+def _work(i, fail=False, work_ms=0):
+    if work_ms:
+        time.sleep(work_ms / 1000)
+    if fail:
+        raise RuntimeError(f'bench job {i} fails on purpose')
+
+
+def _clear():
+    Job.query.filter(Job.name.like('bench.%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _queue(n, fail_share, work_ms, batch=1000):
+    every = round(1 / fail_share) if fail_share else 0
+    for lo in range(0, n, batch):
+        for i in range(lo, min(n, lo + batch)):
+            jobs.enqueue('bench.work', {'i': i, 'fail': bool(every) and i % every == 0, 'work_ms': work_ms})
+        db.session.commit()
+
+
+def _drain(batch):
+    with app.app_context():
+        db.engine.dispose()             # connections inherited from the parent are not ours
+        queued = Job.query.filter(Job.name == 'bench.work', Job.status.in_(['queued', 'running']))
+        while jobs.work(batch=batch, once=True) or queued.count():
+            time.sleep(0.005)           # retries waiting out their backoff
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Job queue enqueue cost and worker throughput')
+    ap.add_argument('--jobs', type=int, default=20_000)
+    ap.add_argument('--workers', default='1,2,4,8', help='comma-separated worker process counts')
+    ap.add_argument('--batch', type=int, default=None, help='jobs claimed per round trip')
+    ap.add_argument('--work-ms', type=float, default=0, help='time each job sleeps')
+    ap.add_argument('--fail-share', type=float, default=0.01)
+    ap.add_argument('--backoff-ms', type=float, default=10)
+    args = ap.parse_args(argv)
+    app.config['JOB_RETRY_BACKOFF_S'] = args.backoff_ms / 1000
+
+    with app.app_context():
+        _clear()
+        samples = []
+        for i in range(args.jobs):
+            t = time.perf_counter()
+            jobs.enqueue('bench.enqueue', {'i': i}, key=f'bench:{i}')
+            db.session.commit()
+            samples.append((time.perf_counter() - t) * 1000)
+        again = sum(jobs.enqueue('bench.enqueue', {'i': i}, key=f'bench:{i}') for i in range(args.jobs))
+        db.session.commit()
+        assert again == 0, again
+        row = {'step': 'enqueue', 'jobs': args.jobs, 'duplicates_added': again,
+               'dialect': db.engine.dialect.name}
+        row.update(summarize(samples))
+        print(json.dumps(row), flush=True)
+
+        ctx = multiprocessing.get_context('fork')
+        for workers in [int(w) for w in args.workers.split(',')]:
+            _clear()
+            _queue(args.jobs, args.fail_share, args.work_ms)
+            db.engine.dispose()
+            t = time.perf_counter()
+            procs = [ctx.Process(target=_drain, args=(args.batch,)) for _ in range(workers)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            elapsed = time.perf_counter() - t
+            assert all(p.exitcode == 0 for p in procs)
+
+            outcome = dict(db.session.query(Job.status, db.func.count())
+                           .filter(Job.name == 'bench.work').group_by(Job.status).all())
+            wrong = Job.query.filter(Job.name == 'bench.work', db.or_(
+                db.and_(Job.status == 'done', Job.attempts != 1),
+                db.and_(Job.status == 'failed', Job.attempts != Job.max_attempts),
+                Job.status.notin_(['done', 'failed']))).count()
+            assert wrong == 0, (workers, wrong, outcome)
+            print(json.dumps({'step': 'drain', 'workers': workers, 'jobs': args.jobs,
+                              'done': outcome.get('done', 0), 'failed': outcome.get('failed', 0),
+                              'seconds': round(elapsed, 2), 'jobs_per_s': round(args.jobs / elapsed, 1),
+                              'dialect': db.engine.dialect.name}), flush=True)
+        _clear()
+
+
+if __name__ == '__main__':
+    main()
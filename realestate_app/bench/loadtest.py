@@ -0,0 +1,274 @@
+# Scripted load on the core user journeys: throughput and latency per endpoint.
+#
+#   python -m bench.loadtest --url http://127.0.0.1:5000 --users 32 --duration 60 --out run.json
+#   DATABASE_URL=sqlite:///bench.db python -m bench.loadtest --in-process --users 8
+#
+# Virtual users repeat the renter journey (login -> search -> property_detail ->
+# book_property -> my_bookings) or, for --agent-share of them, the agent journey
+# (login -> add_property -> agent_bookings) until --duration is up. Every journey logs in
+# from a fresh cookie jar as a random bench.datagen user, so --agents / --renters must
+# not exceed the generated counts. Redirects are not followed: each request is timed
+# on its own. --baseline compares against an earlier --out file.
+import argparse
+import http.cookiejar
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from bench.common import (
+    BENCH_PASSWORD, CITIES, STREETS, TYPES, WINDOW_START, WINDOW_END,
+    agent_email, renter_email, renter_card, percentile
+)
+
+_CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+_PROPERTY_LINK = re.compile(r'href="/property/(\d+)"')
+# seed_bookings() leaves the last day of every 7-day slot free
+_FREE_DAYS = [WINDOW_START + timedelta(days=k * 7 + 6)
+              for k in range((WINDOW_END - WINDOW_START).days // 7)]
+
+
+class JourneyError(Exception):
+    pass
+
+
+# ---- clients: real HTTP, or the Flask test client against DATABASE_URL ----
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read().decode()
+        except urllib.error.HTTPError as e:          # 3xx (not followed), 4xx, 5xx
+            return e.code, e.read().decode(errors='replace')
+
+
+class AppClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        resp = self.client.open(path, method=method, data=data)
+        return resp.status_code, resp.get_data(as_text=True)
+
+
+# ---- recording ----
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency_ms = defaultdict(list)      # endpoint -> samples
+        self.errors = Counter()
+        self.journeys = Counter()
+
+    def call(self, client, endpoint, path, data=None, expect=(200,)):
+        method = endpoint.split()[0]
+        t0 = time.perf_counter()
+        try:
+            status, body = client.request(method, path, data)
+        except OSError as exc:                   # refused, reset, timed out
+            status, body = repr(exc), ''
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self.lock:
+            self.latency_ms[endpoint].append(elapsed)
+            if status not in expect:
+                self.errors[endpoint] += 1
+        if status not in expect:
+            raise JourneyError(f'{endpoint} {path} -> {status}')
+        return status, body
+
+    def count(self, outcome):
+        with self.lock:
+            self.journeys[outcome] += 1
+
+
+def _csrf(page):
+    m = _CSRF.search(page)
+    return m.group(1) if m else ''
+
+
+# ---- journeys ----
+def login(client, rec, email):
+    _, page = rec.call(client, 'GET login', '/login')
+    rec.call(client, 'POST login', '/login',
+             {'csrf_token': _csrf(page), 'email': email, 'password': BENCH_PASSWORD}, expect=(302,))
+
+
+def renter_journey(client, rec, rng, args):
+    i = rng.randrange(args.renters)
+    login(client, rec, renter_email(i))
+    day = rng.choice(_FREE_DAYS).isoformat()
+    _, page = rec.call(client, 'GET search', '/search')
+    _, page = rec.call(client, 'POST search', '/search', {
+        'csrf_token': _csrf(page), 'location': rng.choice(CITIES)[0],
+        'date': day, 'end_date': day, 'property_type': '', 'order_by': 'price',
+    })
+    ids = _PROPERTY_LINK.findall(page)
+    if not ids:
+        rec.count('search_empty')
+        return
+    pid = rng.choice(ids)
+    rec.call(client, 'GET property_detail', f'/property/{pid}')
+    _, page = rec.call(client, 'GET book_property', f'/property/{pid}/book')
+    status, _ = rec.call(client, 'POST book_property', f'/property/{pid}/book', {
+        'csrf_token': _csrf(page), 'start_date': day, 'end_date': day,
+        'card_number': renter_card(i),
+    }, expect=(302, 409))
+    # 302 = booked; 409 = someone else got the day first
+    rec.count('booked' if status == 302 else 'booking_conflict')
+    rec.call(client, 'GET my_bookings', '/bookings')
+
+
+def agent_journey(client, rec, rng, args):
+    login(client, rec, agent_email(rng.randrange(args.agents)))
+    _, page = rec.call(client, 'GET add_property', '/property/add')
+    city, state = rng.choice(CITIES)
+    rec.call(client, 'POST add_property', '/property/add', {
+        'csrf_token': _csrf(page), 'property_type': rng.choice(TYPES),
+        'street': f'{rng.randint(1, 9999)} {rng.choice(STREETS)}', 'city': city, 'state': state,
+        'price': rng.randint(500, 9000), 'sqr_footage': rng.randint(300, 5000),
+        'available_from': WINDOW_START.isoformat(), 'available_to': WINDOW_END.isoformat(),
+        'description': 'load test', 'num_rooms': rng.randint(1, 6),
+        'building_type': 'mid-rise', 'business_type': 'retail',
+    }, expect=(302,))
+    rec.call(client, 'GET agent_bookings', '/agent/bookings')
+
+
+def run(make_client, args):
+    rec = Recorder()
+    n_agents = round(args.users * args.agent_share)
+    deadline = time.perf_counter() + args.duration
+
+    def virtual_user(n):
+        rng = random.Random(args.seed * 100_003 + n)
+        journey = agent_journey if n < n_agents else renter_journey
+        while time.perf_counter() < deadline:
+            try:
+                journey(make_client(), rec, rng, args)
+                rec.count('agent' if n < n_agents else 'renter')
+            except JourneyError as exc:
+                rec.count('failed')
+                if args.verbose:
+                    print(exc, file=sys.stderr)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(n,)) for n in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return rec, time.perf_counter() - t0
+
+
+# ---- results ----
+def _revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(rec, elapsed, args, target):
+    endpoints = {}
+    for name, samples in sorted(rec.latency_ms.items()):
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': rec.errors[name],
+            'rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p90_ms': round(percentile(samples, 90), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+            'mean_ms': round(statistics.fmean(samples), 2),
+            'max_ms': round(max(samples), 2),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': _revision(), 'target': target, 'python': platform.python_version(),
+            'users': args.users, 'agent_share': args.agent_share, 'seed': args.seed,
+            'duration_s': round(elapsed, 2),
+        },
+        'total': {'requests': total, 'errors': sum(rec.errors.values()),
+                  'rps': round(total / elapsed, 2)},
+        'journeys': dict(rec.journeys),
+        'endpoints': endpoints,
+    }
+
+
+def compare(result, baseline):
+    def delta(new, old):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+    print(f"{'endpoint':24} {'rps (old -> new)':^26}  {'p95_ms (old -> new)':^28}")
+    for name, cur in result['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if old is None:
+            print(f'{name:24} (not in baseline)')
+            continue
+        print(f"{name:24} {old['rps']:>7} -> {cur['rps']:<7} {delta(cur['rps'], old['rps']):>7}"
+              f"  {old['p95_ms']:>8} -> {cur['p95_ms']:<8} {delta(cur['p95_ms'], old['p95_ms']):>7}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Load test the renter and agent journeys')
+    ap.add_argument('--url', default='http://127.0.0.1:5000', help='running server to load')
+    ap.add_argument('--in-process', action='store_true',
+                    help='drive create_app() through the test client instead of HTTP')
+    ap.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    ap.add_argument('--duration', type=float, default=30, help='seconds')
+    ap.add_argument('--agent-share', type=float, default=0.1)
+    ap.add_argument('--agents', type=int, default=200, help='bench.datagen --agents')
+    ap.add_argument('--renters', type=int, default=5_000, help='bench.datagen --renters')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--out', help='write the JSON results here')
+    ap.add_argument('--baseline', help='results file from an earlier run to compare with')
+    ap.add_argument('--verbose', action='store_true', help='print failed journeys')
+    args = ap.parse_args(argv)
+
+    if args.in_process:
+        from app import create_app
+        from models import db
+        app = create_app()
+        with app.app_context():
+            target = f'in-process:{db.engine.dialect.name}'
+        rec, elapsed = run(lambda: AppClient(app), args)
+    else:
+        target = args.url
+        rec, elapsed = run(lambda: HttpClient(args.url), args)
+
+    result = report(rec, elapsed, args, target)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+    return 1 if not result['total']['requests'] or result['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
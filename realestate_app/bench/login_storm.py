@@ -0,0 +1,113 @@
+# Login throughput and search latency while a burst of logins hits the server.
+#
+#   python -m bench.login_storm --url http://127.0.0.1:5000 --storm 64 --duration 20
+#   DATABASE_URL=sqlite:///bench.db python -m bench.login_storm --in-process --hash-workers 0
+#
+# --searchers logged-in users keep searching throughout. The quiet phase measures them
+# alone; in the storm phase --storm more threads log in back to back as random
+# bench.datagen renters. Each phase prints one JSON line: logins accepted / turned away
+# (429) per second and login and search latency percentiles. --hash-workers (in-process
+# only) overrides PASSWORD_HASH_WORKERS; 0 hashes inline on the request thread, as
+# login() did before passwords.py.
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from bench.common import BENCH_PASSWORD, CITIES, WINDOW_START, renter_email, percentile
+from bench.loadtest import AppClient, HttpClient, _csrf
+
+
+def _login(client, email):
+    _, page = client.request('GET', '/login')
+    status, _ = client.request('POST', '/login',
+                               {'csrf_token': _csrf(page), 'email': email, 'password': BENCH_PASSWORD})
+    return status
+
+
+def phase(name, make_client, searchers, storm, args):
+    stop = threading.Event()
+    latency, outcomes, lock = defaultdict(list), Counter(), threading.Lock()
+
+    def record(kind, t0, outcome):
+        elapsed = (time.perf_counter() - t0) * 1000
+        with lock:
+            latency[kind].append(elapsed)
+            outcomes[kind, outcome] += 1
+
+    def search(client, rng):
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            _, page = client.request('GET', '/search')
+            status, _ = client.request('POST', '/search', {
+                'csrf_token': _csrf(page), 'location': rng.choice(CITIES)[0],
+                'date': WINDOW_START.isoformat(), 'property_type': '', 'order_by': 'price'})
+            record('search', t0, status)
+
+    def log_in(rng):
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            record('login', t0, _login(make_client(), renter_email(rng.randrange(args.renters))))
+
+    threads = [threading.Thread(target=search, args=(c, random.Random(i))) for i, c in enumerate(searchers)]
+    threads += [threading.Thread(target=log_in, args=(random.Random(1000 + i),)) for i in range(storm)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    row = {'phase': name, 'storm_threads': storm, 'searchers': len(searchers),
+           'seconds': round(elapsed, 1)}
+    if storm:
+        row['logins_ok_per_s'] = round(outcomes['login', 302] / elapsed, 2)
+        row['logins_429_per_s'] = round(outcomes['login', 429] / elapsed, 2)
+        row['login_p50_ms'] = round(percentile(latency['login'], 50), 1)
+        row['login_p95_ms'] = round(percentile(latency['login'], 95), 1)
+    samples = latency['search']
+    row['searches_per_s'] = round(len(samples) / elapsed, 2)
+    for p in (50, 95, 99):
+        row[f'search_p{p}_ms'] = round(percentile(samples, p), 1) if samples else None
+    row['errors'] = sum(n for (kind, status), n in outcomes.items()
+                        if status not in (200, 302, 429))
+    return row
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Login storm vs. search latency')
+    ap.add_argument('--url', default='http://127.0.0.1:5000')
+    ap.add_argument('--in-process', action='store_true')
+    ap.add_argument('--hash-workers', type=int, help='in-process only: PASSWORD_HASH_WORKERS')
+    ap.add_argument('--storm', type=int, default=32, help='threads logging in back to back')
+    ap.add_argument('--searchers', type=int, default=4)
+    ap.add_argument('--duration', type=float, default=20, help='seconds per phase')
+    ap.add_argument('--renters', type=int, default=5_000, help='bench.datagen --renters')
+    args = ap.parse_args(argv)
+
+    if args.in_process:
+        from app import create_app
+        import passwords
+        app = create_app()
+        if args.hash_workers is not None:
+            app.config['PASSWORD_HASH_WORKERS'] = args.hash_workers
+            passwords.init_app(app)
+        make_client = lambda: AppClient(app)       # noqa: E731
+    else:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+
+    searchers = []
+    for i in range(args.searchers):
+        client = make_client()
+        _login(client, renter_email(i))
+        searchers.append(client)
+    for name, storm in (('quiet', 0), ('storm', args.storm)):
+        print(json.dumps(phase(name, make_client, searchers, storm, args)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
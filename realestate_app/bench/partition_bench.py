@@ -0,0 +1,188 @@
+# Booking reads over a long history: monthly bookings partitions vs. one heap table.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.partition_bench --bookings 50000000
+#
+# Seeds --current bookings in the bench window (bench.common.seed_bookings) and tops the
+# table up to --bookings with history: every listing booked in consecutive weekly slots
+# running back from WINDOW_START (generated server-side on Postgres). Then times, over
+# current and future dates,
+#   search        property_search.filtered_query for a city and a stay (NOT EXISTS overlap)
+#   overlap       availability.has_overlap for one listing and stay
+#   quotes        pricing.quote_many for 100 (listing, stay) pairs
+#   renter_page   first and second page of a renter's bookings (newest first)
+#   agent_page    first page of an agent's bookings
+# On Postgres each row also reports how many bookings partitions the statement actually
+# read (EXPLAIN ANALYZE). Run it once at the head revision (partitioned) and once after
+# `flask db downgrade 2e6c4f8a1d93` (single table) to compare; --archive then moves
+# everything older than BOOKING_RETENTION_MONTHS out (booking_partitions.archive) and
+# times the same reads again.
+import argparse
+import json
+import random
+import time
+from datetime import timedelta
+
+from app import create_app
+from models import db, Booking, Property
+import booking_partitions
+from availability import has_overlap, overlaps
+from booking_export import bookings_page, bookings_query
+from pricing import quote_many
+from property_search import filtered_query
+from bench.common import (
+    CITIES, WINDOW_START, WINDOW_END, agent_email, renter_email, renter_card,
+    seed_users, seed_properties, seed_bookings, summarize, time_it
+)
+
+app = create_app()
+
+SLOT_DAYS = 7
+
+
+def seed_history(target, renters, batch_slots=4):
+    """Top bookings starting before WINDOW_START up to `target`, newest slots first."""
+    have = (db.session.query(db.func.count(Booking.booking_id))
+            .filter(Booking.start_date < WINDOW_START).scalar())
+    listings = db.session.query(db.func.count(Property.property_id)).scalar()
+    slot = have // listings
+    pg = db.engine.dialect.name == 'postgresql'
+    if booking_partitions.is_partitioned():
+        # months before the migration's first partition would otherwise fill bookings_default
+        oldest = WINDOW_START - timedelta(days=-(-target // listings) * SLOT_DAYS)
+        booking_partitions.add_partitions(oldest + timedelta(days=d)
+                                          for d in range(0, (WINDOW_START - oldest).days, 28))
+    while have < target:
+        slots = range(slot + 1, slot + 1 + min(batch_slots, -(-(target - have) // listings)))
+        if pg:
+            db.session.execute(db.text("""
+                INSERT INTO bookings (property_id, renter_email, card_number, start_date, end_date, total_cost)
+                SELECT p.property_id,
+                       'bench-renter-' || ((p.property_id + k) % :renters) || '@example.com',
+                       '4' || lpad(((p.property_id + k) % :renters)::text, 15, '0'),
+                       CAST(:first AS date) - k * :slot_days,
+                       CAST(:first AS date) - k * :slot_days + (p.property_id + k) % (:slot_days - 1),
+                       1000
+                FROM properties p CROSS JOIN generate_series(:lo, :hi) AS k
+            """), {'renters': renters, 'first': WINDOW_START, 'slot_days': SLOT_DAYS,
+                   'lo': slots[0], 'hi': slots[-1]})
+        else:
+            rows = []
+            for k in slots:
+                start = WINDOW_START - timedelta(days=k * SLOT_DAYS)
+                for (pid,) in db.session.query(Property.property_id):
+                    r = (pid + k) % renters
+                    rows.append({'property_id': pid, 'renter_email': renter_email(r),
+                                 'card_number': renter_card(r), 'start_date': start,
+                                 'end_date': start + timedelta(days=(pid + k) % (SLOT_DAYS - 1)),
+                                 'total_cost': 1000})
+            db.session.execute(Booking.__table__.insert(), rows)
+        db.session.commit()
+        have += listings * len(slots)
+        slot = slots[-1]
+    return have
+
+
+def partitions_read(q):
+    # bookings partitions a statement touched, from EXPLAIN ANALYZE (Postgres only)
+    if db.engine.dialect.name != 'postgresql':
+        return None
+    sql = str(q.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    plan = db.session.execute(db.text('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql)).scalar()
+    read = set()
+
+    def walk(node):
+        name = node.get('Relation Name', '')
+        if name.startswith('bookings') and node.get('Actual Loops', 0) > 0:
+            read.add(name)
+        for child in node.get('Plans', ()):
+            walk(child)
+    walk(plan[0]['Plan'])
+    db.session.rollback()
+    return len(read)
+
+
+def measure(args, rng, label):
+    def stay():
+        start = WINDOW_START + timedelta(days=rng.randint(0, (WINDOW_END - WINDOW_START).days - 30))
+        return start, start + timedelta(days=rng.randint(2, 14))
+
+    listings = db.session.query(db.func.max(Property.property_id)).scalar()
+
+    def search():
+        return filtered_query(rng.choice(CITIES)[0], *stay()).limit(20)
+
+    def overlap():
+        pid = rng.randint(1, listings)
+        return db.session.query(Booking.query.filter(
+            Booking.property_id == pid, overlaps(*stay())).exists())
+
+    def renter():
+        return bookings_query(renter_email=renter_email(rng.randrange(args.renters)))
+
+    def agent():
+        return bookings_query(agent_email=agent_email(rng.randrange(args.agents)))
+
+    def renter_pages():
+        q = renter()
+        page = bookings_page(q, 20)
+        if page.next_cursor:
+            bookings_page(q, 20, after=page.next_cursor)
+
+    runs = {
+        'search': (lambda: search().all(), search),
+        'overlap': (lambda: has_overlap(rng.randint(1, listings), *stay()), overlap),
+        'quotes': (lambda: quote_many([(rng.randint(1, listings), *stay()) for _ in range(100)]), None),
+        'renter_page': (renter_pages, lambda: renter().order_by(Booking.start_date.desc()).limit(21)),
+        'agent_page': (lambda: bookings_page(agent(), 20),
+                       lambda: agent().order_by(Booking.start_date.desc()).limit(21)),
+    }
+    total = db.session.query(db.func.count(Booking.booking_id)).scalar()
+    for name, (fn, query) in runs.items():
+        def one():
+            fn()
+            db.session.rollback()
+        row = {'step': label, 'query': name, 'bookings': total,
+               'partitioned': booking_partitions.is_partitioned(),
+               'partitions_read': partitions_read(query().statement) if query else None,
+               'dialect': db.engine.dialect.name}
+        row.update(summarize(time_it(one, args.repeat)))
+        print(json.dumps(row), flush=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Booking reads over a long, partitioned history')
+    ap.add_argument('--bookings', type=int, default=50_000_000)
+    ap.add_argument('--current', type=int, default=1_000_000, help='bookings inside the bench window')
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--agents', type=int, default=200)
+    ap.add_argument('--renters', type=int, default=20_000)
+    ap.add_argument('--repeat', type=int, default=50)
+    ap.add_argument('--archive', action='store_true',
+                    help='archive past the retention window, then measure again')
+    args = ap.parse_args(argv)
+
+    rng = random.Random(24)
+    with app.app_context():
+        t0 = time.perf_counter()
+        seed_users(args.agents, args.renters)
+        seed_properties(args.properties, agents=args.agents)
+        seed_bookings(args.current, renters=args.renters)
+        have = seed_history(args.bookings - args.current, args.renters)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE bookings'))
+            db.session.commit()
+        print(json.dumps({'step': 'seed', 'history': have,
+                          'seconds': round(time.perf_counter() - t0, 1)}), flush=True)
+
+        measure(args, rng, 'full_history')
+        if args.archive:
+            t = time.perf_counter()
+            moved = booking_partitions.archive(app.config['BOOKING_RETENTION_MONTHS'])
+            print(json.dumps({'step': 'archive', 'units': len(moved),
+                              'bookings': sum(n for _, n in moved),
+                              'seconds': round(time.perf_counter() - t, 1)}), flush=True)
+            measure(args, rng, 'archived')
+
+
+if __name__ == '__main__':
+    main()
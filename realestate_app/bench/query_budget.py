@@ -0,0 +1,115 @@
+# SQL statement budget per view.
+#
+#   python -m bench.query_budget
+#
+# Seeds a throwaway SQLite database at two sizes, renders each view through the test
+# client and counts the statements it issues. A view fails if it goes over its budget
+# or if its count grows with the number of rows on the page (an N+1 lazy load).
+# Exits non-zero on failure so it can gate CI.
+import os
+import sys
+import tempfile
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'budget.db')
+# measure the query path, not cache hits
+os.environ['SEARCH_CACHE_BACKEND'] = os.environ['IDENTITY_CACHE_BACKEND'] = 'none'
+
+from datetime import date                                        # noqa: E402
+
+from werkzeug.security import generate_password_hash             # noqa: E402
+
+from app import create_app                                       # noqa: E402
+from models import (                                             # noqa: E402
+    db, User, Agent, Renter, Address, CreditCard,
+    Property, House, Apartment, CommercialBuilding, Booking
+)
+
+AGENT, RENTER, CARD = 'budget-agent@example.com', 'budget-renter@example.com', '4000000000000002'
+
+# view -> (method, url, form data, max statements); the budget includes load_user.
+# Searches run the result page and the facet counts query.
+VIEWS = {
+    'search': ('POST', '/search?per_page=50',
+               {'location': 'chicago', 'date': '2025-06-01', 'property_type': '', 'order_by': 'price'}, 3),
+    'search_rooms': ('POST', '/search?per_page=50',
+                     {'location': 'chicago', 'date': '2025-06-01', 'property_type': '',
+                      'order_by': 'rooms', 'min_bedrooms': '1'}, 3),
+    'search_radius': ('POST', '/search?per_page=50',
+                      {'location': 'chicago', 'date': '2025-06-01', 'property_type': '',
+                       'order_by': 'price', 'radius': '10'}, 3),
+    # listing + its occupancy bitmap row for the calendar widget
+    'property_detail': ('GET', '/property/1?month=2025-09', None, 3),
+    'my_bookings': ('GET', '/bookings', None, 2),
+    'agent_bookings': ('GET', '/agent/bookings', None, 2),
+    'api_search': ('GET', '/api/v1/search?location=chicago&date=2025-06-01&per_page=50', None, 3),
+    'api_property': ('GET', '/api/v1/properties/1', None, 2),
+    'api_calendar': ('GET', '/api/v1/properties/1/calendar?month=2025-09', None, 3),
+}
+
+app = create_app()
+
+
+def seed(n):
+    db.drop_all()
+    db.create_all()
+    db.session.add_all([
+        User(email=AGENT, full_name='Agent', user_type='agent', password_hash=generate_password_hash('pw')),
+        Agent(email=AGENT),
+        User(email=RENTER, full_name='Renter', user_type='renter', password_hash=generate_password_hash('pw')),
+        Renter(email=RENTER),
+        Address(address_id=1, user_email=RENTER, street='1 Main', city='Chicago'),
+        CreditCard(card_number=CARD, renter_email=RENTER, billing_address=1),
+    ])
+    for i in range(n):
+        kind = ('house', 'apartment', 'commercial')[i % 3]
+        p = Property(agent_email=AGENT, property_type=kind, street=f'{i} Elm St', city='Chicago',
+                     state='IL', price=1000 + i, available_from=date(2025, 1, 1),
+                     available_to=date(2026, 12, 31),
+                     num_rooms=None if kind == 'commercial' else 1 + i % 4)
+        db.session.add(p)
+        db.session.flush()
+        if kind == 'house':
+            db.session.add(House(property_id=p.property_id, num_rooms=1 + i % 4))
+        elif kind == 'apartment':
+            db.session.add(Apartment(property_id=p.property_id, num_rooms=1 + i % 4))
+        else:
+            db.session.add(CommercialBuilding(property_id=p.property_id))
+        # booked later in the year so the June search still returns every listing
+        db.session.add(Booking(property_id=p.property_id, renter_email=RENTER, card_number=CARD,
+                               start_date=date(2025, 9, 1), end_date=date(2025, 9, 30),
+                               total_cost=1000 + i))
+    db.session.commit()
+
+
+def count_statements(client, method, url, data):
+    resp = client.open(url, method=method, data=data)
+    assert resp.status_code == 200, f'{method} {url} -> {resp.status_code}'
+    return int(resp.headers['X-DB-Query-Count'])       # set by instrumentation.py
+
+
+def main():
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    counts = {}
+    for n in (3, 30):
+        # seed in its own app context so each request below starts with an empty session
+        with app.app_context():
+            seed(n)
+        for who in (RENTER, AGENT):
+            client = app.test_client()
+            client.post('/login', data={'email': who, 'password': 'pw'})
+            for name, (method, url, data, _) in VIEWS.items():
+                if (name == 'agent_bookings') != (who == AGENT):
+                    continue
+                counts.setdefault(name, {})[n] = count_statements(client, method, url, data)
+
+    failed = False
+    for name, (_, _, _, budget) in VIEWS.items():
+        small, large = counts[name][3], counts[name][30]
+        ok = large <= budget and small == large
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:16} budget={budget} rows=3:{small} rows=30:{large}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Pricing 10k (property, stay) pairs: one quote at a time vs. pricing.quote_many().
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.quote_bench --quotes 10000
+#
+# Seeds listings and bookings (bench.common), draws --quotes random stays over the
+# seeded listings and prices them three ways: the per-quote path a booking form takes
+# (load the listing, probe for overlaps, total_cost), quote_many() directly, and
+# POST /api/v1/quotes through the test client (JSON in and out included).
+import argparse
+import json
+import random
+import time
+from datetime import timedelta
+
+from app import create_app
+from models import db, Property
+from availability import has_overlap
+import pricing
+from bench.common import WINDOW_START, WINDOW_END, renter_email, seed_users, seed_properties, seed_bookings
+
+app = create_app()
+
+
+def one_by_one(requests):
+    for pid, start, end in requests:
+        p = db.session.get(Property, pid)
+        has_overlap(pid, start, end)
+        pricing.total_cost(p.price, start, end)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Batch price quotes')
+    ap.add_argument('--properties', type=int, default=100_000)
+    ap.add_argument('--bookings', type=int, default=1_000_000)
+    ap.add_argument('--quotes', type=int, default=10_000)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(18)
+    with app.app_context():
+        seed_users(1, 1)
+        have = seed_properties(args.properties)
+        seed_bookings(args.bookings)
+        span = (WINDOW_END - WINDOW_START).days
+        requests = []
+        for _ in range(args.quotes):
+            start = WINDOW_START + timedelta(days=rng.randrange(span))
+            requests.append((rng.randint(1, have), start, start + timedelta(days=rng.randrange(90))))
+        # stays past MAX_BOOKING_DAYS are refused before the overlap probe, which cannot see them
+        pid, last = requests[0][0], WINDOW_START + timedelta(days=pricing.MAX_BOOKING_DAYS - 1)
+        statuses = [q.status for q in pricing.quote_many([(pid, WINDOW_START, last),
+                                                          (pid, WINDOW_START, last + timedelta(days=1))])]
+        assert statuses[0] != 'too_long' and statuses[1] == 'too_long', statuses
+        dialect = db.engine.dialect.name
+        body = {'quotes': [{'property_id': pid, 'start': s.isoformat(), 'end': e.isoformat()}
+                           for pid, s, e in requests]}
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['_user_id'] = renter_email(0)
+
+    def endpoint():
+        resp = client.post('/api/v1/quotes', json=body)
+        assert resp.status_code == 200, resp.status_code
+
+    for name, fn, repeat in (('one_by_one', lambda: one_by_one(requests), 1),
+                             ('quote_many', lambda: pricing.quote_many(requests), args.repeat),
+                             ('post_api_quotes', endpoint, args.repeat)):
+        best = None
+        for _ in range(repeat):
+            with app.app_context():
+                t0 = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        print(json.dumps({'path': name, 'quotes': args.quotes, 'best_seconds': round(best, 3),
+                          'quotes_per_s': round(args.quotes / best),
+                          'dialect': dialect}), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Bedroom filter/sort: House/Apartment outer joins vs. the denormalized num_rooms column.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.rooms_bench --properties 1000000
+import argparse
+import json
+import random
+
+from app import create_app
+from models import db, Property, House, Apartment
+from bench.common import seed_properties, summarize, time_it
+
+app = create_app()
+
+
+def joined_query(min_rooms, max_price):
+    rooms = db.func.coalesce(House.num_rooms, Apartment.num_rooms)
+    return (db.session.query(Property.property_id)
+            .outerjoin(House).outerjoin(Apartment)
+            .filter(rooms >= min_rooms, Property.price <= max_price)
+            .order_by(rooms.nullslast(), Property.property_id)
+            .limit(24))
+
+
+def column_query(min_rooms, max_price):
+    return (db.session.query(Property.property_id)
+            .filter(Property.num_rooms >= min_rooms, Property.price <= max_price)
+            .order_by(Property.num_rooms.nullslast(), Property.property_id)
+            .limit(24))
+
+
+def explain(q):
+    dialect = db.engine.dialect
+    sql = str(q.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN ANALYZE ' if dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    rows = db.session.execute(db.text(prefix + sql)).fetchall()
+    return [' | '.join(str(c) for c in row) for row in rows]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Bedroom filter/sort, joins vs. column')
+    ap.add_argument('--properties', type=int, default=1_000_000)
+    ap.add_argument('--repeat', type=int, default=50)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(3)
+    with app.app_context():
+        seed_properties(args.properties)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE properties; ANALYZE houses; ANALYZE apartments'))
+            db.session.commit()
+        for name, build in (('subtype_joins', joined_query), ('num_rooms_column', column_query)):
+            print(f'-- {name}')
+            for line in explain(build(4, 3000)):
+                print('   ', line)
+            samples = time_it(lambda: build(rng.randint(1, 6), rng.randint(1000, 9000)).all(), args.repeat)
+            row = {'query': name, 'properties': args.properties, 'dialect': db.engine.dialect.name}
+            row.update(summarize(samples))
+            print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Saved-search alerts: indexed incremental matching vs. scanning every saved search.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.saved_search_bench --searches 1000000 --rate 20
+#
+# Tops saved_searches up to --searches rows spread over --renters generated renters (one
+# city by name, or --radius-share of them a radius around a synthetic city centre, with
+# random type / price / bedroom filters and a stay in the next 600 days). Then adds new
+# listings through the ORM at a steady --rate per second for --duration seconds; every
+# commit queues a saved_searches matching job, which is run right after it (jobs.work),
+# and reports the commit's and the job's latency, candidates read and inbox rows written
+# per listing. `scan` times the alternative for a few
+# listings: one pass over all saved searches testing each against the listing, which
+# must find exactly the inbox rows the matcher wrote.
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from models import db, Property, SavedSearch, SavedSearchMatch
+import jobs
+import saved_searches
+from bench.common import (
+    CITIES, CITY_CENTERS, CITY_SCATTER, TYPES, agent_email, renter_email,
+    seed_users, summarize, percentile
+)
+
+app = create_app()
+
+
+def seed_searches(target, renters, radius_share, batch=10_000):
+    rng = random.Random(22)
+    have = db.session.query(db.func.count(SavedSearch.search_id)).scalar()
+    while have < target:
+        rows = []
+        for _ in range(min(batch, target - have)):
+            ci = rng.randrange(len(CITIES))
+            city, _state = CITIES[ci]
+            near = radius = None
+            if rng.random() < radius_share:
+                near, radius = CITY_CENTERS[ci], rng.choice((5.0, 10.0, 25.0))
+            max_price = rng.choice((None, 1500, 2500, 4000, 6000))
+            start = date.today() + timedelta(days=rng.randrange(600))
+            rows.append({
+                'renter_email': renter_email(rng.randrange(renters)),
+                'location': city, 'start_date': start,
+                'end_date': start + timedelta(days=rng.randint(2, 30)),
+                'property_type': rng.choice(('', '') + tuple(TYPES)),
+                'min_price': None, 'max_price': max_price,
+                'min_bedrooms': rng.choice((None, None, 1, 2, 3)),
+                'radius': radius,
+                'latitude': near and near[0], 'longitude': near and near[1],
+                'match_key': saved_searches.search_key(city, near, radius),
+                'price_band': saved_searches.price_band(max_price),
+                'created_at': datetime.utcnow(),
+            })
+        db.session.execute(SavedSearch.__table__.insert(), rows)
+        db.session.commit()
+        have += len(rows)
+    return have
+
+
+def new_listing(rng):
+    ci = rng.randrange(len(CITIES))
+    city, state = CITIES[ci]
+    kind = rng.choice(TYPES)
+    lat, lng = CITY_CENTERS[ci]
+    return Property(agent_email=agent_email(0), property_type=kind, street=f'{rng.randint(1, 9999)} Bench Ave',
+                    city=city, state=state, price=rng.randint(500, 9000),
+                    num_rooms=None if kind == 'commercial' else rng.randint(1, 6),
+                    latitude=lat + rng.uniform(-CITY_SCATTER, CITY_SCATTER),
+                    longitude=lng + rng.uniform(-CITY_SCATTER, CITY_SCATTER),
+                    available_from=date.today(), available_to=date.today() + timedelta(days=700))
+
+
+def scan_matches(pid):
+    # no index: read every saved search and test it
+    table = Property.__table__
+    with db.engine.connect() as conn:
+        p = conn.execute(db.select(table).where(table.c.property_id == pid)).one()
+        return sum(1 for s in conn.execute(db.select(SavedSearch.__table__))
+                   if saved_searches._matches(s, p, [], date.today()))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Saved-search matching on listing commits')
+    ap.add_argument('--searches', type=int, default=1_000_000)
+    ap.add_argument('--renters', type=int, default=20_000)
+    ap.add_argument('--radius-share', type=float, default=0.2)
+    ap.add_argument('--rate', type=float, default=20, help='new listings per second')
+    ap.add_argument('--duration', type=float, default=30, help='seconds')
+    ap.add_argument('--scan-listings', type=int, default=3)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(23)
+    with app.app_context():
+        seed_users(1, args.renters)
+        t0 = time.perf_counter()
+        have = seed_searches(args.searches, args.renters, args.radius_share)
+        print(json.dumps({'step': 'seed', 'saved_searches': have,
+                          'seconds': round(time.perf_counter() - t0, 1)}), flush=True)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE saved_searches'))
+            db.session.commit()
+
+        latency, match_latency, behind, pids = [], [], [], []
+        matched_before = db.session.query(db.func.count(SavedSearchMatch.match_id)).scalar()
+        n = int(args.rate * args.duration)
+        start = time.perf_counter()
+        for i in range(n):
+            due = start + i / args.rate
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                behind.append(-wait * 1000)
+            p = new_listing(rng)
+            t = time.perf_counter()
+            db.session.add(p)
+            db.session.commit()
+            latency.append((time.perf_counter() - t) * 1000)
+            pids.append(p.property_id)
+            db.session.expunge_all()
+            t = time.perf_counter()
+            assert jobs.work(once=True) == 1
+            match_latency.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - start
+        matched = db.session.query(db.func.count(SavedSearchMatch.match_id)).scalar() - matched_before
+
+        candidates = []
+        table = Property.__table__
+        with db.engine.connect() as conn:
+            for pid in pids[:200]:
+                p = conn.execute(db.select(table).where(table.c.property_id == pid)).one()
+                candidates.append(len(saved_searches._candidates(conn, p)))
+        row = {'query': 'indexed', 'saved_searches': have, 'listings': n,
+               'target_rate': args.rate, 'achieved_rate': round(n / elapsed, 1),
+               'late_commits': len(behind), 'inbox_rows': matched,
+               'candidates_p50': percentile(candidates, 50), 'candidates_max': max(candidates),
+               'dialect': db.engine.dialect.name}
+        row.update(summarize(latency))
+        row['p99_ms'] = round(percentile(latency, 99), 3)
+        row.update({'match_p50_ms': round(percentile(match_latency, 50), 3),
+                    'match_p95_ms': round(percentile(match_latency, 95), 3)})
+        print(json.dumps(row), flush=True)
+
+        scan = []
+        for pid in pids[:args.scan_listings]:
+            t = time.perf_counter()
+            found = scan_matches(pid)
+            scan.append((time.perf_counter() - t) * 1000)
+            # the index must not have missed anything the scan finds
+            assert found == SavedSearchMatch.query.filter_by(property_id=pid).count(), pid
+        row = {'query': 'scan', 'saved_searches': have, 'listings': len(scan),
+               'dialect': db.engine.dialect.name}
+        row.update(summarize(scan))
+        print(json.dumps(row), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# Location search latency: legacy triple ILIKE vs. the normalized location key.
+#
+#   DATABASE_URL=postgresql://.../bench_db python -m bench.search_bench --sizes 10000 100000 1000000
+import argparse
+import json
+import random
+from datetime import date
+
+from sqlalchemy import or_
+
+from app import create_app
+from models import db, Property
+from property_search import location_filter
+from bench.common import CITIES, seed_properties, summarize, time_it
+
+SEARCH_DATE = date(2025, 6, 1)
+
+app = create_app()
+
+
+def legacy_query(loc):
+    return Property.query.filter(
+        Property.available_from <= SEARCH_DATE,
+        Property.available_to >= SEARCH_DATE,
+        or_(Property.city.ilike(f"%{loc}%"),
+            Property.state.ilike(f"%{loc}%"),
+            Property.street.ilike(f"%{loc}%")),
+    ).with_entities(Property.property_id).all()
+
+
+def keyed_query(loc):
+    return Property.query.filter(
+        Property.available_from <= SEARCH_DATE,
+        Property.available_to >= SEARCH_DATE,
+        location_filter(loc),
+    ).with_entities(Property.property_id).all()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Location search latency, legacy vs. keyed')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    ap.add_argument('--repeat', type=int, default=50)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(7)
+    results = []
+    with app.app_context():
+        for size in sorted(args.sizes):
+            seed_properties(size)
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(db.text('ANALYZE properties'))
+                db.session.commit()
+            terms = [rng.choice(CITIES)[0] for _ in range(args.repeat)]
+            for name, fn in (('legacy_ilike', legacy_query), ('location_key', keyed_query)):
+                it = iter(terms)
+                row = {'size': size, 'query': name, 'dialect': db.engine.dialect.name}
+                row.update(summarize(time_it(lambda: fn(next(it)), args.repeat)))
+                results.append(row)
+                print(json.dumps(row), flush=True)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import random
+import time
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, Property, Booking
+from availability import has_overlap, MAX_BOOKING_DAYS
+from pricing import total_cost
+
+# Booking writes. book() locks the property row, checks the availability window and
+# the existing bookings and inserts the booking in one transaction, so two renters
+# racing for the same dates are serialized on the listing and the second one sees the
+# first one's booking. Bookings of different listings never wait on each other.
+#   Postgres: SELECT ... FOR UPDATE, bounded by a local lock_timeout. bookings is
+#             partitioned by month; each partition's exclusion constraint and the
+#             bookings_no_overlap trigger (across months) remain the backstop for
+#             every writer, and report the same SQLSTATE.
+#   SQLite:   a no-op UPDATE of the property takes the database write lock up front.
+# Lock timeouts, serialization failures and deadlocks roll back and are retried with
+# jittered exponential backoff; after BOOKING_MAX_ATTEMPTS the caller gets Busy.
+_RETRY_SQLSTATES = {'40001', '40P01', '55P03'}   # serialization failure, deadlock, lock timeout
+_EXCLUSION_VIOLATION = '23P01'
+
+
+class BookingError(Exception):
+    message = 'This booking could not be made.'
+
+    def __str__(self):
+        return self.message
+
+
+class OutsideWindow(BookingError):
+    message = 'Selected dates are outside this property’s availability window.'
+
+
+class TooLong(BookingError):
+    message = f'Stays can be at most {MAX_BOOKING_DAYS} days long.'
+
+
+class Conflict(BookingError):
+    message = 'This property is already booked for some of those dates.'
+
+
+class Busy(BookingError):
+    message = 'This property is getting a lot of bookings right now. Please try again.'
+
+
+def _retryable(exc):
+    if db.engine.dialect.name == 'sqlite':
+        return 'database is locked' in str(exc.orig)
+    return getattr(exc.orig, 'pgcode', None) in _RETRY_SQLSTATES
+
+
+def _lock_property(pid):
+    q = Property.query.filter(Property.property_id == pid).populate_existing()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text("SELECT set_config('lock_timeout', :ms, true)"),
+                           {'ms': str(current_app.config['BOOKING_LOCK_TIMEOUT_MS'])})
+        return q.with_for_update().one_or_none()
+    table = Property.__table__
+    db.session.execute(table.update().where(table.c.property_id == pid)
+                       .values(property_id=table.c.property_id))
+    return q.one_or_none()
+
+
+def _book_once(pid, renter_email, card_number, start, end):
+    p = _lock_property(pid)
+    if p is None:
+        raise Conflict()                        # deleted since the form was shown
+    if not (p.available_from and p.available_to and
+            p.available_from <= start <= end <= p.available_to):
+        raise OutsideWindow()
+    if has_overlap(pid, start, end):
+        raise Conflict()
+    b = Booking(property_id=pid, renter_email=renter_email, card_number=card_number,
+                start_date=start, end_date=end, total_cost=total_cost(p.price, start, end))
+    db.session.add(b)
+    db.session.commit()
+    return b
+
+
+def book(pid, renter_email, card_number, start, end):
+    """Insert and commit a booking of [start, end]; raises a BookingError subclass if it cannot."""
+    if (end - start).days + 1 > MAX_BOOKING_DAYS:
+        raise TooLong()
+    attempts = current_app.config['BOOKING_MAX_ATTEMPTS']
+    backoff = current_app.config['BOOKING_RETRY_BACKOFF_MS'] / 1000
+    for attempt in range(1, attempts + 1):
+        try:
+            return _book_once(pid, renter_email, card_number, start, end)
+        except BookingError:
+            db.session.rollback()
+            raise
+        except IntegrityError as exc:
+            db.session.rollback()
+            if getattr(exc.orig, 'pgcode', None) == _EXCLUSION_VIOLATION:
+                raise Conflict() from exc
+            raise
+        except OperationalError as exc:
+            db.session.rollback()
+            if not _retryable(exc):
+                raise
+            if attempt == attempts:
+                raise Busy() from exc
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+from datetime import date
+from itertools import chain
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import contains_eager
+
+from models import Booking, Property
+from property_search import Page, encode_cursor, decode_cursor
+
+# Booking lists for the renter / agent pages and their CSV / NDJSON exports. Both read
+# bookings_query(): the pages fetch one keyset page of ORM rows, the exports stream plain
+# column tuples through a server-side cursor, so memory stays flat however many bookings
+# an agency has.
+EXPORT_COLUMNS = [
+    Booking.booking_id, Booking.start_date, Booking.end_date, Booking.total_cost,
+    Booking.renter_email, Property.property_id, Property.property_type,
+    Property.street, Property.city, Property.state, Property.price.label('monthly_price'),
+]
+EXPORT_FIELDS = [c.key for c in EXPORT_COLUMNS]
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+_FLUSH_BYTES = 64 * 1024
+
+
+def bookings_query(agent_email=None, renter_email=None, start=None, end=None, property_id=None):
+    """Bookings joined to their property; start/end keep bookings that touch [start, end]."""
+    q = Booking.query.join(Property)
+    if agent_email is not None:
+        q = q.filter(Property.agent_email == agent_email)
+    if renter_email is not None:
+        q = q.filter(Booking.renter_email == renter_email)
+    if start is not None:
+        q = q.filter(Booking.end_date >= start)
+    if end is not None:
+        q = q.filter(Booking.start_date <= end)
+    if property_id is not None:
+        q = q.filter(Booking.property_id == property_id)
+    return q
+
+
+# ---- HTML pages: newest stay first, keyset on (start_date, booking_id) ----
+def _cursor(b):
+    return encode_cursor(b.start_date.isoformat(), b.booking_id)
+
+
+def bookings_page(q, per_page, after=None, before=None):
+    q = q.options(contains_eager(Booking.property))
+    after = decode_cursor(after, date.fromisoformat)
+    before = None if after else decode_cursor(before, date.fromisoformat)
+
+    # the plain start_date bound repeats the keyset condition in a form Postgres can use
+    # to skip monthly bookings partitions
+    if before:
+        day, bid = before
+        q = q.filter(Booking.start_date >= day,
+                     or_(Booking.start_date > day,
+                         and_(Booking.start_date == day, Booking.booking_id > bid)))
+        q = q.order_by(Booking.start_date, Booking.booking_id)
+    else:
+        if after:
+            day, bid = after
+            q = q.filter(Booking.start_date <= day,
+                         or_(Booking.start_date < day,
+                             and_(Booking.start_date == day, Booking.booking_id < bid)))
+        q = q.order_by(Booking.start_date.desc(), Booking.booking_id.desc())
+
+    rows = q.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    first = _cursor(rows[0]) if rows else None
+    last = _cursor(rows[-1]) if rows else None
+    if before:
+        return Page(rows, last, first if more else None)
+    return Page(rows, last if more else None, first if after else None)
+
+
+# ---- exports ----
+def export_rows(q, yield_per=1000):
+    # yield_per streams results (a server-side cursor on psycopg2) in yield_per chunks
+    return (q.with_entities(*EXPORT_COLUMNS)
+             .order_by(Booking.start_date, Booking.booking_id)
+             .yield_per(yield_per))
+
+
+def _chunks(lines):
+    # coalesce small writes into ~64 KB response chunks
+    buf = io.StringIO()
+    for line in lines:
+        buf.write(line)
+        if buf.tell() >= _FLUSH_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for values in chain([EXPORT_FIELDS], rows):
+        writer.writerow(values)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + '\n'
+
+
+def stream(q, fmt, yield_per=1000):
+    rows = export_rows(q, yield_per)
+    return _chunks(_csv_lines(rows) if fmt == 'csv' else _ndjson_lines(rows))
@@ -0,0 +1,206 @@
+import csv
+import gzip
+import os
+import re
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from availability import MAX_BOOKING_DAYS
+from models import db, Booking, ArchivedBooking
+
+# On Postgres `bookings` is range-partitioned by month of start_date (migration
+# 4f1a7c2e9b60): bookings_p2025_06 holds the stays that start in June 2025 and
+# bookings_default whatever falls past the last month created. Lookups that bound
+# start_date (availability.overlaps, the bookings pages' keyset) only read the months in
+# range.
+#   ensure_partitions()  creates monthly partitions up to some months ahead, and for any
+#                        month that has rows in bookings_default; run
+#                        `flask booking-partitions` monthly so the default stays empty.
+#   archive()            moves whole months that started before the retention window
+#                        out of `bookings`. A partition is detached, stripped of its
+#                        indexes and constraints and attached to bookings_archive (no
+#                        rows are copied), or written to <dir>/<name>.csv.gz and dropped.
+#                        Without partitions (SQLite) the rows are copied and deleted.
+# Archived stays leave the renter / agent booking pages. booking_stats.rebuild() and
+# occupancy.rebuild() still count bookings_archive; months exported to CSV keep their
+# rollup rows and calendar days until a rebuild.
+_PARTITION = re.compile(r'^bookings_p(\d{4})_(\d{2})$')
+_BOOKINGS = Booking.__table__
+_ARCHIVE = ArchivedBooking.__table__
+_COLUMNS = [c.name for c in _BOOKINGS.columns]
+
+
+def _month(d, add=0):
+    m = d.month - 1 + add
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(db.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('bookings'))")).scalar()
+
+
+def partitions():
+    """[(first day of month, partition name)] of bookings, oldest first."""
+    names = db.session.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('bookings')")).scalars()
+    return sorted((date(int(m[1]), int(m[2]), 1), m[0])
+                  for m in map(_PARTITION.match, names) if m)
+
+
+def add_partitions(months):
+    """Create the monthly partitions of `months` (any day in each) that are missing;
+    returns how many were created."""
+    created = 0
+    for month in sorted({m.replace(day=1) for m in months}):
+        # one transaction each: every call takes brief locks on bookings
+        created += db.session.execute(db.text('SELECT bookings_add_partition(:m)'), {'m': month}).scalar()
+        db.session.commit()
+    return created
+
+
+def ensure_partitions(ahead_months, today=None):
+    """Create the missing monthly partitions from this month to `ahead_months` ahead,
+    and for every month with rows in bookings_default; returns how many were created."""
+    first = (today or date.today()).replace(day=1)
+    months = [_month(first, k) for k in range(ahead_months + 1)]
+    months += db.session.execute(db.text(
+        "SELECT DISTINCT date_trunc('month', start_date)::date FROM bookings_default")).scalars()
+    return add_partitions(months)
+
+
+def cutoff(keep_months, today=None):
+    """First start_date kept in `bookings` when keeping `keep_months` whole months."""
+    today = today or date.today()
+    first = _month(today, -keep_months)
+    if first + timedelta(days=MAX_BOOKING_DAYS) > today:
+        raise ValueError(f'stays starting before {first} may still be running; '
+                         f'keep more months')
+    return first
+
+
+def _write_csv(rows, path):
+    # written under <path>.part (a leftover of a failed run is overwritten) and linked to
+    # `path` only when complete, which never overwrites an export
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    part, n = path + '.part', 0
+    try:
+        with gzip.open(part, 'wt', newline='') as f:
+            out = csv.writer(f)
+            out.writerow(_COLUMNS)
+            for row in rows:
+                out.writerow(row)
+                n += 1
+        os.link(part, path)
+    finally:
+        if os.path.exists(part):
+            os.unlink(part)
+    return n
+
+
+def _stream(table):
+    return db.session.execute(
+        select(*(table.c[c] for c in _COLUMNS))
+        .order_by(table.c.start_date, table.c.booking_id)
+        .execution_options(stream_results=True))
+
+
+def _quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+
+def _archive_partition(month, name, csv_dir):
+    part = _quote(name)
+    db.session.execute(db.text("SET LOCAL lock_timeout = '5s'"))
+    db.session.execute(db.text(f'ALTER TABLE bookings DETACH PARTITION {part}'))
+    if csv_dir:
+        rows = _write_csv(_stream(db.table(name, *(db.column(c) for c in _COLUMNS))),
+                          os.path.join(csv_dir, f'{name}.csv.gz'))
+        db.session.execute(db.text(f'DROP TABLE {part}'))
+        return rows
+    # archived rows are read rarely and in bulk: no indexes, and no foreign keys that
+    # would block deleting a listing, renter or card
+    for (con,) in db.session.execute(db.text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) "
+            "AND contype IN ('p', 'u', 'f', 'x')"), {'t': name}):
+        db.session.execute(db.text(f'ALTER TABLE {part} DROP CONSTRAINT {_quote(con)}'))
+    for (idx,) in db.session.execute(db.text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = CAST(:t AS regclass)"), {'t': name}):
+        db.session.execute(db.text(f'DROP INDEX {_quote(idx)}'))
+    archived = f'bookings_archive_p{month:%Y_%m}'
+    db.session.execute(db.text(f'ALTER TABLE {part} RENAME TO {_quote(archived)}'))
+    db.session.execute(db.text(
+        f"ALTER TABLE bookings_archive ATTACH PARTITION {_quote(archived)} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month(month, 1).isoformat()}')"))
+    return db.session.execute(db.text(f'SELECT count(*) FROM {_quote(archived)}')).scalar()
+
+
+def archive(keep_months, csv_dir=None, today=None):
+    """Move bookings starting before cutoff(keep_months) out of `bookings`, one
+    transaction per month (per run without partitions); returns [(label, rows)]."""
+    first_kept = cutoff(keep_months, today)
+    moved = []
+    if is_partitioned():
+        # rows of months that never had a partition get one first, so whole months move
+        ensure_partitions(0, today)
+        for month, name in partitions():
+            if month >= first_kept:
+                break
+            moved.append((name, _archive_partition(month, name, csv_dir)))
+            db.session.commit()
+        return moved
+
+    old = _BOOKINGS.c.start_date < first_kept
+    if csv_dir:
+        rows = _write_csv(_stream(_BOOKINGS.select().where(old).subquery()),
+                          os.path.join(csv_dir, f'bookings_before_{first_kept:%Y_%m}.csv.gz'))
+    else:
+        rows = db.session.execute(_ARCHIVE.insert().from_select(
+            _COLUMNS, select(*(_BOOKINGS.c[c] for c in _COLUMNS)).where(old))).rowcount
+    db.session.execute(_BOOKINGS.delete().where(old))
+    db.session.commit()
+    return [(f'bookings before {first_kept}', rows)]
+
+
+# ---- CLI ----
+@click.command('booking-partitions')
+@click.option('--ahead', type=int, default=None,
+              help='months of partitions to keep ready [BOOKING_PARTITIONS_AHEAD]')
+@with_appcontext
+def partitions_command(ahead):
+    """Create the coming months' partitions of bookings (Postgres)."""
+    if not is_partitioned():
+        click.echo('bookings is not partitioned on this database; nothing to do')
+        return
+    created = ensure_partitions(current_app.config['BOOKING_PARTITIONS_AHEAD'] if ahead is None else ahead)
+    parts = partitions()
+    click.echo(f'{created} partitions created; {len(parts)} monthly partitions '
+               f'{parts[0][0]:%Y-%m} .. {parts[-1][0]:%Y-%m}')
+
+
+@click.command('archive-bookings')
+@click.option('--keep-months', type=int, default=None,
+              help='whole months of bookings to keep, before this one [BOOKING_RETENTION_MONTHS]')
+@click.option('--csv-dir', type=click.Path(exists=True, file_okay=False, writable=True), default=None,
+              help='write archived months to gzipped CSV files here and drop them')
+@with_appcontext
+def archive_command(keep_months, csv_dir):
+    """Move bookings that started before the retention window out of `bookings`."""
+    keep = current_app.config['BOOKING_RETENTION_MONTHS'] if keep_months is None else keep_months
+    try:
+        moved = archive(keep, csv_dir)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='--keep-months')
+    for label, rows in moved:
+        click.echo(f'{label}: {rows} bookings')
+    click.echo(f'{sum(rows for _, rows in moved)} bookings archived')
@@ -0,0 +1,211 @@
+import time
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_DOWN
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, select, union_all
+from sqlalchemy.orm.util import identity_key
+
+from models import db, Property, Booking, ArchivedBooking, PropertyMonthlyStats
+
+# property_monthly_stats holds, per listing and calendar month, the booked days, the
+# bookings touching the month and the revenue attributed to it. A booking's total_cost
+# is split evenly over the calendar months it touches (rent is charged per month
+# touched, see pricing.py). Deltas are applied in the flush that inserts / deletes
+# the booking, so the rollup commits or rolls back together with it.
+_TABLE = PropertyMonthlyStats.__table__
+_CENT = Decimal('0.01')
+_TRACKED = ('property_id', 'start_date', 'end_date', 'total_cost')
+
+
+def init_app(app, db):
+    if not event.contains(db.session, 'after_flush', _apply_deltas):
+        event.listen(db.session, 'after_flush', _apply_deltas)
+
+
+def month_slices(start, end):
+    """(first day of month, days of [start, end] inside it) for every month touched."""
+    month = start.replace(day=1)
+    while month <= end:
+        following = (month + timedelta(days=32)).replace(day=1)
+        yield month, (min(end, following - timedelta(days=1)) - max(start, month)).days + 1
+        month = following
+
+
+def booking_deltas(start, end, total_cost, sign=1):
+    slices = list(month_slices(start, end))
+    total = Decimal(str(total_cost))
+    share = (total / len(slices)).quantize(_CENT, ROUND_DOWN)
+    for i, (month, days) in enumerate(slices):
+        # the last month takes the rounding remainder so the shares add up to the total
+        revenue = total - share * (len(slices) - 1) if i == len(slices) - 1 else share
+        yield month, sign * days, sign * revenue, sign
+
+
+def _old(obj, attr):
+    hist = inspect(obj).attrs[attr].history
+    return hist.deleted[0] if hist.deleted else getattr(obj, attr)
+
+
+def _apply_deltas(session, flush_context):
+    changes = []            # (property_id, start, end, total_cost, sign)
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            changes.append((obj.property_id, obj.start_date, obj.end_date, obj.total_cost, 1))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            changes.append((*(_old(obj, a) for a in _TRACKED), -1))
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and any(inspect(obj).attrs[a].history.has_changes() for a in _TRACKED):
+            changes.append((*(_old(obj, a) for a in _TRACKED), -1))
+            changes.append((obj.property_id, obj.start_date, obj.end_date, obj.total_cost, 1))
+    if not changes:
+        return
+    # a listing deleted in this flush takes its rollup rows with it (ON DELETE CASCADE)
+    gone = {obj.property_id for obj in session.deleted if isinstance(obj, Property)}
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+    for pid, start, end, total, sign in changes:
+        if pid in gone:
+            continue
+        for month, days, revenue, count in booking_deltas(start, end, total, sign):
+            d = deltas[pid, month]
+            d[0] += days
+            d[1] += count
+            d[2] += revenue
+    if deltas:
+        agents = _agents(session, {pid for pid, _ in deltas})
+        _upsert(session.connection(), [
+            {'property_id': pid, 'month': month, 'agent_email': agents[pid],
+             'booked_days': days, 'bookings': count, 'revenue': revenue}
+            for (pid, month), (days, count, revenue) in deltas.items()
+        ])
+
+
+def _agents(session, pids):
+    agents, missing = {}, []
+    for pid in pids:
+        p = session.identity_map.get(identity_key(Property, pid))
+        if p is not None:
+            agents[pid] = p.agent_email
+        else:
+            missing.append(pid)
+    if missing:
+        agents.update(session.connection().execute(
+            db.select(Property.property_id, Property.agent_email)
+            .where(Property.property_id.in_(missing))).all())
+    return agents
+
+
+def _upsert(conn, rows):
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(_TABLE)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['property_id', 'month'],
+        set_={col: _TABLE.c[col] + stmt.excluded[col] for col in ('booked_days', 'bookings', 'revenue')},
+    )
+    conn.execute(stmt, rows)
+
+
+# ---- full rebuild ----
+def rebuild(batch_size=5000):
+    """Recompute the whole rollup from bookings and bookings_archive in one transaction;
+    returns rows written."""
+    if db.engine.dialect.name == 'postgresql':
+        # hold off booking writes so none lands between the scan and the commit
+        db.session.execute(db.text('LOCK TABLE bookings IN SHARE MODE'))
+    db.session.execute(_TABLE.delete())
+    cols = ('property_id', 'start_date', 'end_date', 'total_cost')
+    stays = union_all(*(select(*(t.c[c] for c in cols))
+                        for t in (Booking.__table__, ArchivedBooking.__table__))).subquery()
+    rows = (db.session.query(stays.c.property_id, Property.agent_email, stays.c.start_date,
+                             stays.c.end_date, stays.c.total_cost)
+            .join(Property, Property.property_id == stays.c.property_id)
+            .order_by(stays.c.property_id)
+            .yield_per(batch_size))
+    acc, written, current = {}, 0, None
+    for pid, agent, start, end, total in rows:
+        # flush only between listings, so no (property, month) key spans two batches
+        if pid != current and len(acc) >= batch_size:
+            db.session.execute(_TABLE.insert(), list(acc.values()))
+            written += len(acc)
+            acc = {}
+        current = pid
+        for month, days, revenue, count in booking_deltas(start, end, total):
+            row = acc.get((pid, month))
+            if row is None:
+                row = acc[pid, month] = {'property_id': pid, 'month': month, 'agent_email': agent,
+                                         'booked_days': 0, 'bookings': 0, 'revenue': Decimal(0)}
+            row['booked_days'] += days
+            row['bookings'] += count
+            row['revenue'] += revenue
+    if acc:
+        db.session.execute(_TABLE.insert(), list(acc.values()))
+        written += len(acc)
+    db.session.commit()
+    return written
+
+
+@click.command('rebuild-booking-stats')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+@with_appcontext
+def rebuild_command(batch_size):
+    """Recompute property_monthly_stats from bookings and bookings_archive."""
+    t0 = time.perf_counter()
+    written = rebuild(batch_size)
+    click.echo(f'{written} property-month rows in {time.perf_counter() - t0:.1f}s')
+
+
+# ---- dashboard queries (all served by ix_property_monthly_stats_agent_month) ----
+def agent_months(agent_email, first, last):
+    return (db.session.query(PropertyMonthlyStats.month,
+                             func.sum(PropertyMonthlyStats.booked_days),
+                             func.sum(PropertyMonthlyStats.bookings),
+                             func.sum(PropertyMonthlyStats.revenue))
+            .filter(PropertyMonthlyStats.agent_email == agent_email,
+                    PropertyMonthlyStats.month.between(first, last))
+            .group_by(PropertyMonthlyStats.month)
+            .order_by(PropertyMonthlyStats.month)
+            .all())
+
+
+def year_summary(agent_email, year, listings):
+    """Twelve rows (missing months as zeros); occupancy = booked days / listing-days."""
+    found = {month: rest for month, *rest in agent_months(agent_email, date(year, 1, 1), date(year, 12, 1))}
+    rows = []
+    for m in range(1, 13):
+        month = date(year, m, 1)
+        days, count, revenue = found.get(month, (0, 0, Decimal(0)))
+        capacity = listings * monthrange(year, m)[1]
+        rows.append({'month': month, 'booked_days': days, 'bookings': count, 'revenue': revenue,
+                     'occupancy': days / capacity if capacity else 0.0})
+    return rows
+
+
+def available_days(p, first, last):
+    lo = max(first, p.available_from or first)
+    hi = min(last, p.available_to or last)
+    return max(0, (hi - lo).days + 1)
+
+
+def top_properties(agent_email, first, last, limit):
+    revenue = func.sum(PropertyMonthlyStats.revenue).label('revenue')
+    totals = (db.session.query(PropertyMonthlyStats.property_id,
+                               func.sum(PropertyMonthlyStats.booked_days).label('booked_days'),
+                               func.sum(PropertyMonthlyStats.bookings).label('bookings'),
+                               revenue)
+              .filter(PropertyMonthlyStats.agent_email == agent_email,
+                      PropertyMonthlyStats.month.between(first, last))
+              .group_by(PropertyMonthlyStats.property_id)
+              .order_by(revenue.desc())
+              .limit(limit)
+              .subquery())
+    return (db.session.query(Property, totals.c.booked_days, totals.c.bookings, totals.c.revenue)
+            .join(totals, totals.c.property_id == Property.property_id)
+            .order_by(totals.c.revenue.desc(), Property.property_id)
+            .all())
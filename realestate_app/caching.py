@@ -0,0 +1,259 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger('realestate.cache')
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+        self.errors = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions, 'expirations': self.expirations,
+            'invalidations': self.invalidations, 'errors': self.errors,
+        }
+
+
+class MemoryBackend:
+    """Per-process LRU with a TTL. Each entry carries `meta` used to decide invalidation.
+
+    Every invalidation bumps generation(); set(..., generation=g) stores nothing once it
+    has moved past g, so a value computed before an invalidation is not cached after it.
+    """
+
+    indexed = False             # delete_where() scans every entry; tags are not kept
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()          # key -> (expires_at, value, meta)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def generation(self):
+        return self._generation
+
+    def set(self, key, value, meta=None, tags=(), generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value, meta)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete_where(self, predicate, tags=None):
+        with self._lock:
+            self._generation += 1
+            doomed = [k for k, (_, _, meta) in self._data.items() if predicate(meta)]
+            for k in doomed:
+                del self._data[k]
+            self.stats.invalidations += len(doomed)
+        return len(doomed)
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.stats.invalidations += len(self._data)
+            self._data.clear()
+
+
+class RedisBackend:
+    """Shared backend so every worker process sees the same entries and invalidations.
+
+    An entry is `<prefix>:v:<key>` (the value) plus `<prefix>:m:<key>` (its meta and
+    tags), both with the TTL. Each tag names a set `<prefix>:t:<tag>` of the keys stored
+    with it, so delete_where(predicate, tags) reads the meta of only the keys filed under
+    those tags: an invalidation costs what it can hit, not the size of the cache. Set
+    members whose entry is gone are dropped when met, and a set that nothing is added to
+    expires with its last entry. LRU eviction is left to the Redis server
+    (maxmemory-policy allkeys-lru), so evictions are not counted here; entries of an
+    evicted tag set are no longer invalidated and live out their TTL.
+
+    generation() is the counter `<prefix>:gen`, bumped by every invalidation; a set()
+    given a generation stores nothing (WATCH / MULTI) once the counter has moved on.
+
+    The cache never fails a request: while Redis errors (down, timing out) a read is a
+    miss and a write or invalidation is skipped and logged, so entries a skipped
+    invalidation should have removed live out their TTL.
+    """
+
+    indexed = True
+
+    def __init__(self, url, ttl=60, prefix='cache'):
+        import redis                       # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+        self._errors = redis.RedisError
+        self._raced = redis.WatchError
+        self._down = False
+
+    def _ok(self):
+        if self._down:
+            self._down = False
+            log.info('%s cache: redis is back', self.prefix)
+
+    def _failed(self, op, exc, default=None):
+        # logged once per outage; stats.errors counts every failed call
+        self.stats.errors += 1
+        if not self._down:
+            self._down = True
+            log.warning('%s cache: redis %s failed (%s); serving without the cache until it recovers',
+                        self.prefix, op, exc)
+        return default
+
+    def _vkey(self, key):
+        return f'{self.prefix}:v:{key}'
+
+    def _mkey(self, key):
+        return f'{self.prefix}:m:{key}'
+
+    def _tkey(self, tag):
+        return f'{self.prefix}:t:{tag}'
+
+    def _gkey(self):
+        return f'{self.prefix}:gen'
+
+    def generation(self):
+        try:
+            gen = int(self.client.get(self._gkey()) or 0)
+        except self._errors as exc:
+            return self._failed('generation', exc, -1)     # matches no generation: nothing is stored
+        self._ok()
+        return gen
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._vkey(key))
+        except self._errors as exc:
+            self.stats.misses += 1
+            return self._failed('get', exc)
+        self._ok()
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, meta=None, tags=(), generation=None):
+        try:
+            with self.client.pipeline() as pipe:
+                if generation is not None:
+                    pipe.watch(self._gkey())
+                    if int(pipe.get(self._gkey()) or 0) != generation:
+                        return
+                    pipe.multi()
+                pipe.setex(self._vkey(key), self.ttl, json.dumps(value))
+                pipe.setex(self._mkey(key), self.ttl, json.dumps([meta, list(tags)]))
+                for tag in tags:
+                    pipe.sadd(self._tkey(tag), key)
+                    pipe.expire(self._tkey(tag), self.ttl)
+                pipe.execute()
+        except self._raced:                  # invalidated meanwhile
+            return
+        except self._errors as exc:
+            return self._failed('set', exc)
+        self._ok()
+
+    def _candidates(self, tags):
+        if tags is None:
+            skip = len(self._mkey(''))
+            return [k.decode()[skip:] for k in self.client.scan_iter(self._mkey('*'), count=1000)]
+        tags = list(tags)
+        if not tags:
+            return []
+        return [k.decode() for k in self.client.sunion([self._tkey(t) for t in tags])]
+
+    def delete_where(self, predicate, tags=None):
+        """Delete the entries whose meta matches `predicate`, looking only at those
+        stored with one of `tags` (None: every entry, with a full SCAN)."""
+        try:
+            return self._delete_where(predicate, tags)
+        except self._errors as exc:
+            return self._failed('invalidation', exc, 0)
+
+    def _delete_where(self, predicate, tags):
+        self.client.incr(self._gkey())
+        keys = self._candidates(tags)
+        metas = self.client.mget([self._mkey(k) for k in keys]) if keys else []
+        doomed, unlink = [], {}              # unlink: tag -> keys to drop from its set
+        for key, raw in zip(keys, metas):
+            if raw is None:                   # expired or evicted
+                for tag in tags or ():
+                    unlink.setdefault(tag, []).append(key)
+                continue
+            meta, entry_tags = json.loads(raw)
+            if predicate(meta):
+                doomed.append(key)
+                for tag in entry_tags:
+                    unlink.setdefault(tag, []).append(key)
+        pipe = self.client.pipeline()
+        if doomed:
+            pipe.delete(*[self._vkey(k) for k in doomed], *[self._mkey(k) for k in doomed])
+        for tag, members in unlink.items():
+            pipe.srem(self._tkey(tag), *members)
+        pipe.execute()
+        self._ok()
+        self.stats.invalidations += len(doomed)
+        return len(doomed)
+
+    def delete(self, key):
+        # the key stays in its tag sets until an invalidation meets it there
+        try:
+            self.client.delete(self._vkey(key), self._mkey(key))
+        except self._errors as exc:
+            return self._failed('delete', exc)
+        self._ok()
+        self.stats.invalidations += 1
+
+    def clear(self):
+        try:
+            keys = list(self.client.scan_iter(f'{self.prefix}:*', count=1000))
+            if keys:
+                self.client.delete(*keys)
+        except self._errors as exc:
+            return self._failed('clear', exc)
+        self._ok()
+        self.stats.invalidations += sum(k.startswith(f'{self.prefix}:m:'.encode()) for k in keys)
+
+
+def make_backend(kind, url=None, max_entries=1024, ttl=60, prefix='cache'):
+    if kind == 'memory':
+        return MemoryBackend(max_entries=max_entries, ttl=ttl)
+    if kind == 'redis':
+        return RedisBackend(url, ttl=ttl, prefix=prefix)
+    if kind in ('none', '', None):
+        return None
+    raise ValueError(f'unknown cache backend {kind!r}')
@@ -0,0 +1,37 @@
+from sqlalchemy import event
+
+_hooks = {}                 # name -> (collect, apply)
+
+
+def after_commit(db, name, collect, apply):
+    """Run `apply(items)` once the transaction that produced `items` commits.
+
+    `collect(session)` is called after every flush, while new/dirty/deleted and attribute
+    history still describe what was written, and returns the items worth keeping. They
+    ride along in session.info until commit, and are dropped if the transaction rolls back.
+    Registering the same name again (a second create_app()) replaces the earlier hook.
+    """
+    _hooks[name] = (collect, apply)
+    if not event.contains(db.session, 'after_flush', _collect):
+        event.listen(db.session, 'after_flush', _collect)
+        event.listen(db.session, 'after_commit', _apply)
+        event.listen(db.session, 'after_rollback', _discard)
+
+
+def _collect(session, flush_context):
+    for name, (collect, _) in _hooks.items():
+        items = collect(session)
+        if items:
+            session.info.setdefault(name, []).extend(items)
+
+
+def _apply(session):
+    for name, (_, apply) in _hooks.items():
+        items = session.info.pop(name, None)
+        if items:
+            apply(items)
+
+
+def _discard(session):
+    for name in _hooks:
+        session.info.pop(name, None)
@@ -76,15 +76,20 @@ class BookingForm(FlaskForm):
 
 
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import (
     StringField, PasswordField, SubmitField, SelectField,
     DecimalField, DateField, IntegerField, TextAreaField
 )
 from wtforms.validators import (
     DataRequired, Email, Length, EqualTo,
-    NumberRange, Optional                    # ← added Optional
+    NumberRange, Optional,                   # ← added Optional
+    ValidationError
 )
 
+import geocoding
+from models import normalize_location
+
 class RegistrationForm(FlaskForm):
     full_name = StringField('Full Name', validators=[DataRequired(), Length(max=200)])
     email     = StringField('Email',      validators=[DataRequired(), Email(), Length(max=100)])
@@ -145,7 +150,9 @@ class PropertyForm(FlaskForm):
 
 class SearchForm(FlaskForm):
     location      = StringField('Location', validators=[DataRequired()])
-    date          = DateField('Date',       validators=[DataRequired()])
+    date          = DateField('Check-in',   validators=[DataRequired()])
+    # blank = availability on the check-in day only
+    end_date      = DateField('Check-out',  validators=[Optional()])
 
     # -------- optional filters (Optional() lets blanks pass validation) --------
     min_bedrooms  = IntegerField('Min Bedrooms',
@@ -154,6 +161,9 @@ class SearchForm(FlaskForm):
                                  validators=[Optional(), NumberRange(min=0)])
     max_price     = DecimalField('Max Price',
                                  validators=[Optional(), NumberRange(min=0)])
+    # miles around the place typed in Location, instead of matching it as text
+    radius        = DecimalField('Within (miles)',
+                                 validators=[Optional(), NumberRange(min=0.1, max=250)])
 
     property_type = SelectField('Type',
                                 choices=[('', 'Any'),
@@ -164,9 +174,60 @@ class SearchForm(FlaskForm):
                                 choices=[('price','Price'), ('rooms','Bedrooms')])
     submit = SubmitField('Search')
 
+    def validate_location(self, field):
+        # punctuation only would normalize to '' and match every listing
+        if field.data and not normalize_location(field.data):
+            raise ValidationError('Enter a street, city or state.')
+
+    def validate_end_date(self, field):
+        if field.data and self.date.data and field.data < self.date.data:
+            raise ValidationError('Check-out must be on or after check-in.')
+
+    center = None                    # (latitude, longitude) of Location, set with a radius
+
+    def validate_radius(self, field):
+        if field.data is not None:
+            self.center = geocoding.resolve(self.location.data or '')
+            if self.center is None:
+                raise ValidationError('Unknown place for a radius search; try a city such as "Chicago, IL".')
+
+    def criteria(self):
+        # keyword arguments for property_search.filtered_query()
+        radius = self.radius.data
+        return dict(
+            location=self.location.data.strip(),
+            start=self.date.data,
+            end=self.end_date.data or self.date.data,
+            property_type=self.property_type.data,
+            min_price=self.min_price.data,
+            max_price=self.max_price.data,
+            min_bedrooms=self.min_bedrooms.data,
+            near=self.center if radius is not None else None,
+            radius=radius,
+        )
+
 
 class BookingForm(FlaskForm):
     start_date  = DateField('Start Date', validators=[DataRequired()])
     end_date    = DateField('End Date',   validators=[DataRequired()])
     card_number = SelectField('Payment Method', coerce=str, validators=[DataRequired()])
     submit = SubmitField('Book')
+
+
+class BookingFilterForm(FlaskForm):
+    # GET query-string filters for the bookings pages and exports
+    class Meta:
+        csrf = False
+
+    start       = DateField('From', validators=[Optional()])
+    end         = DateField('To',   validators=[Optional()])
+    property_id = IntegerField('Property #', validators=[Optional(), NumberRange(min=1)])
+    submit      = SubmitField('Filter')
+
+
+class PropertyImportForm(FlaskForm):
+    # CSV with a header row, or JSON Lines; keys are PropertyForm's field names
+    file   = FileField('Listings file',
+                       validators=[FileRequired(),
+                                   FileAllowed(['csv', 'jsonl', 'ndjson'], 'CSV or JSON Lines only.')])
+    submit = SubmitField('Import')
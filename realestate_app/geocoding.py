@@ -0,0 +1,170 @@
+import csv
+import importlib
+import math
+import os
+import sqlite3
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+
+from models import db, Property, normalize_location
+
+# Listing coordinates and radius-search centres. The geocoder is offline and pluggable:
+#   GEOCODER = 'table'  (default) city centres from a CSV lookup table (GEOCODER_TABLE,
+#                       columns city,state,latitude,longitude), so listings are placed at
+#                       city precision and "Chicago" covers Evanston or Oak Park by radius
+#   GEOCODER = 'none'   no coordinates; radius searches are rejected
+#   GEOCODER = 'pkg.module:factory'  factory(app) returns an object with
+#                       geocode(street, city, state) and resolve(text), both
+#                       returning (latitude, longitude) or None
+# Properties get their coordinates in before_insert / before_update when the address
+# changes; rows written with core INSERTs (property_import, bench seeding) geocode
+# themselves, and `flask geocode-properties` backfills the rest.
+_geocoder = None
+_ADDRESS = ('street', 'city', 'state')
+_DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'places.csv')
+
+
+class TableGeocoder:
+    """(city, state) -> centre lookup; the first row wins for a city name given without state."""
+
+    def __init__(self, rows=()):
+        self._places = {}
+        self._cities = {}
+        for city, state, lat, lng in rows:
+            self.add(city, state, lat, lng)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls((r['city'], r['state'], r['latitude'], r['longitude'])
+                       for r in csv.DictReader(f))
+
+    def add(self, city, state, lat, lng):
+        point = (float(lat), float(lng))
+        city = normalize_location(city)
+        self._places[city, normalize_location(state)] = point
+        self._cities.setdefault(city, point)
+
+    def __len__(self):
+        return len(self._places)
+
+    def geocode(self, street, city, state):
+        city = normalize_location(city)
+        if state:
+            point = self._places.get((city, normalize_location(state)))
+            if point is not None:
+                return point
+        return self._cities.get(city)
+
+    def resolve(self, text):
+        # free text such as "Chicago", "oak park, IL" or a full "500 W Madison St Chicago IL":
+        # the longest trailing "city [state]" the table knows
+        words = normalize_location(text).split()
+        for i in range(len(words)):
+            tail = words[i:]
+            if len(tail) > 1:
+                point = self._places.get((' '.join(tail[:-1]), tail[-1]))
+                if point is not None:
+                    return point
+            point = self._cities.get(' '.join(tail))
+            if point is not None:
+                return point
+        return None
+
+
+def init_app(app, db):
+    global _geocoder
+    name = app.config.setdefault('GEOCODER', 'table')
+    if name == 'none':
+        _geocoder = None
+    elif name == 'table':
+        _geocoder = TableGeocoder.from_csv(app.config.get('GEOCODER_TABLE') or _DEFAULT_TABLE)
+    else:
+        module, _, factory = name.partition(':')
+        _geocoder = getattr(importlib.import_module(module), factory)(app)
+    for hook in ('before_insert', 'before_update'):
+        if not event.contains(Property, hook, _set_coordinates):
+            event.listen(Property, hook, _set_coordinates)
+    if not event.contains(Engine, 'connect', _sqlite_math):
+        event.listen(Engine, 'connect', _sqlite_math)
+
+
+def backend():
+    return _geocoder
+
+
+def geocode(street, city, state):
+    """(latitude, longitude) of a listing address, or None."""
+    return _geocoder.geocode(street, city, state) if _geocoder is not None else None
+
+
+def resolve(text):
+    """(latitude, longitude) of a place typed into the search box, or None."""
+    return _geocoder.resolve(text) if _geocoder is not None else None
+
+
+def _set_coordinates(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes():
+        return                              # set explicitly (e.g. by a precise geocoder upstream)
+    moved = not state.has_identity or any(state.attrs[a].history.has_changes() for a in _ADDRESS)
+    if moved or target.latitude is None:
+        point = geocode(target.street, target.city, target.state)
+        target.latitude, target.longitude = point or (None, None)
+
+
+def _sqlite_math(dbapi_conn, connection_record):
+    # radius search uses sin()/cos(); SQLite builds without the math extension get Python's
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    try:
+        dbapi_conn.execute('SELECT sin(0), cos(0)')
+    except sqlite3.OperationalError:
+        dbapi_conn.create_function('sin', 1, math.sin, deterministic=True)
+        dbapi_conn.create_function('cos', 1, math.cos, deterministic=True)
+
+
+# ---- backfill ----
+def backfill(redo=False, batch_size=2000):
+    """Geocode listings without coordinates (all of them with redo); returns rows updated."""
+    table = Property.__table__
+    q = db.select(table.c.property_id, table.c.street, table.c.city, table.c.state)
+    if not redo:
+        q = q.where(table.c.latitude.is_(None))
+    update = (table.update()
+              .where(table.c.property_id == db.bindparam('pid'))
+              .values(latitude=db.bindparam('lat'), longitude=db.bindparam('lng'),
+                      version=table.c.version + 1))
+    last, updated = 0, 0
+    while True:
+        rows = db.session.execute(q.where(table.c.property_id > last)
+                                  .order_by(table.c.property_id).limit(batch_size)).all()
+        if not rows:
+            return updated
+        last = rows[-1].property_id
+        params = []
+        for r in rows:
+            point = geocode(r.street, r.city, r.state)
+            if point is not None:
+                params.append({'pid': r.property_id, 'lat': point[0], 'lng': point[1]})
+        if params:
+            db.session.execute(update, params)
+        db.session.commit()
+        updated += len(params)
+
+
+@click.command('geocode-properties')
+@click.option('--all', 'redo', is_flag=True, help='Re-geocode listings that already have coordinates.')
+@click.option('--batch-size', type=int, default=2000, show_default=True)
+@with_appcontext
+def geocode_command(redo, batch_size):
+    """Fill in properties.latitude / longitude from the configured geocoder."""
+    if _geocoder is None:
+        raise click.ClickException('GEOCODER is none.')
+    t0 = time.perf_counter()
+    updated = backfill(redo, batch_size)
+    click.echo(f'{updated} listings geocoded in {time.perf_counter() - t0:.1f}s')
@@ -0,0 +1,28 @@
+# Production serving:
+#
+#   gunicorn --chdir realestate_app -c realestate_app/gunicorn.conf.py 'app:create_app()'
+#
+# Each worker process builds its own app (and its own connection pool) after the fork;
+# see the DB_* settings in config.py for sizing the pool against max_connections.
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# the per-process search and identity caches would only be invalidated in the worker
+# that committed (config.py): share them through Redis, or do without, unless told otherwise
+if workers > 1:
+    os.environ.setdefault('SEARCH_CACHE_BACKEND', 'redis' if os.getenv('SEARCH_CACHE_URL') else 'none')
+    os.environ.setdefault('IDENTITY_CACHE_BACKEND',
+                          'redis' if os.getenv('IDENTITY_CACHE_URL', os.getenv('SEARCH_CACHE_URL')) else 'none')
+# threads > 1 switches to the gthread worker; requests mostly wait on the database
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+# recycle workers periodically so slow leaks cannot accumulate; jitter keeps them
+# from restarting all at once
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 500))
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None      # empty disables it
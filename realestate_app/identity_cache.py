@@ -0,0 +1,116 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+import caching
+import commit_hooks
+from models import db, User, Agent, Renter, Address
+
+# load_user() runs on every authenticated request. The cache keeps a plain-data snapshot
+# of the user row, its role row and the addresses the templates read, and rebuilds
+# session-attached instances from it without any SELECT. Credit cards (numbers, CVVs)
+# are never cached - possibly in a shared Redis - and lazy-load from the database where
+# a page needs them. Any committed change to the cached rows drops the user's entry; IDENTITY_CACHE_TTL bounds staleness across processes
+# when the per-process backend is used.
+_backend = None
+_SKIP = {'password_hash'}              # only login() needs it, and it queries directly
+
+
+def init_app(app, db):
+    global _backend
+    _backend = caching.make_backend(
+        app.config.get('IDENTITY_CACHE_BACKEND', 'memory'),
+        url=app.config.get('IDENTITY_CACHE_URL'),
+        max_entries=app.config.get('IDENTITY_CACHE_MAX_ENTRIES', 10000),
+        ttl=app.config.get('IDENTITY_CACHE_TTL', 30),
+        prefix='identity',
+    )
+    if _backend is not None:
+        commit_hooks.after_commit(db, 'identity_cache', _changed_emails, invalidate)
+
+
+def load_user(email):
+    if _backend is not None:
+        snapshot = _backend.get(email)
+        if snapshot is not None:
+            return _restore(snapshot)
+    # one round trip on a miss
+    user = User.query.options(
+        joinedload(User.agent), joinedload(User.renter), joinedload(User.addresses),
+    ).get(email)
+    if user is not None and _backend is not None:
+        _backend.set(email, _snapshot(user), email)
+    return user
+
+
+def invalidate(emails):
+    for email in set(emails):
+        _backend.delete(email)
+
+
+def stats():
+    return _backend.stats.as_dict() if _backend is not None else None
+
+
+# ---- snapshot <-> instances ----
+def _dump(obj):
+    row = {}
+    for col in inspect(obj).mapper.column_attrs:
+        if col.key in _SKIP:
+            continue
+        value = getattr(obj, col.key)
+        row[col.key] = (value.isoformat() if isinstance(value, date)
+                        else str(value) if isinstance(value, Decimal) else value)
+    return row
+
+
+def _load(cls, row):
+    values = {}
+    for col in inspect(cls).column_attrs:
+        if col.key not in row:
+            continue
+        value = row[col.key]
+        if value is not None:
+            python_type = col.columns[0].type.python_type
+            if python_type is date:
+                value = date.fromisoformat(value)
+            elif python_type is Decimal:
+                value = Decimal(value)
+        values[col.key] = value
+    obj = cls(**values)
+    make_transient_to_detached(obj)          # values count as already-persisted state
+    return db.session.merge(obj, load=False)
+
+
+def _snapshot(user):
+    return {
+        'user': _dump(user),
+        'agent': _dump(user.agent) if user.agent else None,
+        'renter': _dump(user.renter) if user.renter else None,
+        'addresses': [_dump(a) for a in user.addresses],
+    }
+
+
+def _restore(snapshot):
+    user = _load(User, snapshot['user'])
+    set_committed_value(user, 'agent', _load(Agent, snapshot['agent']) if snapshot['agent'] else None)
+    set_committed_value(user, 'renter', _load(Renter, snapshot['renter']) if snapshot['renter'] else None)
+    set_committed_value(user, 'addresses', [_load(Address, a) for a in snapshot['addresses']])
+    return user
+
+
+def _changed_emails(session):
+    emails = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (User, Agent, Renter)):
+            attr = 'email'
+        elif isinstance(obj, Address):
+            attr = 'user_email'
+        else:
+            continue
+        emails.append(getattr(obj, attr))
+        emails.extend(inspect(obj).attrs[attr].history.deleted)
+    return emails
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+log = logging.getLogger('realestate.sql')
+
+_lock = threading.Lock()
+_endpoints = {}          # endpoint -> _EndpointStats
+
+
+class _EndpointStats:
+    def __init__(self, sample_size):
+        self.requests = 0
+        self.queries = 0
+        self.db_ms = 0.0
+        # bounded reservoirs: percentiles over the most recent `sample_size` requests
+        self.latency_ms = deque(maxlen=sample_size)
+        self.query_counts = deque(maxlen=sample_size)
+
+    def as_dict(self):
+        latency = sorted(self.latency_ms)
+        return {
+            'requests': self.requests,
+            'p50_ms': _pct(latency, 50),
+            'p95_ms': _pct(latency, 95),
+            'p99_ms': _pct(latency, 99),
+            'queries_per_request': round(self.queries / self.requests, 2) if self.requests else 0,
+            'max_queries': max(self.query_counts, default=0),
+            'db_ms_per_request': round(self.db_ms / self.requests, 3) if self.requests else 0,
+        }
+
+
+def _pct(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 3)
+
+
+def _redact(parameters):
+    # keep the shape (names / arity) so the statement is recognizable, drop the values
+    if isinstance(parameters, dict):
+        return {k: '?' for k in parameters}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f'<{len(parameters)} parameter sets>'
+        return ['?'] * len(parameters)
+    return parameters
+
+
+def instrument_engine(engine, slow_ms):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+        if has_request_context() and 'sql_queries' in g:
+            g.sql_queries += 1
+            g.sql_ms += elapsed
+        if elapsed >= slow_ms:
+            log.warning('slow query %.1f ms [%s]: %s params=%s',
+                        elapsed, request.endpoint if has_request_context() else '-',
+                        ' '.join(statement.split()), _redact(parameters))
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+
+def init_app(app, db):
+    app.config.setdefault('SQL_SLOW_QUERY_MS', 200)
+    app.config.setdefault('SQL_STATS_SAMPLE_SIZE', 1000)
+    sample_size = app.config['SQL_STATS_SAMPLE_SIZE']
+
+    with app.app_context():
+        # the primary and any read replicas (SQLALCHEMY_BINDS)
+        for engine in db.engines.values():
+            instrument_engine(engine, app.config['SQL_SLOW_QUERY_MS'])
+
+    @app.before_request
+    def _start_request():
+        g.sql_queries = 0
+        g.sql_ms = 0.0
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = (time.perf_counter() - g.request_start) * 1000
+        response.headers['X-DB-Query-Count'] = str(g.sql_queries)
+        response.headers['X-DB-Time-Ms'] = f'{g.sql_ms:.2f}'
+        endpoint = request.endpoint or '<unmatched>'
+        with _lock:
+            stats = _endpoints.get(endpoint)
+            if stats is None:
+                stats = _endpoints[endpoint] = _EndpointStats(sample_size)
+            stats.requests += 1
+            stats.queries += g.sql_queries
+            stats.db_ms += g.sql_ms
+            stats.latency_ms.append(elapsed)
+            stats.query_counts.append(g.sql_queries)
+        return response
+
+
+def snapshot():
+    with _lock:
+        return {endpoint: s.as_dict() for endpoint, s in sorted(_endpoints.items())}
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
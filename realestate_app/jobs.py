@@ -0,0 +1,238 @@
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, select
+
+from models import db, Job
+
+# Background jobs in the `jobs` table. enqueue() inserts the row through the caller's
+# session, so a job exists exactly when the change that asked for it commits; the web
+# request only pays for one INSERT. `flask jobs work` processes claim due rows with
+#   UPDATE jobs ... WHERE job_id IN (SELECT ... FOR UPDATE SKIP LOCKED LIMIT n)
+# so any number of workers share the queue without waiting on each other's rows (SQLite
+# has one writer and drops the FOR UPDATE). A job's handler runs in db.session and its
+# writes commit together with the job's 'done' mark; a failure rolls them back and
+# re-queues the job after an exponential, jittered backoff until JOB_MAX_ATTEMPTS, then
+# leaves it 'failed' with the traceback. Jobs of a worker that died are re-queued once
+# they have been 'running' for JOB_LOCK_TIMEOUT_S.
+log = logging.getLogger('realestate.jobs')
+
+_JOBS = Job.__table__
+_handlers = {}              # name -> fn(**payload)
+
+
+def handler(name):
+    """Decorator: run jobs called `name` with fn(**payload)."""
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+    return register
+
+
+def _insert(conn):
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(_JOBS)
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None, session=None):
+    """Queue a `name` job in the open transaction of `session` (db.session); not committed.
+
+    Workers see it once that transaction commits, and a rollback drops it. While a job
+    with the same idempotency `key` is still in the table (JOB_RETENTION_DAYS after it
+    finished), another one is not added. Returns True if the job was queued.
+    """
+    conn = (session or db.session).connection()
+    now = datetime.utcnow()
+    stmt = _insert(conn).values(
+        name=name, payload=payload or {}, idempotency_key=key, status='queued', attempts=0,
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+        run_at=now + timedelta(seconds=delay), created_at=now,
+    )
+    if key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['idempotency_key'])
+    return conn.execute(stmt).rowcount == 1
+
+
+# ---- worker ----
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claim(worker, limit):
+    """Mark up to `limit` due jobs running under a fresh lock token and return them."""
+    now = datetime.utcnow()
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'
+    due = (select(_JOBS.c.job_id)
+           .where(_JOBS.c.status == 'queued', _JOBS.c.run_at <= now)
+           .order_by(_JOBS.c.run_at, _JOBS.c.job_id)
+           .limit(limit)
+           .with_for_update(skip_locked=True))
+    with db.engine.begin() as conn:
+        conn.execute(_JOBS.update().where(_JOBS.c.job_id.in_(due.scalar_subquery()))
+                     .values(status='running', locked_by=token, locked_at=now,
+                             attempts=_JOBS.c.attempts + 1))
+        return conn.execute(select(_JOBS).where(_JOBS.c.locked_by == token,
+                                                _JOBS.c.status == 'running')
+                            .order_by(_JOBS.c.run_at, _JOBS.c.job_id)).all()
+
+
+def _owned(job):
+    # still ours: not re-queued by the stale-lock sweep and claimed elsewhere meanwhile
+    return (_JOBS.c.job_id == job.job_id) & (_JOBS.c.locked_by == job.locked_by)
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: doubling from JOB_RETRY_BACKOFF_S up to
+    JOB_RETRY_MAX_BACKOFF_S, the upper half jittered."""
+    cfg = current_app.config
+    delay = min(cfg['JOB_RETRY_MAX_BACKOFF_S'], cfg['JOB_RETRY_BACKOFF_S'] * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _run(job):
+    fn = _handlers.get(job.name)
+    try:
+        if fn is None:
+            raise LookupError(f'no handler registered for job {job.name!r}')
+        fn(**job.payload)
+        done = db.session.execute(_JOBS.update().where(_owned(job)).values(
+            status='done', finished_at=datetime.utcnow(), last_error=None))
+        if done.rowcount != 1:
+            # the lock expired and someone else has the job now; its run wins
+            db.session.rollback()
+            log.warning('job %s (%s) lost its lock; discarding this run', job.job_id, job.name)
+            return False
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        now = datetime.utcnow()
+        if job.attempts >= job.max_attempts:
+            values = {'status': 'failed', 'finished_at': now}
+            log.exception('job %s (%s) failed for good after %d attempts',
+                          job.job_id, job.name, job.attempts)
+        else:
+            values = {'status': 'queued', 'run_at': now + timedelta(seconds=backoff(job.attempts))}
+            log.warning('job %s (%s) attempt %d failed; retrying at %s',
+                        job.job_id, job.name, job.attempts, values['run_at'], exc_info=True)
+        with db.engine.begin() as conn:
+            conn.execute(_JOBS.update().where(_owned(job)).values(
+                last_error=traceback.format_exc(limit=20), **values))
+        return False
+
+
+def _release(jobs):
+    # claimed but not started (the worker is stopping): back to the queue as they were
+    with db.engine.begin() as conn:
+        for job in jobs:
+            conn.execute(_JOBS.update().where(_owned(job)).values(
+                status='queued', attempts=_JOBS.c.attempts - 1, locked_by=None, locked_at=None))
+
+
+def requeue_stale():
+    """Re-queue (or fail, if out of attempts) jobs 'running' for over JOB_LOCK_TIMEOUT_S."""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT_S'])
+    with db.engine.begin() as conn:
+        return conn.execute(_JOBS.update().where(
+            _JOBS.c.status == 'running', _JOBS.c.locked_at < cutoff,
+        ).values(
+            status=case((_JOBS.c.attempts >= _JOBS.c.max_attempts, 'failed'), else_='queued'),
+            finished_at=case((_JOBS.c.attempts >= _JOBS.c.max_attempts, now), else_=None),
+            run_at=now, locked_by=None, locked_at=None,
+            last_error='worker stopped responding while running this job',
+        )).rowcount
+
+
+def work(worker=None, batch=None, once=False, should_stop=lambda: False):
+    """Run due jobs until should_stop() (or, with once=True, until none is due).
+
+    Returns the number of jobs that completed.
+    """
+    cfg = current_app.config
+    worker = worker or worker_name()
+    batch = batch or cfg['JOB_BATCH_SIZE']
+    completed = 0
+    while not should_stop():
+        jobs = _claim(worker, batch)
+        if not jobs:
+            requeue_stale()
+            if once:
+                break
+            time.sleep(cfg['JOB_POLL_INTERVAL_S'])
+            continue
+        for i, job in enumerate(jobs):
+            if should_stop():
+                _release(jobs[i:])
+                break
+            completed += _run(job)
+    return completed
+
+
+def purge(days):
+    """Delete jobs that finished (done or failed) more than `days` days ago."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with db.engine.begin() as conn:
+        return conn.execute(_JOBS.delete().where(_JOBS.c.status.in_(['done', 'failed']),
+                                                 _JOBS.c.finished_at < cutoff)).rowcount
+
+
+def counts():
+    """{name: {status: jobs}} over the whole table."""
+    out = {}
+    for name, status, n in db.session.execute(
+            select(_JOBS.c.name, _JOBS.c.status, func.count())
+            .group_by(_JOBS.c.name, _JOBS.c.status)):
+        out.setdefault(name, {})[status] = n
+    return out
+
+
+# ---- CLI ----
+@click.group('jobs')
+def jobs_command():
+    """Background job queue."""
+
+
+@jobs_command.command('work')
+@click.option('--batch', type=int, default=None, help='jobs claimed per round trip [JOB_BATCH_SIZE]')
+@click.option('--once', is_flag=True, help='exit when no job is due instead of polling')
+@with_appcontext
+def work_command(batch, once):
+    """Run queued jobs; SIGTERM / Ctrl-C stop after the current job."""
+    stopping = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.append(True))
+    worker = worker_name()
+    click.echo(f'worker {worker} started')
+    completed = work(worker, batch, once, should_stop=lambda: bool(stopping))
+    click.echo(f'worker {worker} stopped after {completed} jobs')
+
+
+@jobs_command.command('status')
+@with_appcontext
+def status_command():
+    """Jobs per name and status."""
+    for name, by_status in sorted(counts().items()):
+        click.echo(f'{name:40} ' + '  '.join(f'{s}={n}' for s, n in sorted(by_status.items())))
+
+
+@jobs_command.command('purge')
+@click.option('--days', type=float, default=None, help='keep finished jobs this long [JOB_RETENTION_DAYS]')
+@with_appcontext
+def purge_command(days):
+    """Delete finished jobs (and with them their idempotency keys) past retention."""
+    removed = purge(current_app.config['JOB_RETENTION_DAYS'] if days is None else days)
+    click.echo(f'{removed} jobs removed')
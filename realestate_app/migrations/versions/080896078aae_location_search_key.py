@@ -0,0 +1,67 @@
+"""location search key
+
+Revision ID: 080896078aae
+Revises: 6a1f3b963da3
+Create Date: 2025-06-02 14:12:40.118205
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '080896078aae'
+down_revision = '6a1f3b963da3'
+branch_labels = None
+depends_on = None
+
+# keep in sync with models.normalize_location
+_LOCATION_SEPARATORS = re.compile(r'[\W_]+')
+
+properties = sa.table(
+    'properties',
+    sa.column('property_id', sa.Integer),
+    sa.column('street', sa.String),
+    sa.column('city', sa.String),
+    sa.column('state', sa.String),
+    sa.column('location_key', sa.String),
+)
+
+
+def upgrade():
+    op.add_column('properties', sa.Column('location_key', sa.String(length=410), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            "UPDATE properties SET location_key = "
+            "btrim(regexp_replace(lower(concat_ws(' ', street, city, state)), '[^[:alnum:]]+', ' ', 'g'))"
+        )
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_properties_location_key_trgm', 'properties', ['location_key'],
+                        postgresql_using='gin',
+                        postgresql_ops={'location_key': 'gin_trgm_ops'})
+    else:
+        # no regexp_replace on SQLite: backfill from Python; a btree index cannot serve
+        # '%term%' there, so the fallback is a scan of the single normalized column
+        rows = bind.execute(sa.select(properties.c.property_id, properties.c.street,
+                                      properties.c.city, properties.c.state)).fetchall()
+        if rows:
+            bind.execute(
+                properties.update()
+                .where(properties.c.property_id == sa.bindparam('pid'))
+                .values(location_key=sa.bindparam('key')),
+                [{'pid': r.property_id,
+                  'key': _LOCATION_SEPARATORS.sub(
+                      ' ', ' '.join(p for p in (r.street, r.city, r.state) if p).lower()).strip()}
+                 for r in rows]
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_properties_location_key_trgm', table_name='properties')
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('location_key')
@@ -0,0 +1,47 @@
+"""background job queue
+
+Revision ID: 2e6c4f8a1d93
+Revises: 7b4d09e3c2f8
+Create Date: 2025-07-03 10:14:52.630419
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e6c4f8a1d93'
+down_revision = '7b4d09e3c2f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('job_id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=200), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('job_id'),
+        sa.UniqueConstraint('idempotency_key'),
+    )
+    # partial: the dequeue scan never walks past done / failed rows
+    op.create_index('ix_jobs_queued', 'jobs', ['run_at', 'job_id'],
+                    postgresql_where=sa.text("status = 'queued'"),
+                    sqlite_where=sa.text("status = 'queued'"))
+    # reaping jobs whose worker died, purging finished ones
+    op.create_index('ix_jobs_status_locked', 'jobs', ['status', 'locked_at'])
+
+
+def downgrade():
+    op.drop_table('jobs')
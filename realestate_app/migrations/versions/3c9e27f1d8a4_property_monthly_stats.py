@@ -0,0 +1,39 @@
+"""property monthly stats
+
+Revision ID: 3c9e27f1d8a4
+Revises: b7d41e9a0c52
+Create Date: 2025-06-11 15:02:48.227361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e27f1d8a4'
+down_revision = 'b7d41e9a0c52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'property_monthly_stats',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('agent_email', sa.String(length=100), nullable=False),
+        sa.Column('booked_days', sa.Integer(), nullable=False),
+        sa.Column('bookings', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.property_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['agent_email'], ['agents.email'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('property_id', 'month'),
+    )
+    op.create_index('ix_property_monthly_stats_agent_month', 'property_monthly_stats',
+                    ['agent_email', 'month'])
+    # populate with `flask rebuild-booking-stats` once deployed
+
+
+def downgrade():
+    op.drop_index('ix_property_monthly_stats_agent_month', table_name='property_monthly_stats')
+    op.drop_table('property_monthly_stats')
@@ -0,0 +1,205 @@
+"""partition bookings by month, bookings_archive
+
+Revision ID: 4f1a7c2e9b60
+Revises: 2e6c4f8a1d93
+Create Date: 2025-07-10 16:05:41.218907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1a7c2e9b60'
+down_revision = '2e6c4f8a1d93'
+branch_labels = None
+depends_on = None
+
+# availability.MAX_BOOKING_DAYS when this was written (migrations don't import the app)
+MAX_BOOKING_DAYS = 366
+AHEAD_MONTHS = 24
+COPY_BATCH = 1_000_000             # bookings per INSERT ... SELECT
+
+# One partition per calendar month of start_date, named bookings_pYYYY_MM. A partition
+# created after rows of its month went to bookings_default takes those rows over.
+# Exclusion constraints cannot span partitions (Postgres 15), so each one keeps its own
+# bookings_no_overlap twin for stays within its month, and the bookings_no_overlap
+# trigger (OVERLAP_GUARD) rejects overlaps across months for every writer.
+ADD_PARTITION = r"""
+CREATE FUNCTION bookings_add_partition(first_day date) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo   date := date_trunc('month', first_day)::date;
+    hi   date := (date_trunc('month', first_day) + interval '1 month')::date;
+    part text := 'bookings_p' || to_char(first_day, 'YYYY_MM');
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE bookings INCLUDING DEFAULTS)', part);
+    EXECUTE format('WITH moved AS (DELETE FROM bookings_default WHERE start_date >= %L AND start_date < %L '
+                   || 'RETURNING *) INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                   || '(property_id WITH =, daterange(start_date, end_date, ''[]'') WITH &&)',
+                   part, part || '_no_overlap');
+    EXECUTE format('ALTER TABLE bookings ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    RETURN true;
+END
+$$
+"""
+
+NO_OVERLAP = "EXCLUDE USING gist (property_id WITH =, daterange(start_date, end_date, '[]') WITH &&)"
+
+# After each inserted or re-dated booking: serialize the writers of one listing on a
+# transaction-level advisory lock, then look for an overlapping booking in any month
+# (bounded by the longest stay, so only those partitions are read). Under READ COMMITTED
+# each query here sees everything committed before the lock was granted. Raises the
+# exclusion constraints' SQLSTATE, so booking_engine reports it as a Conflict.
+OVERLAP_GUARD = rf"""
+CREATE FUNCTION bookings_check_overlap() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock('bookings'::regclass::oid::int, NEW.property_id);
+    IF EXISTS (SELECT 1 FROM bookings b
+               WHERE b.property_id = NEW.property_id
+                 AND b.booking_id <> NEW.booking_id
+                 AND b.start_date BETWEEN NEW.start_date - {MAX_BOOKING_DAYS - 1} AND NEW.end_date
+                 AND daterange(b.start_date, b.end_date, '[]')
+                     && daterange(NEW.start_date, NEW.end_date, '[]')) THEN
+        RAISE EXCEPTION 'booking % of property % overlaps another booking',
+                        NEW.booking_id, NEW.property_id
+            USING ERRCODE = 'exclusion_violation', CONSTRAINT = 'bookings_no_overlap',
+                  TABLE = 'bookings';
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER bookings_no_overlap
+    AFTER INSERT OR UPDATE OF property_id, start_date, end_date ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_check_overlap();
+"""
+
+
+def _booking_columns():
+    return [
+        sa.Column('booking_id', sa.Integer(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('renter_email', sa.String(length=100), nullable=False),
+        sa.Column('card_number', sa.String(length=20), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=False),
+        sa.Column('total_cost', sa.Numeric(precision=12, scale=2), nullable=False),
+    ]
+
+
+def _copy_in_batches(bind, source, target, batch=COPY_BATCH):
+    # booking_id ranges walk the source's primary key, so no single statement copies the
+    # whole table
+    lo, hi = bind.execute(sa.text(f'SELECT min(booking_id), max(booking_id) FROM {source}')).one()
+    for first in range(lo or 0, (hi or -1) + 1, batch):
+        bind.execute(sa.text(
+            f'INSERT INTO {target} (booking_id, property_id, renter_email, card_number, '
+            f'start_date, end_date, total_cost) '
+            f'SELECT booking_id, property_id, renter_email, card_number, '
+            f'start_date, end_date, total_cost FROM {source} '
+            f'WHERE booking_id >= :first AND booking_id < :next'),
+            {'first': first, 'next': first + batch})
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.create_table('bookings_archive', *_booking_columns(), sa.PrimaryKeyConstraint('booking_id'))
+        return
+    # the copy, the partition moves and ANALYZE outlast any per-statement cap; SET LOCAL
+    # ends with the migration's transaction
+    op.execute('SET LOCAL statement_timeout = 0')
+
+    # overlap lookups bound start_date by the longest possible stay
+    longest = bind.execute(sa.text('SELECT max(end_date - start_date) + 1 FROM bookings')).scalar()
+    if longest and longest > MAX_BOOKING_DAYS:
+        raise RuntimeError(f'bookings holds a {longest}-day stay; split stays longer than '
+                           f'{MAX_BOOKING_DAYS} days before partitioning')
+    seq = bind.execute(sa.text("SELECT pg_get_serial_sequence('bookings', 'booking_id')")).scalar()
+
+    op.execute('ALTER TABLE bookings DROP CONSTRAINT bookings_no_overlap')
+    op.execute('ALTER TABLE bookings RENAME TO bookings_unpartitioned')
+    op.execute('ALTER INDEX bookings_pkey RENAME TO bookings_unpartitioned_pkey')
+    op.execute('ALTER INDEX ix_bookings_property_dates RENAME TO ix_bookings_unpartitioned_property_dates')
+    op.execute('ALTER INDEX ix_bookings_renter_start RENAME TO ix_bookings_unpartitioned_renter_start')
+
+    # the primary key of a partitioned table must contain the partition key
+    op.execute(f"""
+        CREATE TABLE bookings (
+            booking_id   integer NOT NULL DEFAULT nextval('{seq}'),
+            property_id  integer NOT NULL REFERENCES properties (property_id) ON DELETE CASCADE,
+            renter_email varchar(100) NOT NULL REFERENCES renters (email) ON DELETE CASCADE,
+            card_number  varchar(20) NOT NULL REFERENCES credit_cards (card_number) ON DELETE RESTRICT,
+            start_date   date NOT NULL,
+            end_date     date NOT NULL,
+            total_cost   numeric(12, 2) NOT NULL,
+            CONSTRAINT bookings_pkey PRIMARY KEY (booking_id, start_date)
+        ) PARTITION BY RANGE (start_date)
+    """)
+    op.execute(f'ALTER SEQUENCE {seq} OWNED BY bookings.booking_id')
+    op.execute('CREATE INDEX ix_bookings_property_dates ON bookings (property_id, start_date, end_date)')
+    op.execute('CREATE INDEX ix_bookings_renter_start ON bookings (renter_email, start_date)')
+    # catches stays beyond the last monthly partition; `flask booking-partitions` keeps it empty
+    op.execute('CREATE TABLE bookings_default PARTITION OF bookings DEFAULT')
+    op.execute(f'ALTER TABLE bookings_default ADD CONSTRAINT bookings_default_no_overlap {NO_OVERLAP}')
+    op.execute(ADD_PARTITION)
+    op.execute(f"""
+        SELECT bookings_add_partition(m::date)
+        FROM generate_series(
+            date_trunc('month', LEAST((SELECT min(start_date) FROM bookings_unpartitioned), current_date)),
+            date_trunc('month', current_date) + interval '{AHEAD_MONTHS} months',
+            interval '1 month') AS m
+    """)
+    _copy_in_batches(bind, 'bookings_unpartitioned', 'bookings')
+    op.execute('DROP TABLE bookings_unpartitioned')
+    # the copied rows were checked by the old table-wide constraint
+    op.execute(OVERLAP_GUARD)
+
+    # archived months are attached here without indexes or foreign keys
+    op.create_table('bookings_archive', *_booking_columns(),
+                    postgresql_partition_by='RANGE (start_date)')
+    op.execute('CREATE TABLE bookings_archive_default PARTITION OF bookings_archive DEFAULT')
+    op.execute('ANALYZE bookings')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.execute(sa.text('SELECT EXISTS (SELECT 1 FROM bookings_archive)')).scalar():
+        raise RuntimeError('bookings_archive is not empty; move archived bookings back '
+                           'or export them before downgrading')
+    op.drop_table('bookings_archive')
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute('SET LOCAL statement_timeout = 0')
+    seq = bind.execute(sa.text("SELECT pg_get_serial_sequence('bookings', 'booking_id')")).scalar()
+    op.execute('DROP TRIGGER bookings_no_overlap ON bookings')
+    op.execute('DROP FUNCTION bookings_check_overlap()')
+    op.execute('ALTER TABLE bookings RENAME TO bookings_partitioned')
+    op.execute('ALTER INDEX bookings_pkey RENAME TO bookings_partitioned_pkey')
+    op.execute('ALTER INDEX ix_bookings_property_dates RENAME TO ix_bookings_partitioned_property_dates')
+    op.execute('ALTER INDEX ix_bookings_renter_start RENAME TO ix_bookings_partitioned_renter_start')
+    op.execute(f"""
+        CREATE TABLE bookings (
+            booking_id   integer NOT NULL DEFAULT nextval('{seq}'),
+            property_id  integer NOT NULL REFERENCES properties (property_id) ON DELETE CASCADE,
+            renter_email varchar(100) NOT NULL REFERENCES renters (email) ON DELETE CASCADE,
+            card_number  varchar(20) NOT NULL REFERENCES credit_cards (card_number) ON DELETE RESTRICT,
+            start_date   date NOT NULL,
+            end_date     date NOT NULL,
+            total_cost   numeric(12, 2) NOT NULL,
+            CONSTRAINT bookings_pkey PRIMARY KEY (booking_id)
+        )
+    """)
+    _copy_in_batches(bind, 'bookings_partitioned', 'bookings')
+    op.execute(f'ALTER SEQUENCE {seq} OWNED BY bookings.booking_id')
+    op.execute('DROP TABLE bookings_partitioned')
+    op.execute('DROP FUNCTION bookings_add_partition(date)')
+    op.create_index('ix_bookings_property_dates', 'bookings', ['property_id', 'start_date', 'end_date'])
+    op.create_index('ix_bookings_renter_start', 'bookings', ['renter_email', 'start_date'])
+    op.execute(f'ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap {NO_OVERLAP}')
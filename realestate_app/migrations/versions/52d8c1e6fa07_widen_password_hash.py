@@ -0,0 +1,29 @@
+"""widen users.password_hash
+
+Revision ID: 52d8c1e6fa07
+Revises: e41b7a9c03d5
+Create Date: 2025-06-16 11:27:05.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '52d8c1e6fa07'
+down_revision = 'e41b7a9c03d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt hashes ("scrypt:32768:8:1$<salt>$<128 hex>") do not fit in 128 characters
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=128),
+                              type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=255),
+                              type_=sa.String(length=128), existing_nullable=False)
@@ -0,0 +1,33 @@
+"""property num_rooms
+
+Revision ID: 597e5c8452eb
+Revises: 61fff247668e
+Create Date: 2025-06-06 16:48:02.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '597e5c8452eb'
+down_revision = '61fff247668e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('properties', sa.Column('num_rooms', sa.Integer(), nullable=True))
+    # backfill from the subtype tables; commercial listings keep NULL
+    op.execute(
+        "UPDATE properties SET num_rooms = COALESCE("
+        " (SELECT h.num_rooms FROM houses h WHERE h.property_id = properties.property_id),"
+        " (SELECT a.num_rooms FROM apartments a WHERE a.property_id = properties.property_id))"
+    )
+    op.create_index('ix_properties_num_rooms_price', 'properties', ['num_rooms', 'price'])
+
+
+def downgrade():
+    op.drop_index('ix_properties_num_rooms_price', table_name='properties')
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('num_rooms')
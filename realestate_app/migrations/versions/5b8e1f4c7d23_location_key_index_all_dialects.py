@@ -0,0 +1,29 @@
+"""location key index on every dialect
+
+Revision ID: 5b8e1f4c7d23
+Revises: 8e2b5d7c4a19
+Create Date: 2025-07-15 09:42:18.316054
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e1f4c7d23'
+down_revision = '8e2b5d7c4a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 080896078aae built ix_properties_location_key_trgm (pg_trgm GIN) on Postgres only,
+    # while models.Property declares it everywhere. Elsewhere it is a plain index: it
+    # cannot serve '%term%', but the schema now matches the model.
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_properties_location_key_trgm', 'properties', ['location_key'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_properties_location_key_trgm', table_name='properties')
@@ -0,0 +1,39 @@
+"""booking period exclusion
+
+Revision ID: 61fff247668e
+Revises: 080896078aae
+Create Date: 2025-06-04 09:31:17.562841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '61fff247668e'
+down_revision = '080896078aae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_bookings_property_dates', 'bookings',
+                    ['property_id', 'start_date', 'end_date'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Booking periods are the inclusive daterange(start_date, end_date, '[]').
+        # The exclusion constraint rejects a second booking of the same property for any
+        # overlapping day, and its GiST index (property_id, period) also serves the
+        # "&&" availability lookups in availability.overlaps(). Fails if the table
+        # already contains double bookings -- clean those up first.
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            "ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap "
+            "EXCLUDE USING gist (property_id WITH =, daterange(start_date, end_date, '[]') WITH &&)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE bookings DROP CONSTRAINT bookings_no_overlap')
+    op.drop_index('ix_bookings_property_dates', table_name='bookings')
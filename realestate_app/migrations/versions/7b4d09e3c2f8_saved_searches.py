@@ -0,0 +1,65 @@
+"""saved searches and match inbox
+
+Revision ID: 7b4d09e3c2f8
+Revises: c5a8e2f91b36
+Create Date: 2025-06-27 15:32:08.517264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4d09e3c2f8'
+down_revision = 'c5a8e2f91b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'saved_searches',
+        sa.Column('search_id', sa.Integer(), nullable=False),
+        sa.Column('renter_email', sa.String(length=100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('location', sa.String(length=255), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=False),
+        sa.Column('property_type', sa.String(length=50), nullable=False),
+        sa.Column('min_price', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('max_price', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('min_bedrooms', sa.Integer(), nullable=True),
+        sa.Column('radius', sa.Float(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('match_key', sa.String(length=260), nullable=False),
+        sa.Column('price_band', sa.SmallInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['renter_email'], ['renters.email'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('search_id'),
+    )
+    # the matcher's lookup: candidate keys x (type, '') x bands at or above the listing's
+    op.create_index('ix_saved_searches_match', 'saved_searches',
+                    ['match_key', 'property_type', 'price_band'])
+    op.create_index('ix_saved_searches_renter', 'saved_searches', ['renter_email'])
+
+    op.create_table(
+        'saved_search_matches',
+        sa.Column('match_id', sa.Integer(), nullable=False),
+        sa.Column('search_id', sa.Integer(), nullable=False),
+        sa.Column('renter_email', sa.String(length=100), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('matched_at', sa.DateTime(), nullable=False),
+        sa.Column('seen', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['search_id'], ['saved_searches.search_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['renter_email'], ['renters.email'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.property_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('match_id'),
+        sa.UniqueConstraint('search_id', 'property_id', name='uq_saved_search_matches_search_property'),
+    )
+    op.create_index('ix_saved_search_matches_renter', 'saved_search_matches',
+                    ['renter_email', 'match_id'])
+
+
+def downgrade():
+    op.drop_table('saved_search_matches')
+    op.drop_table('saved_searches')
@@ -0,0 +1,82 @@
+"""bookings: check the longest stay
+
+Revision ID: 8e2b5d7c4a19
+Revises: 4f1a7c2e9b60
+Create Date: 2025-07-14 11:20:07.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b5d7c4a19'
+down_revision = '4f1a7c2e9b60'
+branch_labels = None
+depends_on = None
+
+# availability.MAX_BOOKING_DAYS when this was written (migrations don't import the app).
+# The overlap lookups (availability.overlaps, pricing.quote_many) only look this far
+# back for bookings that started before a stay, so a longer booking would go unseen.
+MAX_BOOKING_DAYS = 366
+
+STAY_DAYS = {
+    'postgresql': '(end_date - start_date)',
+    'sqlite': '(julianday(end_date) - julianday(start_date))',
+}
+
+# bookings_add_partition() from 4f1a7c2e9b60; ATTACH PARTITION requires the new month
+# to carry the CHECK constraints of bookings, so it now copies them ({like}).
+ADD_PARTITION = r"""
+CREATE OR REPLACE FUNCTION bookings_add_partition(first_day date) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    lo   date := date_trunc('month', first_day)::date;
+    hi   date := (date_trunc('month', first_day) + interval '1 month')::date;
+    part text := 'bookings_p' || to_char(first_day, 'YYYY_MM');
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE bookings {like})', part);
+    EXECUTE format('WITH moved AS (DELETE FROM bookings_default WHERE start_date >= %L AND start_date < %L '
+                   || 'RETURNING *) INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                   || '(property_id WITH =, daterange(start_date, end_date, ''[]'') WITH &&)',
+                   part, part || '_no_overlap');
+    EXECUTE format('ALTER TABLE bookings ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    RETURN true;
+END
+$$
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    stay_days = STAY_DAYS.get(bind.dialect.name, STAY_DAYS['postgresql'])
+    longest = bind.execute(sa.text(f'SELECT max({stay_days}) + 1 FROM bookings')).scalar()
+    if longest and longest > MAX_BOOKING_DAYS:
+        raise RuntimeError(f'bookings holds a {int(longest)}-day stay; split stays longer than '
+                           f'{MAX_BOOKING_DAYS} days first')
+
+    check = f'{stay_days} < {MAX_BOOKING_DAYS}'
+    if bind.dialect.name == 'sqlite':
+        # SQLite cannot add a constraint in place
+        with op.batch_alter_table('bookings', recreate='always') as batch:
+            batch.create_check_constraint('ck_bookings_max_stay', sa.text(check))
+        return
+    # on the partitioned table this reaches every monthly partition and bookings_default
+    op.create_check_constraint('ck_bookings_max_stay', 'bookings', sa.text(check))
+    if bind.dialect.name == 'postgresql':
+        op.execute(ADD_PARTITION.format(like='INCLUDING DEFAULTS INCLUDING CONSTRAINTS'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        with op.batch_alter_table('bookings', recreate='always') as batch:
+            batch.drop_constraint('ck_bookings_max_stay', type_='check')
+        return
+    if bind.dialect.name == 'postgresql':
+        op.execute(ADD_PARTITION.format(like='INCLUDING DEFAULTS'))
+    op.drop_constraint('ck_bookings_max_stay', 'bookings', type_='check')
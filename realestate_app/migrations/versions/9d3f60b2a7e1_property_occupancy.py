@@ -0,0 +1,32 @@
+"""property occupancy bitmap
+
+Revision ID: 9d3f60b2a7e1
+Revises: 52d8c1e6fa07
+Create Date: 2025-06-20 14:06:51.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f60b2a7e1'
+down_revision = '52d8c1e6fa07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'property_occupancy',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('days', sa.LargeBinary(length=46), nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.property_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('property_id', 'year'),
+    )
+    # populate with `flask rebuild-occupancy` once deployed
+
+
+def downgrade():
+    op.drop_table('property_occupancy')
@@ -0,0 +1,28 @@
+"""booking list indexes
+
+Revision ID: b7d41e9a0c52
+Revises: 597e5c8452eb
+Create Date: 2025-06-09 10:14:37.512093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41e9a0c52'
+down_revision = '597e5c8452eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # agent pages join bookings to the agent's properties; renter pages read one
+    # renter's bookings by start date. Neither foreign key was indexed.
+    op.create_index('ix_properties_agent_email', 'properties', ['agent_email'])
+    op.create_index('ix_bookings_renter_start', 'bookings', ['renter_email', 'start_date'])
+
+
+def downgrade():
+    op.drop_index('ix_bookings_renter_start', table_name='bookings')
+    op.drop_index('ix_properties_agent_email', table_name='properties')
@@ -0,0 +1,31 @@
+"""property coordinates
+
+Revision ID: c5a8e2f91b36
+Revises: 9d3f60b2a7e1
+Create Date: 2025-06-24 10:17:53.204871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8e2f91b36'
+down_revision = '9d3f60b2a7e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('properties', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('properties', sa.Column('longitude', sa.Float(), nullable=True))
+    # radius search: a latitude range scan with the longitude range checked in the index
+    op.create_index('ix_properties_lat_lng', 'properties', ['latitude', 'longitude'])
+    # existing rows are geocoded afterwards with `flask geocode-properties`
+
+
+def downgrade():
+    op.drop_index('ix_properties_lat_lng', table_name='properties')
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,26 @@
+"""property row version
+
+Revision ID: e41b7a9c03d5
+Revises: 3c9e27f1d8a4
+Create Date: 2025-06-13 09:41:12.660418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7a9c03d5'
+down_revision = '3c9e27f1d8a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows start at version 1; the ORM increments it on every update
+    op.add_column('properties', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('properties') as batch_op:
+        batch_op.drop_column('version')
@@ -1,15 +1,54 @@
+import re
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import Integer, event
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import foreign
+from sqlalchemy.sql.expression import FunctionElement
+
+from replicas import RoutingSession
+
+# db.session may read from a replica inside @replicas.read_only views
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+_LOCATION_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize_location(*parts):
+    # lower-case, drop punctuation, single spaces: "500 W. Madison St, Chicago" -> "500 w madison st chicago"
+    return _LOCATION_SEPARATORS.sub(' ', ' '.join(p for p in parts if p).lower()).strip()
+
+
+# Longest stay, in days, a booking may span (re-exported by availability, whose overlap
+# lookups rely on it); bookings.ck_bookings_max_stay enforces it in the database.
+MAX_BOOKING_DAYS = 366
+
+
+class date_diff(FunctionElement):
+    """date_diff(a, b): whole days from date b to date a."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(date_diff)
+def _date_diff(element, compiler, **kw):
+    a, b = element.clauses
+    return f'({compiler.process(a, **kw)} - {compiler.process(b, **kw)})'
+
 
-db = SQLAlchemy()
+@compiles(date_diff, 'sqlite')
+def _date_diff_sqlite(element, compiler, **kw):
+    a, b = element.clauses
+    return f'(julianday({compiler.process(a, **kw)}) - julianday({compiler.process(b, **kw)}))'
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
     email        = db.Column(db.String(100), primary_key=True)
     full_name    = db.Column(db.String(200), nullable=False)
     user_type    = db.Column(db.String(20), nullable=False)  # 'agent' or 'renter'
-    password_hash= db.Column(db.String(128), nullable=False)
+    password_hash= db.Column(db.String(255), nullable=False)
 
     agent    = db.relationship('Agent', backref='user', uselist=False)
     renter   = db.relationship('Renter', backref='user', uselist=False)
@@ -82,12 +121,40 @@ class Property(db.Model):
     available_from  = db.Column(db.Date)
     available_to    = db.Column(db.Date)
     sqr_footage     = db.Column(db.Integer)
+    # copy of houses/apartments.num_rooms (NULL for commercial) so search can filter and
+    # sort on bedrooms without joining the subtype tables; set by add/edit_property
+    num_rooms       = db.Column(db.Integer)
+    # normalized "street city state", trigram-indexed on Postgres for substring search
+    location_key    = db.Column(db.String(410))
+    # WGS84 degrees from geocoding.py (city precision with the default lookup table);
+    # NULL when the address could not be geocoded, which keeps it out of radius searches
+    latitude        = db.Column(db.Float)
+    longitude       = db.Column(db.Float)
+    # row version, bumped by the ORM on every UPDATE (optimistic locking); the JSON
+    # API derives its ETags from it
+    version         = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     house           = db.relationship('House', uselist=False, backref='property', cascade="all, delete-orphan", passive_deletes=True)
     apartment       = db.relationship('Apartment', uselist=False, backref='property', cascade="all, delete-orphan", passive_deletes=True)
     commercial      = db.relationship('CommercialBuilding', uselist=False, backref='property', cascade="all, delete-orphan", passive_deletes=True)
     bookings        = db.relationship('Booking', backref='property', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_properties_location_key_trgm', 'location_key',
+                 postgresql_using='gin',
+                 postgresql_ops={'location_key': 'gin_trgm_ops'}),
+        db.Index('ix_properties_num_rooms_price', 'num_rooms', 'price'),
+        db.Index('ix_properties_agent_email', 'agent_email'),
+        db.Index('ix_properties_lat_lng', 'latitude', 'longitude'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+
+@event.listens_for(Property, 'before_insert')
+@event.listens_for(Property, 'before_update')
+def _set_location_key(mapper, connection, target):
+    target.location_key = normalize_location(target.street, target.city, target.state)
+
 
 class House(db.Model):
     __tablename__ = 'houses'
@@ -118,3 +185,129 @@ class Booking(db.Model):
     end_date     = db.Column(db.Date, nullable=False)
     total_cost   = db.Column(db.Numeric(12,2), nullable=False)
 
+    # On Postgres the table is range-partitioned by month of start_date (migration
+    # 4f1a7c2e9b60, booking_partitions.py); its primary key there is (booking_id,
+    # start_date); each partition forbids overlapping periods per property and the
+    # bookings_no_overlap trigger does so across partitions.
+    __table_args__ = (
+        db.Index('ix_bookings_property_dates', 'property_id', 'start_date', 'end_date'),
+        # renter history pages / exports, newest stay first
+        db.Index('ix_bookings_renter_start', 'renter_email', 'start_date'),
+        # migration 8e2b5d7c4a19; end_date is inclusive
+        db.CheckConstraint(date_diff(end_date, start_date) < MAX_BOOKING_DAYS, name='ck_bookings_max_stay'),
+    )
+
+
+
+class ArchivedBooking(db.Model):
+    # bookings moved out of `bookings` by `flask archive-bookings` (booking_partitions.py).
+    # No foreign keys: archived stays outlive the listings, renters and cards they name.
+    __tablename__ = 'bookings_archive'
+    booking_id   = db.Column(db.Integer, primary_key=True)
+    property_id  = db.Column(db.Integer, nullable=False)
+    renter_email = db.Column(db.String(100), nullable=False)
+    card_number  = db.Column(db.String(20), nullable=False)
+    start_date   = db.Column(db.Date, nullable=False)
+    end_date     = db.Column(db.Date, nullable=False)
+    total_cost   = db.Column(db.Numeric(12,2), nullable=False)
+
+
+class PropertyMonthlyStats(db.Model):
+    # Booking rollup per listing and calendar month, maintained by booking_stats.py in the
+    # same transaction as the booking change; `flask rebuild-booking-stats` recomputes it.
+    __tablename__ = 'property_monthly_stats'
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.property_id', ondelete='CASCADE'), primary_key=True)
+    month       = db.Column(db.Date, primary_key=True)          # first day of the month
+    agent_email = db.Column(db.String(100), db.ForeignKey('agents.email', ondelete='CASCADE'), nullable=False)
+    booked_days = db.Column(db.Integer, nullable=False, default=0)
+    bookings    = db.Column(db.Integer, nullable=False, default=0)   # bookings touching the month
+    revenue     = db.Column(db.Numeric(14,2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_property_monthly_stats_agent_month', 'agent_email', 'month'),
+    )
+
+
+class PropertyOccupancy(db.Model):
+    # Booked days of one listing in one calendar year, one bit per day (bit i = Jan 1 + i,
+    # little-endian bytes). Maintained by occupancy.py in the same transaction as the
+    # booking change; `flask rebuild-occupancy` recomputes it.
+    __tablename__ = 'property_occupancy'
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.property_id', ondelete='CASCADE'), primary_key=True)
+    year        = db.Column(db.Integer, primary_key=True)
+    days        = db.Column(db.LargeBinary(46), nullable=False)    # 366 bits
+
+
+class SavedSearch(db.Model):
+    # A renter's search, re-checked against every listing that is added or changed
+    # (saved_searches.py). match_key / price_band place it in the matcher's index:
+    # 't:<normalized location>' or 'g<level>:<row>:<col>' for a radius search.
+    __tablename__ = 'saved_searches'
+    search_id     = db.Column(db.Integer, primary_key=True)
+    renter_email  = db.Column(db.String(100), db.ForeignKey('renters.email', ondelete='CASCADE'), nullable=False)
+    created_at    = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    location      = db.Column(db.String(255), nullable=False)
+    start_date    = db.Column(db.Date, nullable=False)
+    end_date      = db.Column(db.Date, nullable=False)
+    property_type = db.Column(db.String(50), nullable=False, default='')   # '' = any
+    min_price     = db.Column(db.Numeric(12,2))
+    max_price     = db.Column(db.Numeric(12,2))
+    min_bedrooms  = db.Column(db.Integer)
+    radius        = db.Column(db.Float)                                    # miles
+    latitude      = db.Column(db.Float)
+    longitude     = db.Column(db.Float)
+    match_key     = db.Column(db.String(260), nullable=False)
+    price_band    = db.Column(db.SmallInteger, nullable=False)
+
+    renter        = db.relationship('Renter', backref=db.backref('saved_searches', passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_saved_searches_match', 'match_key', 'property_type', 'price_band'),
+        db.Index('ix_saved_searches_renter', 'renter_email'),
+    )
+
+
+class SavedSearchMatch(db.Model):
+    # renter inbox: one row per (saved search, listing) that matched it
+    __tablename__ = 'saved_search_matches'
+    match_id     = db.Column(db.Integer, primary_key=True)
+    search_id    = db.Column(db.Integer, db.ForeignKey('saved_searches.search_id', ondelete='CASCADE'), nullable=False)
+    renter_email = db.Column(db.String(100), db.ForeignKey('renters.email', ondelete='CASCADE'), nullable=False)
+    property_id  = db.Column(db.Integer, db.ForeignKey('properties.property_id', ondelete='CASCADE'), nullable=False)
+    matched_at   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    seen         = db.Column(db.Boolean, nullable=False, default=False)
+
+    search       = db.relationship('SavedSearch')
+    property     = db.relationship('Property')
+
+    __table_args__ = (
+        db.UniqueConstraint('search_id', 'property_id', name='uq_saved_search_matches_search_property'),
+        db.Index('ix_saved_search_matches_renter', 'renter_email', 'match_id'),
+    )
+
+
+class Job(db.Model):
+    # deferred work queued in the same transaction as the change that needs it and run
+    # by `flask jobs work` (jobs.py)
+    __tablename__ = 'jobs'
+    job_id          = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    name            = db.Column(db.String(100), nullable=False)
+    payload         = db.Column(db.JSON, nullable=False)
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status          = db.Column(db.String(10), nullable=False, default='queued')  # queued/running/done/failed
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts    = db.Column(db.Integer, nullable=False)
+    run_at          = db.Column(db.DateTime, nullable=False)
+    created_at      = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by       = db.Column(db.String(100))
+    locked_at       = db.Column(db.DateTime)
+    finished_at     = db.Column(db.DateTime)
+    last_error      = db.Column(db.Text)
+
+    __table_args__ = (
+        # the dequeue scan: only queued rows, oldest due first
+        db.Index('ix_jobs_queued', 'run_at', 'job_id',
+                 postgresql_where=db.text("status = 'queued'"),
+                 sqlite_where=db.text("status = 'queued'")),
+        db.Index('ix_jobs_status_locked', 'status', 'locked_at'),
+    )
@@ -0,0 +1,235 @@
+import time
+from calendar import monthrange
+from collections import defaultdict
+from datetime import MAXYEAR, MINYEAR, date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, event, inspect, select, union_all
+
+from models import db, Property, Booking, ArchivedBooking, PropertyOccupancy
+
+# property_occupancy holds one bit per day per listing and year. Bookings never overlap
+# (booking_engine), so the flush that inserts a booking sets its days and the flush that
+# deletes it clears them; the bitmap commits or rolls back with the booking. Month views
+# and next-free-slot searches read a few 46-byte rows and work on Python ints (bit i =
+# day first + i) instead of scanning the listing's bookings.
+_TABLE = PropertyOccupancy.__table__
+_BYTES = 46
+_TRACKED = ('property_id', 'start_date', 'end_date')
+
+
+def init_app(app, db):
+    if not event.contains(db.session, 'after_flush', _apply_changes):
+        event.listen(db.session, 'after_flush', _apply_changes)
+
+
+def _to_int(days):
+    return int.from_bytes(days, 'little')
+
+
+def _to_bytes(bits):
+    return bits.to_bytes(_BYTES, 'little')
+
+
+def year_masks(start, end):
+    """(year, mask of the days of [start, end] in that year) for every year touched."""
+    for year in range(start.year, end.year + 1):
+        jan1 = date(year, 1, 1)
+        lo = (max(start, jan1) - jan1).days
+        hi = (min(end, date(year, 12, 31)) - jan1).days
+        yield year, ((1 << (hi - lo + 1)) - 1) << lo
+
+
+def _old(obj, attr):
+    hist = inspect(obj).attrs[attr].history
+    return hist.deleted[0] if hist.deleted else getattr(obj, attr)
+
+
+def _apply_changes(session, flush_context):
+    freed, booked = [], []                  # (property_id, start, end)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            freed.append(tuple(_old(obj, a) for a in _TRACKED))
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and any(inspect(obj).attrs[a].history.has_changes() for a in _TRACKED):
+            freed.append(tuple(_old(obj, a) for a in _TRACKED))
+            booked.append((obj.property_id, obj.start_date, obj.end_date))
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            booked.append((obj.property_id, obj.start_date, obj.end_date))
+    if not (freed or booked):
+        return
+    # a listing deleted in this flush takes its bitmap rows with it (ON DELETE CASCADE)
+    gone = {obj.property_id for obj in session.deleted if isinstance(obj, Property)}
+    clear, set_ = defaultdict(int), defaultdict(int)
+    for bits, changes in ((clear, freed), (set_, booked)):
+        for pid, start, end in changes:
+            if pid not in gone:
+                for year, mask in year_masks(start, end):
+                    bits[pid, year] |= mask
+    keys = set(clear) | set(set_)
+    if keys:
+        _write(session.connection(), keys, clear, set_)
+
+
+def _write(conn, keys, clear, set_):
+    q = (db.select(_TABLE.c.property_id, _TABLE.c.year, _TABLE.c.days)
+         .where(_TABLE.c.property_id.in_({pid for pid, _ in keys}),
+                _TABLE.c.year.in_({year for _, year in keys})))
+    if conn.dialect.name == 'postgresql':
+        # cancels do not lock the property; serialize read-modify-write on the rows instead
+        q = q.with_for_update()
+    current = {(pid, year): _to_int(days) for pid, year, days in conn.execute(q)}
+    updates, inserts = [], []
+    for key in keys:
+        bits = (current.get(key, 0) & ~clear[key]) | set_[key]
+        row = {'pid': key[0], 'yr': key[1], 'bits': _to_bytes(bits)}
+        if key in current:
+            updates.append(row)
+        elif bits:
+            inserts.append({'property_id': key[0], 'year': key[1], 'days': row['bits']})
+    if updates:
+        conn.execute(_TABLE.update()
+                     .where(and_(_TABLE.c.property_id == db.bindparam('pid'),
+                                 _TABLE.c.year == db.bindparam('yr')))
+                     .values(days=db.bindparam('bits')), updates)
+    if inserts:
+        conn.execute(_TABLE.insert(), inserts)
+
+
+# ---- full rebuild ----
+def rebuild(batch_size=5000):
+    """Recompute every bitmap from bookings and bookings_archive in one transaction;
+    returns rows written."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('LOCK TABLE bookings IN SHARE MODE'))
+    db.session.execute(_TABLE.delete())
+    # archiving moves rows without a flush, so the incremental path keeps their days;
+    # archived stays of deleted listings have no bitmap to go to
+    cols = ('property_id', 'start_date', 'end_date')
+    stays = union_all(*(select(*(t.c[c] for c in cols))
+                        for t in (Booking.__table__, ArchivedBooking.__table__))).subquery()
+    rows = (db.session.query(stays.c.property_id, stays.c.start_date, stays.c.end_date)
+            .join(Property, Property.property_id == stays.c.property_id)
+            .order_by(stays.c.property_id)
+            .yield_per(batch_size))
+    acc, written, current = defaultdict(int), 0, None
+
+    def flush():
+        db.session.execute(_TABLE.insert(), [
+            {'property_id': pid, 'year': year, 'days': _to_bytes(bits)}
+            for (pid, year), bits in acc.items()])
+        return len(acc)
+
+    for pid, start, end in rows:
+        # flush only between listings, so no (property, year) key spans two batches
+        if pid != current and len(acc) >= batch_size:
+            written += flush()
+            acc.clear()
+        current = pid
+        for year, mask in year_masks(start, end):
+            acc[pid, year] |= mask
+    if acc:
+        written += flush()
+    db.session.commit()
+    return written
+
+
+@click.command('rebuild-occupancy')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+@with_appcontext
+def rebuild_command(batch_size):
+    """Recompute property_occupancy from bookings and bookings_archive."""
+    t0 = time.perf_counter()
+    written = rebuild(batch_size)
+    click.echo(f'{written} property-year rows in {time.perf_counter() - t0:.1f}s')
+
+
+# ---- queries ----
+def _span(first, last):
+    return (1 << ((last - first).days + 1)) - 1
+
+
+def booked_bits(pid, first, last):
+    """Booked days of [first, last] as an int, bit i = first + i."""
+    bits = 0
+    for year, days in (db.session.query(PropertyOccupancy.year, PropertyOccupancy.days)
+                       .filter(PropertyOccupancy.property_id == pid,
+                               PropertyOccupancy.year.between(first.year, last.year))):
+        offset = (date(year, 1, 1) - first).days
+        value = _to_int(days)
+        bits |= value << offset if offset >= 0 else value >> -offset
+    return bits & _span(first, last)
+
+
+def window_bits(p, first, last):
+    """Days of [first, last] inside the listing's availability window."""
+    if not (p.available_from and p.available_to):
+        return 0
+    lo, hi = max(first, p.available_from), min(last, p.available_to)
+    return _span(lo, hi) << (lo - first).days if lo <= hi else 0
+
+
+def month_view(p, year, month):
+    """[(day, 'free' | 'booked' | 'unavailable')] for every day of the month."""
+    first = date(year, month, 1)
+    last = date(year, month, monthrange(year, month)[1])
+    booked, window = booked_bits(p.property_id, first, last), window_bits(p, first, last)
+    return [(first + timedelta(days=i),
+             'booked' if booked >> i & 1 else 'free' if window >> i & 1 else 'unavailable')
+            for i in range((last - first).days + 1)]
+
+
+def next_free(p, days, after):
+    """(start, end) of the first `days`-day free stay starting on or after `after`, or None."""
+    if days < 1 or not (p.available_from and p.available_to):
+        return None
+    first, last = max(after, p.available_from), p.available_to
+    if first > last:
+        return None
+    runs = window_bits(p, first, last) & ~booked_bits(p.property_id, first, last)
+    # after the loop bit i is set iff days i .. i + days - 1 are all free
+    length = 1
+    while length < days and runs:
+        step = min(length, days - length)
+        runs &= runs >> step
+        length += step
+    if not runs:
+        return None
+    start = first + timedelta(days=(runs & -runs).bit_length() - 1)
+    return start, start + timedelta(days=days - 1)
+
+
+# ---- calendar widget helpers ----
+def parse_month(value):
+    """'YYYY-MM' -> (year, month), None if missing or malformed."""
+    try:
+        d = datetime.strptime(value or '', '%Y-%m')
+    except ValueError:
+        return None
+    return d.year, d.month
+
+
+def adjacent_months(year, month):
+    """('YYYY-MM' of the month before, of the month after), None past date.min / date.max."""
+    prev = (year, month - 1) if month > 1 else (year - 1, 12)
+    nxt = (year, month + 1) if month < 12 else (year + 1, 1)
+    return tuple(f'{y:04d}-{m:02d}' if MINYEAR <= y <= MAXYEAR else None for y, m in (prev, nxt))
+
+
+def default_month(p, today):
+    # this month, pulled into the availability window
+    day = today
+    if p.available_from and day < p.available_from:
+        day = p.available_from
+    elif p.available_to and day > p.available_to:
+        day = p.available_to
+    return day.year, day.month
+
+
+def weeks(days):
+    """month_view() rows as Monday-first weeks, None for the padding cells."""
+    cells = [None] * days[0][0].weekday() + days
+    cells += [None] * (-len(cells) % 7)
+    return [cells[i:i + 7] for i in range(0, len(cells), 7)]
@@ -0,0 +1,98 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Password hashing in a small per-process pool. PBKDF2 / scrypt run on its threads
+# (hashlib releases the GIL while hashing), so a login burst keeps at most
+# PASSWORD_HASH_WORKERS cores busy per web worker and other endpoints still get CPU.
+# The request thread still blocks on the result: the pool bounds how many hashes run
+# at once, it does not free the calling worker thread while it waits.
+# At most PASSWORD_HASH_MAX_QUEUE more may wait; past that the request is answered
+# 429 straight away rather than queueing behind the burst. A hash stored under an
+# older PASSWORD_HASH_METHOD (algorithm or cost, with werkzeug's defaults filled in)
+# is replaced on the owner's next successful login.
+_method = 'pbkdf2:sha256:600000'
+_workers = 1
+_max_queue = 8
+_pool = None                # (pid, executor, slots), rebuilt in each forked worker
+_lock = threading.Lock()
+
+
+class HashingBusy(TooManyRequests):
+    description = 'Too many sign-ins in progress. Please try again in a moment.'
+
+
+def init_app(app):
+    global _method, _workers, _max_queue, _pool
+    _method = app.config.get('PASSWORD_HASH_METHOD', _method)
+    _workers = app.config.get('PASSWORD_HASH_WORKERS', _workers)
+    _max_queue = app.config.get('PASSWORD_HASH_MAX_QUEUE', _max_queue)
+    _pool = None
+
+
+def _executor():
+    global _pool
+    pool = _pool
+    if pool is None or pool[0] != os.getpid():
+        with _lock:
+            if _pool is None or _pool[0] != os.getpid():
+                _pool = (os.getpid(),
+                         ThreadPoolExecutor(_workers, thread_name_prefix='password-hash'),
+                         threading.BoundedSemaphore(_workers + _max_queue))
+            pool = _pool
+    return pool[1], pool[2]
+
+
+def _run(fn, *args):
+    if _workers <= 0:                       # hashing inline, e.g. for scripts
+        return fn(*args)
+    executor, slots = _executor()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy(retry_after=1)
+    try:
+        return executor.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+def _params(method):
+    # a werkzeug method with its defaults filled in, e.g. "pbkdf2:sha256" ->
+    # ('pbkdf2', 'sha256', 600000), "scrypt" -> ('scrypt', 32768, 8, 1)
+    name, *args = method.split(':')
+    try:
+        if name == 'pbkdf2':
+            return (name, args[0] if args else 'sha256',
+                    int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS)
+        if name == 'scrypt':
+            return (name, *map(int, args)) if args else (name, 2 ** 15, 8, 1)
+    except ValueError:
+        pass
+    return (method,)
+
+
+def needs_rehash(pw_hash):
+    # werkzeug hashes are "<method>$<salt>$<hash>", e.g. "pbkdf2:sha256:600000$..."
+    return _params(pw_hash.split('$', 1)[0]) != _params(_method)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _method)
+
+
+def _check(pw_hash, password):
+    try:
+        ok = check_password_hash(pw_hash, password)
+    except (ValueError, TypeError):         # not a werkzeug hash (e.g. passlib-style sample data)
+        ok = False
+    if ok and needs_rehash(pw_hash):
+        return True, generate_password_hash(password, _method)
+    return ok, None
+
+
+def verify(pw_hash, password):
+    """(matches, new hash or None); a new hash is returned when the stored one predates the policy.
+    Blocks the calling thread until the pool has checked the password."""
+    return _run(_check, pw_hash, password)
@@ -0,0 +1,86 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from availability import MAX_BOOKING_DAYS
+from models import db
+
+# Rent quotes. A stay is charged the listing's monthly price for every calendar month it
+# touches (inclusive), in Decimal and rounded to cents. quote_many() prices any number of
+# (property_id, start, end) requests: one statement per chunk returns every request's
+# price, availability window and whether an existing booking overlaps it, and the month
+# math then runs over the whole batch in Python.
+_CENT = Decimal('0.01')
+
+Quote = namedtuple('Quote', 'property_id start end months total status')
+# status: 'available', 'booked', 'outside_window', 'too_long' (over MAX_BOOKING_DAYS, which
+# the overlap probe cannot see past), 'invalid_dates' or 'unknown_property'; months/total
+# are None only for the last two
+
+
+def months_charged(start, end):
+    return (end.year - start.year) * 12 + (end.month - start.month) + 1
+
+
+def total_cost(price, start, end):
+    return (Decimal(price) * months_charged(start, end)).quantize(_CENT)
+
+
+def _overlap_sql(dialect):
+    # the start_date range (availability.start_window) lets Postgres prune partitions
+    if dialect == 'postgresql':
+        # same expression as the partitions' exclusion constraints, so their GiST indexes
+        # serve the probe
+        return (f"b.start_date BETWEEN q.s - {MAX_BOOKING_DAYS - 1} AND q.e "
+                "AND daterange(b.start_date, b.end_date, '[]') && daterange(q.s, q.e, '[]')")
+    return (f"b.start_date BETWEEN date(q.s, '-{MAX_BOOKING_DAYS - 1} days') AND q.e "
+            "AND b.end_date >= q.s")
+
+
+def _lookup(chunk, offset, dialect):
+    rows = ', '.join(f'(:i{k}, :p{k}, :s{k}, :e{k})' for k in range(len(chunk)))
+    params = {}
+    for k, (pid, start, end) in enumerate(chunk):
+        params.update({f'i{k}': offset + k, f'p{k}': pid, f's{k}': start, f'e{k}': end})
+    stmt = db.text(f"""
+        WITH q(idx, pid, s, e) AS (VALUES {rows})
+        SELECT q.idx, p.price, p.available_from, p.available_to,
+               EXISTS (SELECT 1 FROM bookings b
+                       WHERE b.property_id = q.pid AND {_overlap_sql(dialect)}) AS booked
+        FROM q LEFT JOIN properties p ON p.property_id = q.pid
+    """).bindparams(
+        *(db.bindparam(f'{c}{k}', type_=db.Date) for k in range(len(chunk)) for c in 'se')
+    ).columns(
+        db.column('idx', db.Integer), db.column('price', db.Numeric(12, 2)),
+        db.column('available_from', db.Date), db.column('available_to', db.Date),
+        db.column('booked', db.Boolean),
+    )
+    return db.session.execute(stmt, params).all()
+
+
+def quote_many(requests, chunk_size=2000):
+    """One Quote per (property_id, start, end) request, in request order."""
+    requests = list(requests)
+    dialect = db.engine.dialect.name
+    found = {}
+    for lo in range(0, len(requests), chunk_size):
+        for idx, price, first, last, booked in _lookup(requests[lo:lo + chunk_size], lo, dialect):
+            found[idx] = (price, first, last, booked)
+
+    quotes = []
+    for idx, (pid, start, end) in enumerate(requests):
+        price, first, last, booked = found.get(idx, (None, None, None, None))
+        if price is None:
+            quotes.append(Quote(pid, start, end, None, None, 'unknown_property'))
+            continue
+        if start > end:
+            quotes.append(Quote(pid, start, end, None, None, 'invalid_dates'))
+            continue
+        months = months_charged(start, end)
+        if (end - start).days + 1 > MAX_BOOKING_DAYS:
+            status = 'too_long'
+        elif not (first and last and first <= start and end <= last):
+            status = 'outside_window'
+        else:
+            status = 'booked' if booked else 'available'
+        quotes.append(Quote(pid, start, end, months, (Decimal(price) * months).quantize(_CENT), status))
+    return quotes
@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+import geocoding
+import saved_searches
+import search_cache
+from forms import PropertyForm
+from models import db, Agent, Property, House, Apartment, CommercialBuilding, normalize_location
+
+# Bulk listing ingest: stream-parse CSV or JSON Lines, validate every row with
+# PropertyForm's rules, and write listings with their subtype rows as multi-row INSERTs,
+# one transaction per batch. Invalid rows are reported by line number and skipped; a
+# batch the database rejects is retried row by row so only the offending rows fail.
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []            # (line, {field: [messages]}), first MAX_REPORTED_ERRORS
+
+    def reject(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, errors))
+
+    def as_dict(self):
+        return {'inserted': self.inserted, 'failed': self.failed,
+                'errors': [{'line': line, 'errors': errors} for line, errors in self.errors]}
+
+
+def detect_format(filename):
+    fmt = FORMATS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt is None:
+        raise ValueError(f"can't tell the format of {filename!r}; expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def iter_records(stream, fmt):
+    """Yield (line number, record) from a binary stream without reading it all in.
+
+    Records are dicts; a JSON line that is not an object is yielded as-is so the
+    caller can report it.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, raw in enumerate(text, 1):
+        if raw.strip():
+            try:
+                yield line, json.loads(raw)
+            except ValueError:
+                yield line, raw
+
+
+def import_file(stream, fmt, agent_email, batch_size=None):
+    return import_records(iter_records(stream, fmt), agent_email, batch_size)
+
+
+def import_records(records, agent_email, batch_size=None):
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 2000)
+    # one bound form, re-processed per row: same validators as add_property() at a
+    # fraction of the cost of building a form per row
+    form = PropertyForm(formdata=None, meta={'csrf': False})
+    result = ImportResult()
+    batch, first, last = [], date.max, date.min
+    for line, record in records:
+        if not isinstance(record, dict):
+            result.reject(line, {'row': ['Not a JSON object.']})
+            continue
+        # blank cells count as absent fields, like inputs a browser leaves empty
+        form.process(MultiDict({k: str(v).strip() for k, v in record.items()
+                                if k in form and v is not None and str(v).strip()}))
+        if not form.validate():
+            result.reject(line, form.errors)
+            continue
+        row = _row(form, agent_email)
+        batch.append((line, row))
+        first = min(first, row['property']['available_from'])
+        last = max(last, row['property']['available_to'])
+        if len(batch) >= batch_size:
+            _write_batch(batch, result)
+            batch = []
+    if batch:
+        _write_batch(batch, result)
+    if result.inserted:
+        # core INSERTs bypass the session's change tracking; drop every cached search
+        # over the imported availability span in one pass
+        search_cache.invalidate([(None, first, last)])
+    return result
+
+
+def _row(form, agent_email):
+    d = form.data
+    kind = d['property_type']
+    lat, lng = geocoding.geocode(d['street'], d['city'], d['state']) or (None, None)
+    prop = {
+        'agent_email': agent_email,
+        'property_type': kind,
+        'street': d['street'], 'city': d['city'], 'state': d['state'],
+        'location_key': normalize_location(d['street'], d['city'], d['state']),
+        'latitude': lat, 'longitude': lng,
+        'price': d['price'],
+        'available_from': d['available_from'],
+        'available_to': d['available_to'],
+        'sqr_footage': d['sqr_footage'],
+        'description': d['description'],
+        'num_rooms': d['num_rooms'] if kind in ('house', 'apartment') else None,
+    }
+    if kind == 'house':
+        sub = {'num_rooms': d['num_rooms']}
+    elif kind == 'apartment':
+        sub = {'num_rooms': d['num_rooms'], 'building_type': d['building_type']}
+    else:
+        sub = {'business_type': d['business_type']}
+    return {'property': prop, 'subtype': sub}
+
+
+def _write_batch(batch, result):
+    # core INSERTs skip the session's flush events; saved-search alerts are queued here,
+    # in the same transaction as the rows
+    try:
+        saved_searches.enqueue_matching(_insert([row for _, row in batch]))
+        db.session.commit()
+        result.inserted += len(batch)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+    for line, row in batch:
+        try:
+            saved_searches.enqueue_matching(_insert([row]))
+            db.session.commit()
+            result.inserted += 1
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            result.reject(line, {'row': [str(getattr(exc, 'orig', exc)).strip()]})
+
+
+def _insert(rows):
+    props = [row['property'] for row in rows]
+    if db.engine.dialect.name == 'postgresql':
+        ids = db.session.execute(db.text(
+            "SELECT nextval(pg_get_serial_sequence('properties', 'property_id')) "
+            "FROM generate_series(1, :n)"), {'n': len(rows)}).scalars().all()
+        db.session.execute(Property.__table__.insert(),
+                           [dict(p, property_id=pid) for p, pid in zip(props, ids)])
+    else:
+        # SQLite gives each new row max(rowid) + 1 while this transaction holds the
+        # write lock, so the batch's ids are the last len(rows) ids
+        db.session.execute(Property.__table__.insert(), props)
+        last = db.session.query(db.func.max(Property.property_id)).scalar()
+        ids = range(last - len(rows) + 1, last + 1)
+
+    subtypes = {House: [], Apartment: [], CommercialBuilding: []}
+    model = {'house': House, 'apartment': Apartment, 'commercial': CommercialBuilding}
+    for row, pid in zip(rows, ids):
+        subtypes[model[row['property']['property_type']]].append(dict(row['subtype'], property_id=pid))
+    for sub, values in subtypes.items():
+        if values:
+            db.session.execute(sub.__table__.insert(), values)
+    return list(ids)
+
+
+# ---- flask import-properties ----
+@click.command('import-properties')
+@click.argument('source', type=click.File('rb'))
+@click.option('--agent', 'agent_email', required=True, help='agent that owns the listings')
+@click.option('--format', 'fmt', type=click.Choice(sorted(set(FORMATS.values()))),
+              help='default: from the file extension')
+@click.option('--batch-size', type=int, help='rows per INSERT batch (IMPORT_BATCH_SIZE)')
+@with_appcontext
+def import_command(source, agent_email, fmt, batch_size):
+    """Bulk-import listings from a CSV or JSON Lines file ('-' for stdin)."""
+    if db.session.get(Agent, agent_email) is None:
+        raise click.BadParameter(f'no agent {agent_email}', param_hint='--agent')
+    try:
+        fmt = fmt or detect_format(source.name)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint='--format')
+    t0 = time.perf_counter()
+    result = import_file(source, fmt, agent_email, batch_size)
+    click.echo(f'{result.inserted} imported, {result.failed} rejected '
+               f'in {time.perf_counter() - t0:.1f}s')
+    for line, errors in result.errors:
+        click.echo(f'  line {line}: {json.dumps(errors)}', err=True)
+    if result.failed > len(result.errors):
+        click.echo(f'  ... {result.failed - len(result.errors)} more', err=True)
@@ -0,0 +1,200 @@
+import base64
+import json
+import math
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from sqlalchemy import and_, case, func, literal, or_
+
+from models import db, Property, normalize_location
+from availability import overlaps
+
+
+def location_filter(loc):
+    # One LIKE over the normalized key instead of three ILIKEs over street/city/state.
+    # Postgres serves '%term%' from the pg_trgm GIN index; SQLite (local runs) falls back
+    # to a scan of a single pre-lowered column, which is still cheaper than three ILIKEs.
+    key = normalize_location(loc)
+    if not key:
+        # '%%' would match every listing; SearchForm rejects such a location up front
+        raise ValueError(f'location {loc!r} has no letters or digits')
+    return Property.location_key.like(f"%{key}%")
+
+
+EARTH_RADIUS_MILES = 3958.8
+_HALF_RADIAN = math.pi / 360           # degrees -> radians, halved for the haversine
+
+
+def radius_filter(lat, lng, miles):
+    # Bounding box first: plain ranges on (latitude, longitude) that ix_properties_lat_lng
+    # serves. The haversine test then trims the box's corners in the same statement:
+    # hav(d/R) = sin^2(dlat/2) + cos(lat1) cos(lat2) sin^2(dlng/2) <= sin^2(miles / 2R).
+    miles = float(miles)
+    dlat = math.degrees(miles / EARTH_RADIUS_MILES)
+    dlng = math.degrees(miles / (EARTH_RADIUS_MILES * max(math.cos(math.radians(lat)), 0.01)))
+    half_dlat = func.sin((Property.latitude - lat) * _HALF_RADIAN)
+    half_dlng = func.sin((Property.longitude - lng) * _HALF_RADIAN)
+    hav = (half_dlat * half_dlat
+           + math.cos(math.radians(lat)) * func.cos(Property.latitude * (2 * _HALF_RADIAN))
+           * half_dlng * half_dlng)
+    return and_(
+        Property.latitude.between(lat - dlat, lat + dlat),
+        Property.longitude.between(lng - dlng, lng + dlng),
+        hav <= math.sin(min(miles / (2 * EARTH_RADIUS_MILES), math.pi / 2)) ** 2,
+    )
+
+
+def base_query(location, start, end, near=None, radius=None):
+    """Properties matching `location` that are free for every day of [start, end].
+
+    One statement: the stay must sit inside the listing's availability window and no
+    booking may overlap it (NOT EXISTS over the bookings range index). With `near`
+    (latitude, longitude) and `radius` in miles, listings within that distance of the
+    point replace the substring match on `location`.
+    """
+    return Property.query.filter(
+        Property.available_from <= start,
+        Property.available_to   >= end,
+        radius_filter(*near, radius) if near is not None else location_filter(location),
+        ~Property.bookings.any(overlaps(start, end)),
+    )
+
+
+def _refinements(property_type=None, min_price=None, max_price=None, min_bedrooms=None):
+    # the optional search filters as {facet: condition}; unused filters are left out
+    conds = {}
+    if property_type:
+        conds['property_type'] = Property.property_type == property_type
+    price = []
+    if min_price is not None:
+        price.append(Property.price >= min_price)
+    if max_price is not None:
+        price.append(Property.price <= max_price)
+    if price:
+        conds['price'] = and_(*price)
+    if min_bedrooms is not None:
+        conds['bedrooms'] = Property.num_rooms >= min_bedrooms
+    return conds
+
+
+def filtered_query(location, start, end, property_type=None,
+                   min_price=None, max_price=None, min_bedrooms=None, near=None, radius=None):
+    """base_query() narrowed by the type, price and bedroom filters."""
+    q = base_query(location, start, end, near, radius)
+    conds = _refinements(property_type, min_price, max_price, min_bedrooms)
+    return q.filter(*conds.values()) if conds else q
+
+
+# ---- facet counts ----
+def facet_counts(location, start, end, property_type=None, min_price=None, max_price=None,
+                 min_bedrooms=None, near=None, radius=None, price_buckets=()):
+    """Result counts per property type, price bucket and bedroom count, from one query.
+
+    Each facet is counted with every filter applied except its own, so a count is what
+    the search returns after switching that one filter; `total` applies them all.
+    price_buckets are ascending bounds: (1000, 2000) -> [0, 1000), [1000, 2000), 2000+.
+    The statement groups the base result set by (type, bucket, bedrooms) plus one match
+    flag per active filter -- a few hundred groups at most -- and the facets are summed
+    from those groups.
+    """
+    conds = _refinements(property_type, min_price, max_price, min_bedrooms)
+    bucket = (case(*[(Property.price < bound, i) for i, bound in enumerate(price_buckets)],
+                   else_=len(price_buckets))
+              if price_buckets else literal(0))
+    # grouped through a subquery: Postgres would not match the CASE expressions'
+    # separate bind parameters between SELECT and GROUP BY
+    sub = base_query(location, start, end, near, radius).with_entities(
+        Property.property_type.label('kind'), bucket.label('bucket'),
+        Property.num_rooms.label('rooms'),
+        *(case((cond, 1), else_=0).label(f'ok_{name}') for name, cond in conds.items()),
+    ).subquery()
+    rows = db.session.query(*sub.c, func.count()).group_by(*sub.c).all()
+
+    names = list(conds)
+    total, kinds, rooms = 0, Counter(), Counter()
+    prices = [0] * (len(price_buckets) + 1)
+    for kind, b, num_rooms, *flags, n in rows:
+        failed = {name for name, ok in zip(names, flags) if not ok}
+        if not failed:
+            total += n
+        if failed <= {'property_type'}:
+            kinds[kind] += n
+        if failed <= {'price'}:
+            prices[b] += n
+        if failed <= {'bedrooms'}:
+            rooms[num_rooms] += n
+    bounds = [0, *price_buckets, None]
+    return {
+        'total': total,
+        'property_type': [{'value': k, 'count': n} for k, n in sorted(kinds.items())],
+        'price': [{'min': bounds[i], 'max': bounds[i + 1], 'count': n} for i, n in enumerate(prices)],
+        # commercial listings (no bedrooms) last
+        'bedrooms': [{'value': k, 'count': n}
+                     for k, n in sorted(rooms.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))],
+    }
+
+
+# ---- keyset pagination ----
+# Pages are addressed by the (sort value, property_id) of their boundary rows rather than
+# an OFFSET, so page N costs the same as page 1 and only page_size+1 rows are materialized.
+Page = namedtuple('Page', 'items next_cursor prev_cursor')
+
+
+def encode_cursor(value, property_id):
+    raw = json.dumps([None if value is None else str(value), property_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, cast):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, property_id = json.loads(raw)
+        return (None if value is None else cast(value)), int(property_id)
+    except (ValueError, TypeError, ArithmeticError):
+        return None                      # tampered / stale cursor -> first page
+
+
+def _after(col, value, pid, nullable):
+    # rows strictly after (value, pid) in "col ASC NULLS LAST, property_id ASC" order
+    if value is None:
+        return and_(col.is_(None), Property.property_id > pid)
+    cond = or_(col > value, and_(col == value, Property.property_id > pid))
+    return or_(cond, col.is_(None)) if nullable else cond
+
+
+def _before(col, value, pid, nullable):
+    if value is None:
+        return or_(col.isnot(None), Property.property_id < pid)
+    return or_(col < value, and_(col == value, Property.property_id < pid))
+
+
+def keyset_page(q, col, per_page, after=None, before=None, cast=Decimal, nullable=False):
+    """Fetch one page of `q` ordered by (col, property_id); col may be an expression."""
+    q = q.add_columns(col)
+    after = decode_cursor(after, cast)
+    before = None if after else decode_cursor(before, cast)
+
+    if before:
+        q = q.filter(_before(col, *before, nullable))
+        q = q.order_by(col.desc().nullsfirst() if nullable else col.desc(),
+                       Property.property_id.desc())
+    else:
+        if after:
+            q = q.filter(_after(col, *after, nullable))
+        q = q.order_by(col.nullslast() if nullable else col, Property.property_id)
+
+    rows = q.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    first = encode_cursor(rows[0][1], rows[0][0].property_id) if rows else None
+    last = encode_cursor(rows[-1][1], rows[-1][0].property_id) if rows else None
+    if before:
+        next_cursor, prev_cursor = last, (first if more else None)
+    else:
+        next_cursor, prev_cursor = (last if more else None), (first if after else None)
+    return Page([p for p, _ in rows], next_cursor, prev_cursor)
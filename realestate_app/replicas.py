@@ -0,0 +1,146 @@
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session as cookie
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+# Read replicas. REPLICA_DATABASE_URLS become the SQLALCHEMY_BINDS 'replica_0', ...
+# and db.session is a RoutingSession, whose get_bind() picks the engine per statement:
+#   - outside a view marked @read_only (CLI, jobs, every write view): the primary;
+#   - flushes, INSERT / UPDATE / DELETE and SELECT ... FOR UPDATE: the primary, and
+#     every later statement of that request too, so it reads its own writes;
+#   - other reads of a @read_only view: one replica per request, chosen at random
+#     among those whose lag is within REPLICA_MAX_LAG_S, else the primary.
+# Lag is probed at most every REPLICA_LAG_CHECK_S per process and replica; one that
+# cannot be reached (or drops a connection) is skipped for REPLICA_RETRY_S.
+# A request that commits a write stamps the time in the login session cookie. Until
+# REPLICA_MAX_LAG_S have passed, that user's reads only go to a replica that lagged
+# less than the time since their write, so e.g. my_bookings right after book_property
+# shows the new booking. Result caches (search_cache) may still hold what a lagging
+# replica returned, up to their TTL, as they may across worker processes.
+log = logging.getLogger('realestate.replicas')
+
+PREFIX = 'replica_'
+WROTE_AT = 'db_wrote_at'           # login-session key: time.time() of the last write
+
+# seconds a replica trails the primary; 0 while it has replayed all the WAL it received
+_LAG_SQL = {
+    'postgresql': """
+        SELECT CASE WHEN NOT pg_is_in_recovery()
+                      OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+    """,
+}
+
+_lock = threading.Lock()
+_status = {}                # engine -> (next probe at (monotonic), lag in s / None)
+
+
+def init_app(app, db):
+    app.config.setdefault('REPLICA_MAX_LAG_S', 5.0)
+    app.config.setdefault('REPLICA_LAG_CHECK_S', 1.0)
+    app.config.setdefault('REPLICA_RETRY_S', 30.0)
+    with app.app_context():
+        for key, engine in replica_engines(db).items():
+            event.listen(engine, 'handle_error', _mark_down)
+            log.info('reads of @read_only views may use %s (%s)',
+                     key, engine.url.render_as_string(hide_password=True))
+    if not event.contains(db.session, 'after_commit', _remember_write):
+        event.listen(db.session, 'after_commit', _remember_write)
+
+
+def read_only(view):
+    """Let the reads of `view` go to a replica. Put it above @login_required, so the
+    user is loaded from the replica as well."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def replica_engines(db):
+    return {key: e for key, e in db.engines.items() if key and key.startswith(PREFIX)}
+
+
+def _writes(clause):
+    return clause is not None and (getattr(clause, 'is_dml', False)
+                                   or getattr(clause, '_for_update_arg', None) is not None)
+
+
+class RoutingSession(Session):
+    """db.session: sends the reads of @read_only views to a replica (see above)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _writes(clause):
+                self.info['wrote'] = True
+            elif g.get('read_replica') and not self.info.get('wrote'):
+                if 'replica' not in self.info:
+                    self.info['replica'] = _choose(replica_engines(self._db))
+                if self.info['replica'] is not None:
+                    return self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _choose(engines):
+    if not engines:
+        return None
+    cfg = current_app.config
+    limit = cfg['REPLICA_MAX_LAG_S']
+    wrote_at = cookie.get(WROTE_AT)
+    if wrote_at is not None:
+        since = time.time() - wrote_at
+        if since > limit:
+            cookie.pop(WROTE_AT)
+        else:
+            # the lag we know may be REPLICA_LAG_CHECK_S old
+            limit = min(limit, since - cfg['REPLICA_LAG_CHECK_S'])
+    usable = [e for e in engines.values() if (lag := replica_lag(e)) is not None and lag <= limit]
+    return random.choice(usable) if usable else None
+
+
+def replica_lag(engine):
+    """Seconds `engine` trails the primary (probed at most every REPLICA_LAG_CHECK_S),
+    None while it is down or its lag is unknown."""
+    now = time.monotonic()
+    with _lock:
+        due, lag = _status.get(engine, (0, None))
+        if now < due:
+            return lag
+        # other threads keep using the last value while this one probes
+        _status[engine] = (now + current_app.config['REPLICA_LAG_CHECK_S'], lag)
+    try:
+        with engine.connect() as conn:
+            lag = conn.execute(text(_LAG_SQL.get(engine.dialect.name, 'SELECT 0'))).scalar()
+    except Exception:
+        log.warning('replica %s unreachable; reading from the primary for %ss',
+                    engine.url.render_as_string(hide_password=True),
+                    current_app.config['REPLICA_RETRY_S'], exc_info=True)
+        _set_down(engine)
+        return None
+    # NULL: nothing replayed yet, so the lag is unknown; skipped until the next probe
+    lag = None if lag is None else float(lag)
+    with _lock:
+        _status[engine] = (now + current_app.config['REPLICA_LAG_CHECK_S'], lag)
+    return lag
+
+
+def _set_down(engine):
+    with _lock:
+        _status[engine] = (time.monotonic() + current_app.config['REPLICA_RETRY_S'], None)
+
+
+def _mark_down(exception_context):
+    # a replica that drops connections mid-request is skipped by the next requests
+    if exception_context.is_disconnect and has_request_context():
+        _set_down(exception_context.engine)
+
+
+def _remember_write(session):
+    if session.info.get('wrote') and has_request_context():
+        cookie[WROTE_AT] = time.time()
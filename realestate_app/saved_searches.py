@@ -0,0 +1,209 @@
+import math
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import joinedload
+
+import jobs
+from availability import MAX_BOOKING_DAYS
+from models import db, Property, Booking, SavedSearch, SavedSearchMatch, normalize_location
+from property_search import EARTH_RADIUS_MILES
+
+# Saved searches and their new-listing inbox. Instead of re-running every saved search
+# when a listing is added or changed, the matcher turns the listing into the few index
+# keys a matching search can have and reads only the searches filed under them:
+#   location   't:<words>' for every run of consecutive words of the listing's location
+#              key ("oak park il" -> 'oak', 'oak park', ...), so a search for "chicago"
+#              or "oak park" is found; alerts match whole words, unlike the live '%term%'
+#              search. Radius searches are filed under one grid cell 'g<level>:<row>:<col>'
+#              at least as large as their radius; a listing probes its cell and the
+#              eight around it at every level.
+#   type       the listing's type or '' (any)
+#   price      price_band >= the listing's band (a search's band is that of its max_price)
+# The candidates are then checked exactly (window, bookings, filters, distance) and new
+# matches go to saved_search_matches. Matching is a background job (jobs.py) queued in
+# the listing's own transaction, so saving a listing does not wait for it.
+MATCH_JOB = 'saved_searches.match'
+
+_PRICE_BANDS = (500, 1000, 1500, 2000, 3000, 5000, 10000)
+_CELL = 0.25                # degrees at level 0; level k cells are _CELL * 2**k wide
+_LEVELS = 12
+_MATCHED = ('property_type', 'price', 'available_from', 'available_to', 'num_rooms',
+            'location_key', 'latitude', 'longitude')
+_SEARCH = SavedSearch.__table__
+_MATCH = SavedSearchMatch.__table__
+
+
+def init_app(app, db):
+    if not event.contains(db.session, 'after_flush', _enqueue_changed):
+        event.listen(db.session, 'after_flush', _enqueue_changed)
+
+
+# ---- index keys ----
+def price_band(price):
+    return len(_PRICE_BANDS) if price is None else bisect_right(_PRICE_BANDS, price)
+
+
+def _cell(level, lat, lng):
+    size = _CELL * 2 ** level
+    return math.floor(lat / size), math.floor(lng / size)
+
+
+def search_key(location, near=None, radius=None):
+    """Index key of a saved search; see the module comment."""
+    if near is None:
+        return 't:' + normalize_location(location)
+    lat, lng = near
+    reach = math.degrees(radius / EARTH_RADIUS_MILES) / max(math.cos(math.radians(lat)), 0.01)
+    level = min(_LEVELS - 1, max(0, math.ceil(math.log2(max(reach, _CELL) / _CELL))))
+    return 'g%d:%d:%d' % (level, *_cell(level, lat, lng))
+
+
+def listing_keys(location_key, lat, lng):
+    words = (location_key or '').split()
+    keys = {'t:' + ' '.join(words[i:j]) for i in range(len(words)) for j in range(i + 1, len(words) + 1)}
+    if lat is not None and lng is not None:
+        for level in range(_LEVELS):
+            row, col = _cell(level, lat, lng)
+            keys.update('g%d:%d:%d' % (level, row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+    return keys
+
+
+# ---- saving ----
+def save(renter, criteria):
+    """Store the SearchForm criteria as a saved search of `renter` (not committed).
+
+    The renter's preferred_location and budget follow their latest saved search.
+    """
+    near, radius = criteria.get('near'), criteria.get('radius')
+    s = SavedSearch(
+        renter_email=renter.email, location=criteria['location'],
+        start_date=criteria['start'], end_date=criteria['end'],
+        property_type=criteria.get('property_type') or '',
+        min_price=criteria.get('min_price'), max_price=criteria.get('max_price'),
+        min_bedrooms=criteria.get('min_bedrooms'),
+        radius=float(radius) if near is not None else None,
+        latitude=near[0] if near is not None else None,
+        longitude=near[1] if near is not None else None,
+        match_key=search_key(criteria['location'], near, radius and float(radius)),
+        price_band=price_band(criteria.get('max_price')),
+    )
+    db.session.add(s)
+    renter.preferred_location = criteria['location']
+    if criteria.get('max_price') is not None:
+        renter.budget = criteria['max_price']
+    return s
+
+
+# ---- matching ----
+def _miles(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(min(h, 1.0)))
+
+
+def _matches(s, p, booked, today):
+    if s.property_type and s.property_type != p.property_type:
+        return False
+    if s.start_date < today or not (p.available_from and p.available_to and
+                                    p.available_from <= s.start_date and s.end_date <= p.available_to):
+        return False
+    if any(start <= s.end_date and s.start_date <= end for start, end in booked):
+        return False
+    if (s.min_price is not None and p.price < s.min_price) or \
+       (s.max_price is not None and p.price > s.max_price):
+        return False
+    if s.min_bedrooms is not None and (p.num_rooms is None or p.num_rooms < s.min_bedrooms):
+        return False
+    if s.radius is not None:
+        return p.latitude is not None and _miles(s.latitude, s.longitude, p.latitude, p.longitude) <= s.radius
+    # whole words, like the 't:' keys
+    return ' %s ' % normalize_location(s.location) in ' %s ' % (p.location_key or '')
+
+
+def _candidates(conn, p):
+    return conn.execute(select(_SEARCH).where(
+        _SEARCH.c.match_key.in_(sorted(listing_keys(p.location_key, p.latitude, p.longitude))),
+        _SEARCH.c.property_type.in_((p.property_type, '')),
+        _SEARCH.c.price_band >= price_band(p.price),
+    )).all()
+
+
+def match_properties(ids, today=None):
+    """Match the listings `ids` against the saved searches in db.session's transaction
+    (not committed); returns inbox rows added."""
+    today = today or date.today()
+    table = Property.__table__
+    added = 0
+    conn = db.session.connection()
+    for p in conn.execute(select(table).where(table.c.property_id.in_(sorted(set(ids))))).all():
+        candidates = _candidates(conn, p)
+        if not candidates:
+            continue
+        # saved stays start today or later; older bookings cannot block them
+        booked = conn.execute(select(Booking.start_date, Booking.end_date).where(
+            Booking.property_id == p.property_id,
+            Booking.start_date >= today - timedelta(days=MAX_BOOKING_DAYS - 1),
+            Booking.end_date >= today)).all()
+        hits = {s.search_id: s.renter_email for s in candidates if _matches(s, p, booked, today)}
+        if not hits:
+            continue
+        # an edited listing may already be in some inboxes
+        seen = set(conn.execute(select(_MATCH.c.search_id).where(
+            _MATCH.c.property_id == p.property_id,
+            _MATCH.c.search_id.in_(list(hits)))).scalars())
+        now = datetime.utcnow()
+        rows = [{'search_id': sid, 'renter_email': email, 'property_id': p.property_id,
+                 'matched_at': now, 'seen': False}
+                for sid, email in hits.items() if sid not in seen]
+        if rows:
+            conn.execute(_MATCH.insert(), rows)
+            added += len(rows)
+    return added
+
+
+def _changed_properties(session):
+    ids = []
+    for obj in session.new:
+        if isinstance(obj, Property):
+            ids.append(obj.property_id)
+    for obj in session.dirty:
+        if isinstance(obj, Property) and any(inspect(obj).attrs[a].history.has_changes() for a in _MATCHED):
+            ids.append(obj.property_id)
+    return ids
+
+
+def enqueue_matching(ids, session=None):
+    """Queue matching of the listings `ids` in the open transaction (see jobs.enqueue)."""
+    jobs.enqueue(MATCH_JOB, {'property_ids': sorted(set(ids))}, session=session)
+
+
+def _enqueue_changed(session, flush_context):
+    ids = _changed_properties(session)
+    if ids:
+        enqueue_matching(ids, session)
+
+
+@jobs.handler(MATCH_JOB)
+def _match_job(property_ids):
+    match_properties(property_ids)
+
+
+# ---- inbox ----
+def inbox(renter_email, limit=100):
+    """The renter's newest matches with their listing and search, newest first."""
+    return (SavedSearchMatch.query
+            .filter(SavedSearchMatch.renter_email == renter_email)
+            .options(joinedload(SavedSearchMatch.property), joinedload(SavedSearchMatch.search))
+            .order_by(SavedSearchMatch.match_id.desc())
+            .limit(limit).all())
+
+
+def mark_seen(renter_email, match_ids):
+    if match_ids:
+        (SavedSearchMatch.query
+         .filter(SavedSearchMatch.renter_email == renter_email,
+                 SavedSearchMatch.match_id.in_(match_ids), SavedSearchMatch.seen.is_(False))
+         .update({'seen': True}, synchronize_session=False))
@@ -0,0 +1,216 @@
+import hashlib
+import json
+from datetime import date
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.util import identity_key
+
+import caching
+import commit_hooks
+from models import Property, House, Apartment, CommercialBuilding, Booking, normalize_location
+from property_search import Page, facet_counts, filtered_query, keyset_page
+
+# Cached value: the ordered property ids of one result page plus its cursors, or a
+# search's facet counts (search_facets), which share the pages' meta and invalidation.
+# Entry meta: the normalized location term and the searched stay; a committed change
+# to a listing invalidates exactly the entries whose term matches the listing's
+# location key and whose stay intersects the dates the change touched. Radius searches
+# store an empty term (a listing's key says nothing about its distance), so any change
+# in their stay invalidates them. Entries are tagged with one trigram of their term (a
+# shorter term with itself), alone and with each month of their stay: a term inside a
+# key has all its trigrams in the key. An invalidation asks the backend (the shared one
+# indexes by tag) for the entries tagged with one of the changed key's trigrams or
+# pieces shorter than three - and, for a change spanning at most _MONTH_TAGS months (a
+# booking), one of its months - so it reads about what it may delete rather than the
+# whole cache, with tags linear in the key's length.
+# Invalidation reaches the backend of the committing process only: with the per-process
+# 'memory' backend the other workers serve their entries until SEARCH_CACHE_TTL runs
+# out, which is why gunicorn.conf.py switches to 'redis' (or off) for several workers.
+_backend = None
+_ALL = (None, date.min, date.max)        # scope that matches every entry
+_MONTH_TAGS = 3
+
+
+def init_app(app, db):
+    global _backend
+    app.config.setdefault('SEARCH_CACHE_BACKEND', 'memory')
+    _backend = caching.make_backend(
+        app.config['SEARCH_CACHE_BACKEND'],
+        url=app.config.get('SEARCH_CACHE_URL'),
+        max_entries=app.config.get('SEARCH_CACHE_MAX_ENTRIES', 2048),
+        ttl=app.config.get('SEARCH_CACHE_TTL', 60),
+        prefix='search',
+    )
+    if _backend is not None:
+        commit_hooks.after_commit(db, 'search_cache', _changed_scopes, invalidate)
+
+
+def make_key(criteria, order_by, per_page, after, before):
+    parts = {
+        'loc': normalize_location(criteria['location']),
+        'start': criteria['start'].isoformat(),
+        'end': criteria['end'].isoformat(),
+        'type': criteria.get('property_type') or '',
+        'min_price': _num(criteria.get('min_price')),
+        'max_price': _num(criteria.get('max_price')),
+        'min_bedrooms': criteria.get('min_bedrooms'),
+        'near': criteria.get('near'), 'radius': _num(criteria.get('radius')),
+        'order': order_by, 'per_page': per_page,
+        'after': after or '', 'before': '' if after else (before or ''),
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def _num(value):
+    return None if value is None else str(value.normalize() if hasattr(value, 'normalize') else value)
+
+
+def search_page(criteria, order_by, per_page, after=None, before=None, options=()):
+    """One keyset page of filtered_query(**criteria), served from the cache when possible.
+
+    options are loader options for the Property rows (e.g. load_only for the JSON API).
+    """
+    key = make_key(criteria, order_by, per_page, after, before)
+    page = get(key, options)
+    if page is None:
+        generation = _backend.generation() if _backend is not None else None
+        q = filtered_query(**criteria).options(*options)
+        if order_by == 'price':
+            page = keyset_page(q, Property.price, per_page, after=after, before=before)
+        else:  # bedrooms, commercial (no rooms) last
+            page = keyset_page(q, Property.num_rooms, per_page, after=after, before=before,
+                               cast=int, nullable=True)
+        put(key, criteria, page, generation)
+    return page
+
+
+def search_facets(criteria, price_buckets):
+    """facet_counts() for a search, served from the cache when possible."""
+    key = make_key(criteria, 'facets:' + ','.join(map(str, price_buckets)), 0, None, None)
+    if _backend is None:
+        return facet_counts(**criteria, price_buckets=price_buckets)
+    facets = _backend.get(key)
+    if facets is None:
+        generation = _backend.generation()
+        facets = facet_counts(**criteria, price_buckets=price_buckets)
+        meta = _meta(criteria)
+        _backend.set(key, facets, meta, _tags(meta), generation)
+    return facets
+
+
+def get(key, options=()):
+    if _backend is None:
+        return None
+    cached = _backend.get(key)
+    if cached is None:
+        return None
+    ids = cached['ids']
+    rows = Property.query.options(*options).filter(Property.property_id.in_(ids)).all() if ids else []
+    by_id = {p.property_id: p for p in rows}
+    # a listing deleted by another worker since caching simply drops out of the page
+    return Page([by_id[i] for i in ids if i in by_id], cached['next'], cached['prev'])
+
+
+def put(key, criteria, page, generation=None):
+    # generation: _backend.generation() from before the page was queried; the page is not
+    # stored if an invalidation ran since, as it may predate that commit
+    if _backend is None:
+        return
+    meta = _meta(criteria)
+    _backend.set(
+        key,
+        {'ids': [p.property_id for p in page.items], 'next': page.next_cursor, 'prev': page.prev_cursor},
+        meta, _tags(meta), generation,
+    )
+
+
+def _meta(criteria):
+    return {'term': '' if criteria.get('near') else normalize_location(criteria['location']),
+            'start': criteria['start'].isoformat(), 'end': criteria['end'].isoformat()}
+
+
+def _months(start, end):
+    months, y, m = [], start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append(f'{y:04d}-{m:02d}')
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def _term_tag(term):
+    # the greatest trigram: later letters are rarer, so fewer terms share it
+    return term if len(term) < 3 else max(term[i:i + 3] for i in range(len(term) - 2))
+
+
+def _tags(meta):
+    tag = _term_tag(meta['term'])
+    months = _months(date.fromisoformat(meta['start']), date.fromisoformat(meta['end']))
+    return ['t:' + tag] + [f't:{tag}@{m}' for m in months]
+
+
+def _scope_tags(key, start, end):
+    # every tag a term inside `key` can have: its pieces of up to three characters
+    terms = {key[i:i + n] for n in range(4) for i in range(len(key) - n + 1)}
+    if (end.year - start.year) * 12 + end.month - start.month < _MONTH_TAGS:
+        return {f't:{t}@{m}' for t in terms for m in _months(start, end)}
+    return {'t:' + t for t in terms}
+
+
+def invalidate(scopes):
+    if _backend is None:
+        return
+    scopes = set(scopes)
+    tags = None                          # None: every entry
+    if _backend.indexed and all(key is not None for key, _, _ in scopes):
+        tags = set().union(*(_scope_tags(key, start, end) for key, start, end in scopes))
+    scopes = [(key, start.isoformat(), end.isoformat()) for key, start, end in scopes]
+
+    def hit(meta):
+        return any((key is None or meta['term'] in key) and meta['start'] <= end and start <= meta['end']
+                   for key, start, end in scopes)
+    _backend.delete_where(hit, tags)
+
+
+def stats():
+    return _backend.stats.as_dict() if _backend is not None else None
+
+
+# ---- what a flush touched, as (location_key, first day, last day) scopes ----
+def _values(obj, attr):
+    # current value plus the pre-flush value if it changed
+    hist = inspect(obj).attrs[attr].history
+    return {v for v in (getattr(obj, attr), *hist.deleted) if v is not None} or {None}
+
+
+def _window(obj):
+    starts, ends = _values(obj, 'available_from'), _values(obj, 'available_to')
+    return (date.min if None in starts else min(starts),
+            date.max if None in ends else max(ends))
+
+
+def _property(session, pid):
+    obj = session.identity_map.get(identity_key(Property, pid))
+    return obj if obj is not None else session.get(Property, pid)
+
+
+def _property_scopes(p):
+    start, end = _window(p)
+    return [(key or '', start, end) for key in _values(p, 'location_key')]
+
+
+def _changed_scopes(session):
+    scopes = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Property):
+            scopes += _property_scopes(obj)
+        elif isinstance(obj, (House, Apartment, CommercialBuilding)):
+            p = _property(session, obj.property_id)
+            scopes += _property_scopes(p) if p is not None else [_ALL]
+        elif isinstance(obj, Booking):
+            p = _property(session, obj.property_id)
+            if p is None:
+                scopes.append(_ALL)
+                continue
+            start, end = min(_values(obj, 'start_date')), max(_values(obj, 'end_date'))
+            scopes += [(key or '', start, end) for key in _values(p, 'location_key')]
+    return scopes
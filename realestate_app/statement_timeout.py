@@ -0,0 +1,19 @@
+from flask import current_app, has_request_context
+from sqlalchemy import event
+
+# Server-side cap on the statements of web requests. Every transaction db.session begins
+# inside a request (on the primary or a replica) starts with SET LOCAL statement_timeout,
+# so a runaway query fails that request instead of holding a connection. Migrations, the
+# flask CLI commands and the jobs worker run outside requests and are not capped.
+
+
+def init_app(app, db):
+    app.config.setdefault('DB_STATEMENT_TIMEOUT_MS', 15000)
+    if not event.contains(db.session, 'after_begin', _cap):
+        event.listen(db.session, 'after_begin', _cap)
+
+
+def _cap(session, transaction, connection):
+    ms = current_app.config['DB_STATEMENT_TIMEOUT_MS'] if has_request_context() else 0
+    if ms and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(ms)}')